@@ -0,0 +1,183 @@
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Streaming agent loop for the chat client.
+#
+# Each round streams a chat completion. Text is handed to on_text as it
+# arrives; tool calls are reassembled from their streamed fragments and each
+# one is started as soon as its arguments are complete - while the model is
+# still streaming the next one - instead of after the whole completion. Once
+# the round's calls finish, their results are added to the conversation and
+# the model gets another round, so it can chain calls that depend on earlier
+# results. After max_rounds rounds with tool calls the model is asked for a
+# final answer without tools.
+#
+# Calls to the same server still run in the order the model issued them, so
+# a set followed by a get on the key-value server behaves as written; calls
+# to different servers overlap. Each server has one request in flight at a
+# time: the first call of a round goes out on its own as soon as it is
+# complete, and calls to that server that complete while it runs are queued
+# and sent together, in order, through invoke_many (one /mcp/invoke_batch
+# request) when it returns.
+
+DEFAULT_MAX_ROUNDS = 5
+TOOL_WORKERS = 8
+
+
+class ToolCallAssembler:
+    # Streamed tool calls arrive as fragments tagged with the call's index:
+    # the id and name first, then the arguments JSON a few characters at a
+    # time. A call is complete once a fragment for a later index arrives or
+    # the stream ends.
+    def __init__(self):
+        self._calls = {}
+        self._open = None
+
+    def feed(self, fragments):
+        # Returns the calls completed by these fragments
+        completed = []
+        for fragment in fragments or ():
+            index = fragment.index
+            if self._open is not None and index != self._open:
+                completed.append(self._calls[self._open])
+            self._open = index
+            call = self._calls.setdefault(index, {"id": None, "name": "", "arguments": ""})
+            if fragment.id:
+                call["id"] = fragment.id
+            function = fragment.function
+            if function is not None:
+                call["name"] += function.name or ""
+                call["arguments"] += function.arguments or ""
+        return completed
+
+    def finish(self):
+        if self._open is None:
+            return []
+        self._open, call = None, self._calls[self._open]
+        return [call]
+
+
+def _usage_prompt_tokens(chunk):
+    # OpenAI-style usage on the last chunk, or Groq's x_groq.usage
+    usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return getattr(usage, "prompt_tokens", None)
+
+
+class StreamingAgent:
+    def __init__(self, create, invoke, server_for_tool, model, max_tokens,
+                 max_rounds=DEFAULT_MAX_ROUNDS, on_text=None, on_tool_call=None, on_request=None,
+                 invoke_many=None):
+        self.create = create  # chat.completions.create
+        self.invoke = invoke  # (tool_name, parameters) -> result dict
+        # [(tool_name, parameters)] -> result dicts in the same order; without
+        # it queued calls are made one at a time with invoke
+        self.invoke_many = invoke_many
+        self.server_for_tool = server_for_tool
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_rounds = max_rounds
+        self.on_text = on_text or (lambda text: None)
+        self.on_tool_call = on_tool_call or (lambda name, parameters: None)
+        self.on_request = on_request or (lambda memory, prompt_tokens: None)
+        self._executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="agent-tool")
+
+    def _start(self, call, lane):
+        # Queues one completed call on its server's lane; the future resolves
+        # to (parameters, result)
+        future = Future()
+        try:
+            parameters = json.loads(call["arguments"] or "{}")
+        except ValueError as e:
+            future.set_result(({}, {"error": f"Invalid JSON arguments: {e}"}))
+            return future
+        self.on_tool_call(call["name"], parameters)
+        with lane["lock"]:
+            lane["queued"].append((call["name"], parameters, future))
+            if lane["running"]:
+                return future
+            lane["running"] = True
+        self._executor.submit(self._drain, lane)
+        return future
+
+    def _drain(self, lane):
+        # Sends the lane's queued calls, everything queued so far as one
+        # request, until the queue is empty
+        while True:
+            with lane["lock"]:
+                batch, lane["queued"] = lane["queued"], []
+                if not batch:
+                    lane["running"] = False
+                    return
+            calls = [(name, parameters) for name, parameters, _ in batch]
+            try:
+                if len(calls) == 1:
+                    results = [self.invoke(*calls[0])]
+                elif self.invoke_many is not None:
+                    results = self.invoke_many(calls)
+                else:
+                    results = [self.invoke(*call) for call in calls]
+            except Exception as e:
+                results = [{"error": f"Error invoking tool: {e}"}] * len(calls)
+            for (_, parameters, future), result in zip(batch, results):
+                future.set_result((parameters, result))
+
+    def run(self, memory, tools, tools_tokens=0):
+        # Runs the agent on the conversation in memory (whose last turn holds
+        # the user's message) and returns the final answer text
+        for round_number in range(self.max_rounds + 1):
+            offer_tools = round_number < self.max_rounds
+            request = {"model": self.model, "max_tokens": self.max_tokens, "stream": True,
+                       "messages": memory.messages(reserve_tokens=tools_tokens if offer_tools else 0)}
+            if offer_tools:
+                request.update(tools=tools, tool_choice="auto")
+
+            assembler = ToolCallAssembler()
+            started = []  # (call, future) in the order the model issued them
+            lanes = {}  # server -> {"lock", "queued", "running"}
+            text = []
+            prompt_tokens = None
+
+            def start(calls):
+                for call in calls:
+                    server = self.server_for_tool(call["name"]) or call["name"]
+                    lane = lanes.setdefault(server, {"lock": threading.Lock(), "queued": [], "running": False})
+                    started.append((call, self._start(call, lane)))
+
+            for chunk in self.create(**request):
+                prompt_tokens = _usage_prompt_tokens(chunk) or prompt_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    text.append(delta.content)
+                    self.on_text(delta.content)
+                start(assembler.feed(delta.tool_calls))
+            start(assembler.finish())
+            self.on_request(memory, prompt_tokens)
+
+            if not started:
+                answer = "".join(text)
+                memory.add({"role": "assistant", "content": answer})
+                return answer
+
+            results = [future.result() for _, future in started]
+            memory.add({
+                "role": "assistant",
+                "content": "".join(text) or None,
+                "tool_calls": [
+                    {
+                        "id": call["id"],
+                        "type": "function",
+                        "function": {"name": call["name"], "arguments": json.dumps(parameters)}
+                    }
+                    for (call, _), (parameters, _) in zip(started, results)
+                ]
+            })
+            # Large results go to the result store; the conversation keeps a preview and handle
+            for (call, _), (_, result) in zip(started, results):
+                memory.add_tool_result(call["id"], result)
+        return ""
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,123 @@
+import argparse
+import time
+
+import numpy as np
+
+import server_CALC
+import server_SGL
+import server_WEATHER
+from mcp_codec import JSON_CODECS, MSGPACK
+
+# Encode/decode cost of every tool's request and response with each codec.
+#
+# For each sample call the tool is run once in-process to get a real result;
+# then, per codec, the request body is encoded and decoded and the response
+# body is encoded and decoded repeatedly. Reports microseconds per operation
+# and body sizes, so it shows which tools are dominated by serialization and
+# what a faster JSON library or MessagePack saves on them.
+#
+#   python bench_codec.py
+#   python bench_codec.py --tools calc___array_sum calc___array_add --min-time 0.5
+
+ARRAY_SIZE = 100_000
+MIN_TIME = 0.2  # seconds spent timing each operation
+
+
+def _floats(count, seed=0):
+    return np.random.default_rng(seed).random(count)
+
+
+def _binary(array):
+    # Raw bytes: the JSON codecs send them as base64, MessagePack as binary
+    return {"dtype": "float64", "data": array.tobytes()}
+
+
+def sample_calls():
+    # (label, tool name, parameters)
+    big = _floats(ARRAY_SIZE)
+    other = _floats(ARRAY_SIZE, 1)
+    return [
+        ("keyvalue___set", "keyvalue___set", {"key": "bench:key", "value": "x" * 64}),
+        ("keyvalue___get", "keyvalue___get", {"key": "bench:key"}),
+        ("keyvalue___mset", "keyvalue___mset", {"items": {f"bench:{i}": "x" * 32 for i in range(100)}}),
+        ("keyvalue___mget", "keyvalue___mget", {"keys": [f"bench:{i}" for i in range(100)]}),
+        ("keyvalue___incr", "keyvalue___incr", {"key": "bench:counter", "amount": 1}),
+        ("keyvalue___cas", "keyvalue___cas", {"key": "bench:key", "expected": "y", "value": "z"}),
+        ("keyvalue___list", "keyvalue___list", {"prefix": "bench:", "limit": 100}),
+        ("keyvalue___delete", "keyvalue___delete", {"keys": ["bench:missing"]}),
+        ("calc___add", "calc___add", {"a": 2, "b": 3}),
+        ("calc___subtract", "calc___subtract", {"a": 2, "b": 3}),
+        ("calc___multiply", "calc___multiply", {"a": 2, "b": 3}),
+        ("calc___divide", "calc___divide", {"a": 2, "b": 3}),
+        ("calc___sqrt", "calc___sqrt", {"n": 144}),
+        ("calc___eval", "calc___eval", {"expression": "sqrt(a*b + c)/d", "variables": {"a": 3, "b": 12, "c": 4, "d": 2}}),
+        (f"calc___eval ({ARRAY_SIZE // 100} bindings)", "calc___eval",
+         {"expression": "a*b + 1", "bindings": [{"a": i, "b": i + 1} for i in range(ARRAY_SIZE // 100)]}),
+        (f"calc___array_add ({ARRAY_SIZE} json)", "calc___array_add", {"a": big.tolist(), "b": other.tolist()}),
+        (f"calc___array_add ({ARRAY_SIZE} base64)", "calc___array_add",
+         {"a": _binary(big), "b": _binary(other), "encoding": "base64"}),
+        (f"calc___array_subtract ({ARRAY_SIZE} json)", "calc___array_subtract", {"a": big.tolist(), "b": 1.5}),
+        (f"calc___array_multiply ({ARRAY_SIZE} json)", "calc___array_multiply", {"a": big.tolist(), "b": 2}),
+        (f"calc___array_divide ({ARRAY_SIZE} json)", "calc___array_divide", {"a": big.tolist(), "b": 2}),
+        (f"calc___array_sqrt ({ARRAY_SIZE} json)", "calc___array_sqrt", {"x": big.tolist()}),
+        (f"calc___array_sum ({ARRAY_SIZE} json)", "calc___array_sum", {"x": big.tolist()}),
+        (f"calc___array_sum ({ARRAY_SIZE} base64)", "calc___array_sum", {"x": _binary(big)}),
+        (f"calc___array_mean ({ARRAY_SIZE} json)", "calc___array_mean", {"x": big.tolist()}),
+        (f"calc___array_std ({ARRAY_SIZE} json)", "calc___array_std", {"x": big.tolist()}),
+        (f"calc___array_min ({ARRAY_SIZE} json)", "calc___array_min", {"x": big.tolist()}),
+        (f"calc___array_max ({ARRAY_SIZE} json)", "calc___array_max", {"x": big.tolist()}),
+        (f"calc___array_cumsum ({ARRAY_SIZE} json)", "calc___array_cumsum", {"x": big.tolist()}),
+        (f"calc___array_cumsum ({ARRAY_SIZE} base64)", "calc___array_cumsum", {"x": _binary(big), "encoding": "base64"}),
+        (f"calc___array_dot ({ARRAY_SIZE} json)", "calc___array_dot", {"a": big.tolist(), "b": other.tolist()}),
+        (f"calc___array_percentile ({ARRAY_SIZE} json)", "calc___array_percentile", {"x": big.tolist(), "q": [50, 95, 99]}),
+        ("weather___current", "weather___current", {"city": "Paris"}),
+        ("weather___forecast", "weather___forecast", {"city": "Paris", "days": 7}),
+        ("weather___cities", "weather___cities", {"limit": 100}),
+        ("weather___nearest_city", "weather___nearest_city", {"latitude": 48.9, "longitude": 2.4, "count": 5}),
+        ("weather___current_many", "weather___current_many", {"cities": ["Paris", "London", "Tokyo", "Sydney"]}),
+        ("weather___forecast_many", "weather___forecast_many", {"cities": ["Paris", "London", "Tokyo", "Sydney"], "days": 7}),
+    ]
+
+
+def per_call_us(function, argument, min_time):
+    # Doubles the repetitions until one batch takes at least min_time
+    count = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(count):
+            function(argument)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / count * 1e6
+        count *= 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-tool encode/decode cost of the MCP body codecs")
+    parser.add_argument("--tools", nargs="+", help="Only these tool names")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="Seconds to time each operation")
+    args = parser.parse_args()
+
+    apps = [server_SGL.app, server_CALC.app, server_WEATHER.app]
+    codecs = list(JSON_CODECS.values()) + ([MSGPACK] if MSGPACK is not None else [])
+    print(f"{'call':<40} {'codec':<8} {'req B':>9} {'resp B':>9} {'req enc':>9} {'req dec':>9} "
+          f"{'resp enc':>9} {'resp dec':>9}  (us)")
+    for label, name, parameters in sample_calls():
+        if args.tools and name not in args.tools:
+            continue
+        app = next(app for app in apps if name in app.registry)
+        request = {"name": name, "parameters": parameters}
+        response = app.invoke_tool(name, parameters)
+        for codec in codecs:
+            request_body = codec.dumps(request)
+            response_body = codec.dumps(response)
+            timings = [per_call_us(codec.dumps, request, args.min_time),
+                       per_call_us(codec.loads, request_body, args.min_time),
+                       per_call_us(codec.dumps, response, args.min_time),
+                       per_call_us(codec.loads, response_body, args.min_time)]
+            print(f"{label:<40} {codec.name:<8} {len(request_body):>9} {len(response_body):>9} "
+                  + " ".join(f"{t:>9.1f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import http.client
+import json
+import socket
+import statistics
+import threading
+import time
+
+import server_CALC
+from mcp_http import SERVER_MODES, make_server
+
+# Throughput comparison of the serving modes in mcp_http.
+#
+# Starts the calculator server in-process once per mode and hammers
+# /mcp/invoke from N client threads for a fixed duration. "single" is the
+# original socketserver.TCPServer + HTTP/1.0 setup every server used to run.
+#
+#   python bench_servers.py --clients 16 --duration 5
+#   python bench_servers.py --slow-client   # one client that never finishes its request
+
+REQUEST_BODY = json.dumps({"name": "calc___add", "parameters": {"a": 2, "b": 3}}).encode("utf-8")
+REQUEST_HEADERS = {"Content-Type": "application/json"}
+
+
+def run_client(port, deadline, timeout, results, lock):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    latencies = []
+    errors = 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/mcp/invoke", REQUEST_BODY, REQUEST_HEADERS)
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+    conn.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["errors"] += errors
+
+
+def open_slow_client(port):
+    # Sends half a request line and then goes quiet, like a stalled peer
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(b"POST /mcp/invoke HTTP/1.1\r\n")
+    return sock
+
+
+def bench_mode(mode, clients, duration, workers, timeout, slow_client):
+    server = make_server(server_CALC.app, port=0, mode=mode, host="127.0.0.1",
+                         workers=workers, keepalive_timeout=duration + timeout, quiet=True)
+    port = server.server_address[1]
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    time.sleep(0.2)
+
+    slow = open_slow_client(port) if slow_client else None
+    results = {"latencies": [], "errors": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=run_client, args=(port, deadline, timeout, results, lock))
+               for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if slow is not None:
+        slow.close()
+    server.stop(grace=1)
+    server_thread.join(timeout=5)
+
+    latencies = sorted(results["latencies"])
+    count = len(latencies)
+    return {
+        "mode": mode,
+        "requests": count,
+        "errors": results["errors"],
+        "rps": count / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if count else float("nan"),
+        "p99_ms": latencies[min(count - 1, int(count * 0.99))] * 1000 if count else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare MCP server serving modes")
+    parser.add_argument("--modes", nargs="+", choices=SERVER_MODES, default=list(SERVER_MODES))
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client connections")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per mode")
+    parser.add_argument("--workers", type=int, default=32, help="Server worker limit")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Client request timeout")
+    parser.add_argument("--slow-client", action="store_true",
+                        help="Hold one stalled connection open during the run")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'requests':>9} {'errors':>7} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes:
+        row = bench_mode(mode, args.clients, args.duration, args.workers, args.timeout, args.slow_client)
+        print(f"{row['mode']:<10} {row['requests']:>9} {row['errors']:>7} {row['rps']:>10.0f} "
+              f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import base64
+import binascii
+
+import numpy as np
+
+# Array parameters and results for the calc___array_* tools.
+#
+# An array is passed either as JSON - a number or a (nested) list of numbers -
+# or in a compact binary form that skips JSON float parsing entirely:
+#
+#   {"dtype": "float64", "shape": [2, 3], "data": "<base64>"}
+#
+# where data is the little-endian, C-order buffer and shape is optional (a
+# flat array by default). Results come back as JSON lists unless the caller
+# asks for encoding="base64", in which case they use the same binary form.
+#
+# Over MessagePack (see mcp_codec.py) data may be sent as raw binary instead
+# of base64, and binary results are returned that way: encode_array leaves
+# data as bytes and the codec writes it as base64 only for JSON responses.
+
+DTYPES = ("float64", "float32", "int64", "int32")
+ENCODINGS = ("json", "base64")
+MAX_ARRAY_ELEMENTS = 10_000_000
+
+
+class ArrayError(ValueError):
+    pass
+
+
+def array_schema(description):
+    return {
+        "description": description,
+        "oneOf": [
+            {"type": "number"},
+            {"type": "array", "description": "Numbers, or nested lists for a multi-dimensional array"},
+            {
+                "type": "object",
+                "properties": {
+                    "dtype": {"type": "string", "enum": list(DTYPES)},
+                    "shape": {"type": "array", "items": {"type": "integer"}},
+                    "data": {"type": "string", "contentEncoding": "base64",
+                             "description": "base64 of the little-endian C-order buffer"}
+                },
+                "required": ["dtype", "data"]
+            }
+        ]
+    }
+
+
+ENCODING_SCHEMA = {
+    "type": "string",
+    "enum": list(ENCODINGS),
+    "description": "Array result format: json lists (default) or the base64 binary form",
+}
+
+
+def decode_array(value, name):
+    if value is None:
+        raise ArrayError(f"Missing {name} parameter")
+    if isinstance(value, dict):
+        return _decode_binary(value, name)
+    if isinstance(value, (bool, str)):
+        raise ArrayError(f"{name} must be a number or a list of numbers")
+    try:
+        array = np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ArrayError(f"{name} must be a number or a (non-ragged) list of numbers")
+    if array.size > MAX_ARRAY_ELEMENTS:
+        raise ArrayError(f"{name} has too many elements (max {MAX_ARRAY_ELEMENTS})")
+    return array
+
+
+def _decode_binary(value, name):
+    dtype = value.get("dtype")
+    if dtype not in DTYPES:
+        raise ArrayError(f"{name}: dtype must be one of {', '.join(DTYPES)}")
+    dtype = np.dtype(dtype).newbyteorder("<")
+    data = value.get("data")
+    if isinstance(data, (bytes, bytearray)):
+        buffer = data  # raw binary from a MessagePack body
+    elif isinstance(data, str):
+        if len(data) * 3 // 4 > MAX_ARRAY_ELEMENTS * dtype.itemsize:
+            raise ArrayError(f"{name} has too many elements (max {MAX_ARRAY_ELEMENTS})")
+        try:
+            buffer = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            raise ArrayError(f"{name}: data is not valid base64")
+    else:
+        raise ArrayError(f"{name}: data must be a base64 string")
+    if len(buffer) > MAX_ARRAY_ELEMENTS * dtype.itemsize:
+        raise ArrayError(f"{name} has too many elements (max {MAX_ARRAY_ELEMENTS})")
+    if len(buffer) % dtype.itemsize:
+        raise ArrayError(f"{name}: data length is not a multiple of the {dtype.name} item size")
+    # Zero-copy view of the decoded bytes; kernels never write to their inputs
+    array = np.frombuffer(buffer, dtype=dtype)
+    shape = value.get("shape")
+    if shape is not None:
+        try:
+            array = array.reshape(shape)
+        except (TypeError, ValueError):
+            raise ArrayError(f"{name}: shape {shape} does not match its {array.size} elements")
+    return array
+
+
+def encode_array(array, encoding="json"):
+    array = np.asarray(array)
+    if array.ndim == 0:
+        return array.item()
+    if encoding != "base64":
+        return array.tolist()
+    if array.dtype.name not in DTYPES:
+        array = array.astype(np.float64)
+    array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+    return {
+        "dtype": array.dtype.name,
+        "shape": list(array.shape),
+        "data": array.tobytes(),  # base64 in JSON, raw binary in MessagePack
+    }
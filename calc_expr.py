@@ -0,0 +1,153 @@
+import ast
+import math
+import operator
+from functools import lru_cache, reduce
+
+import numpy as np
+
+# Arithmetic expressions for calc___eval, e.g. "sqrt(a*b + c) / d".
+#
+# The text is parsed with ast and every node is checked against a whitelist
+# (numbers, variables, + - * / // % **, unary minus and the functions below),
+# then turned into a tree of closures - nothing is ever passed to eval(). The
+# same tree runs on Python floats for a single evaluation, or on NumPy arrays
+# to evaluate the expression over a whole column of bindings at once. Compiled
+# expressions are cached by their text, so repeated calls skip parsing.
+
+MAX_EXPRESSION_LENGTH = 1000
+EXPRESSION_CACHE_SIZE = 1024
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+
+def _fold(function):
+    return lambda *values: reduce(function, values)
+
+
+# Operators and functions by name, for scalar and for array evaluation.
+# math.pow rather than ** for scalars: it raises instead of returning a
+# complex number for a negative base with a fractional exponent.
+SCALAR_LIBRARY = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv,
+    "//": operator.floordiv, "%": operator.mod, "**": math.pow,
+    "neg": operator.neg, "pos": operator.pos,
+    "sqrt": math.sqrt, "abs": abs, "exp": math.exp, "log": math.log, "log10": math.log10,
+    "log2": math.log2, "sin": math.sin, "cos": math.cos, "tan": math.tan, "asin": math.asin,
+    "acos": math.acos, "atan": math.atan, "atan2": math.atan2, "hypot": math.hypot,
+    "floor": math.floor, "ceil": math.ceil, "round": round, "pow": math.pow,
+    "min": min, "max": max,
+}
+
+ARRAY_LIBRARY = {
+    "+": np.add, "-": np.subtract, "*": np.multiply, "/": np.true_divide,
+    "//": np.floor_divide, "%": np.mod, "**": np.power,
+    "neg": np.negative, "pos": np.positive,
+    "sqrt": np.sqrt, "abs": np.abs, "exp": np.exp, "log": np.log, "log10": np.log10,
+    "log2": np.log2, "sin": np.sin, "cos": np.cos, "tan": np.tan, "asin": np.arcsin,
+    "acos": np.arccos, "atan": np.arctan, "atan2": np.arctan2, "hypot": np.hypot,
+    "floor": np.floor, "ceil": np.ceil, "round": np.round, "pow": np.power,
+    "min": _fold(np.minimum), "max": _fold(np.maximum),
+}
+
+# Number of arguments each function takes (None: one or more)
+FUNCTIONS = {
+    "sqrt": 1, "abs": 1, "exp": 1, "log": 1, "log10": 1, "log2": 1, "sin": 1, "cos": 1,
+    "tan": 1, "asin": 1, "acos": 1, "atan": 1, "atan2": 2, "hypot": 2, "floor": 1,
+    "ceil": 1, "round": 1, "pow": 2, "min": None, "max": None,
+}
+
+BINARY_OPERATORS = {
+    ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/",
+    ast.FloorDiv: "//", ast.Mod: "%", ast.Pow: "**",
+}
+UNARY_OPERATORS = {ast.USub: "neg", ast.UAdd: "pos"}
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+class CompiledExpression:
+    def __init__(self, text, function, variables):
+        self.text = text
+        self.variables = variables  # names the expression needs bindings for
+        self._function = function
+
+    def evaluate(self, variables):
+        # One evaluation on Python floats; raises ZeroDivisionError,
+        # ValueError (math domain) or OverflowError like the math module
+        return self._function(variables, SCALAR_LIBRARY)
+
+    def evaluate_arrays(self, variables):
+        # Vectorized evaluation: variables map to NumPy arrays (or floats)
+        # that broadcast together. Invalid elements come out as NaN/inf.
+        with np.errstate(all="ignore"):
+            return self._function(variables, ARRAY_LIBRARY)
+
+
+def _constant(value):
+    return lambda env, library: value
+
+
+def _variable(name):
+    return lambda env, library: env[name]
+
+
+def _binary(symbol, left, right):
+    return lambda env, library: library[symbol](left(env, library), right(env, library))
+
+
+def _unary(name, operand):
+    return lambda env, library: library[name](operand(env, library))
+
+
+def _call(name, arguments):
+    return lambda env, library: library[name](*[argument(env, library) for argument in arguments])
+
+
+def _compile_node(node, variables):
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"Unsupported constant: {node.value!r}")
+        # Floats throughout, so 10**10**10 overflows instead of building a huge integer
+        return _constant(float(node.value))
+    if isinstance(node, ast.Name):
+        if node.id in CONSTANTS:
+            return _constant(CONSTANTS[node.id])
+        variables.add(node.id)
+        return _variable(node.id)
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        return _binary(BINARY_OPERATORS[type(node.op)],
+                       _compile_node(node.left, variables), _compile_node(node.right, variables))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return _unary(UNARY_OPERATORS[type(node.op)], _compile_node(node.operand, variables))
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExpressionError(f"Unknown function; allowed: {', '.join(sorted(FUNCTIONS))}")
+        name = node.func.id
+        if node.keywords:
+            raise ExpressionError(f"{name}() does not take keyword arguments")
+        arity = FUNCTIONS[name]
+        if arity is None and not node.args:
+            raise ExpressionError(f"{name}() takes at least one argument")
+        if arity is not None and len(node.args) != arity:
+            raise ExpressionError(f"{name}() takes {arity} argument{'s' if arity > 1 else ''}")
+        return _call(name, [_compile_node(argument, variables) for argument in node.args])
+    raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(text):
+    # Raises ExpressionError for anything outside the whitelist
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression is too long (max {MAX_EXPRESSION_LENGTH} characters)")
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        raise ExpressionError(f"Invalid expression: {getattr(e, 'msg', None) or e}")
+    variables = set()
+    try:
+        function = _compile_node(tree.body, variables)
+    except RecursionError:
+        raise ExpressionError("Expression is nested too deeply")
+    return CompiledExpression(text, function, frozenset(variables))
@@ -0,0 +1,280 @@
+import math
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from difflib import SequenceMatcher
+from heapq import heappush, heapreplace, nlargest
+
+from countries import COUNTRY_ALIASES, COUNTRY_NAMES
+
+# City lookup for the weather server, sized for GeoNames-scale datasets
+# (100k+ rows).
+#
+# Cities are stored as parallel columns (compact arrays for the numbers)
+# rather than one dict per city. These indexes are built when the index is
+# created:
+#   - name index: row ids sorted by normalized name (most populous first for
+#     equal names), for exact and prefix lookups and paginated listing
+#   - trigram index: trigram -> names containing it, for fuzzy matching of
+#     misspelled names
+#   - k-d tree over the cities' 3-D unit-sphere coordinates, for
+#     nearest-city queries without longitude wrap-around special cases
+#   - row ids sorted by latitude, for bounding-box queries
+#   - country forms: for each stored country, every way a query may name it
+#     (ISO code, English name, common aliases; see countries.py), so
+#     "Paris, FR" and "Paris, France" work whichever form the dataset stores
+
+EARTH_RADIUS_KM = 6371.0
+PREFIX_SCAN_LIMIT = 1000  # rows examined to pick the most populous prefix match
+FUZZY_CANDIDATES = 50  # names sharing the most trigrams that get a full similarity score
+FUZZY_MIN_SCORE = 0.6
+
+
+def normalize(name):
+    # Case- and accent-insensitive form used by every name lookup
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.lower().split())
+
+
+def _country_forms_by_code():
+    # ISO code -> normalized code, name and aliases; and each of those -> code
+    forms, codes = {}, {}
+    for code, name in COUNTRY_NAMES.items():
+        forms[code] = frozenset(normalize(form) for form in (code, name) + COUNTRY_ALIASES.get(code, ()))
+        for form in forms[code]:
+            codes[form] = code
+    return forms, codes
+
+
+COUNTRY_FORMS, COUNTRY_CODES = _country_forms_by_code()
+
+
+def country_forms(country):
+    # Normalized forms a query may use for a stored country value
+    normalized = normalize(country)
+    code = COUNTRY_CODES.get(normalized)
+    return COUNTRY_FORMS[code] if code else frozenset((normalized,))
+
+
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _unit_vector(latitude, longitude):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def _chord_to_km(chord_squared):
+    return 2 * math.asin(min(1.0, math.sqrt(chord_squared) / 2)) * EARTH_RADIUS_KM
+
+
+class CityIndex:
+    def __init__(self, names, countries, latitudes, longitudes, populations):
+        self.names = list(names)
+        self.countries = list(countries)
+        self.latitudes = array("d", latitudes)
+        self.longitudes = array("d", longitudes)
+        self.populations = array("q", populations)
+        self._build_name_index()
+        self._country_forms = {country: country_forms(country) for country in set(self.countries)}
+        self._build_trigram_index()
+        self._build_kdtree()
+        self._build_latitude_index()
+
+    @classmethod
+    def from_records(cls, records):
+        # records: iterable of dicts with name, country, latitude, longitude
+        # and optionally population
+        records = list(records)
+        return cls([r["name"] for r in records], [r["country"] for r in records],
+                   [r["latitude"] for r in records], [r["longitude"] for r in records],
+                   [r.get("population", 0) for r in records])
+
+    def __len__(self):
+        return len(self.names)
+
+    def key(self, row):
+        # Stable identity of a city, also for datasets with several cities of one name
+        return f"{normalize(self.names[row])}@{self.latitudes[row]:.2f},{self.longitudes[row]:.2f}"
+
+    def info(self, row):
+        return {
+            "name": self.names[row],
+            "country": self.countries[row],
+            "latitude": self.latitudes[row],
+            "longitude": self.longitudes[row],
+            "population": self.populations[row],
+        }
+
+    # -- names ---------------------------------------------------------------
+
+    def _build_name_index(self):
+        normalized = [normalize(name) for name in self.names]
+        populations = self.populations
+        order = sorted(range(len(normalized)), key=lambda row: (normalized[row], -populations[row]))
+        self._order = array("l", order)
+        self._sorted_names = [normalized[row] for row in order]
+
+    def _name_range(self, name):
+        # Positions in the name index holding exactly `name` (normalized)
+        return bisect_left(self._sorted_names, name), bisect_right(self._sorted_names, name)
+
+    def _prefix_range(self, prefix):
+        return bisect_left(self._sorted_names, prefix), bisect_left(self._sorted_names, prefix + "\U0010ffff")
+
+    def _pick(self, positions, country):
+        # Most populous row among positions, optionally in one country
+        best = None
+        for position in positions:
+            row = self._order[position]
+            if country and country not in self._country_forms[self.countries[row]]:
+                continue
+            if best is None or self.populations[row] > self.populations[best]:
+                best = row
+        return best
+
+    def resolve(self, query):
+        # Returns (row, how) where how is "exact", "prefix" or "fuzzy", or
+        # (None, None). "Paris, France" / "Paris, FR" restricts the country,
+        # by code or name whichever the dataset stores.
+        name, _, country = query.partition(",")
+        name, country = normalize(name), normalize(country)
+        if not name:
+            return None, None
+        lo, hi = self._name_range(name)
+        row = self._pick(range(lo, hi), country)
+        if row is not None:
+            return row, "exact"
+        lo, hi = self._prefix_range(name)
+        row = self._pick(range(lo, min(hi, lo + PREFIX_SCAN_LIMIT)), country)
+        if row is not None:
+            return row, "prefix"
+        for match in self.fuzzy(name):
+            lo, hi = self._name_range(match)
+            row = self._pick(range(lo, hi), country)
+            if row is not None:
+                return row, "fuzzy"
+        return None, None
+
+    def _build_trigram_index(self):
+        # Unique names only: many cities share a name
+        self._unique_names = list(dict.fromkeys(self._sorted_names))
+        postings = {}
+        for name_id, name in enumerate(self._unique_names):
+            for gram in trigrams(name):
+                postings.setdefault(gram, array("l")).append(name_id)
+        self._trigrams = postings
+
+    def fuzzy(self, query, limit=5):
+        # Normalized names most similar to query, best first
+        query = normalize(query)
+        shared = Counter()
+        for gram in trigrams(query):
+            shared.update(self._trigrams.get(gram, ()))
+        scored = []
+        for name_id, _ in shared.most_common(FUZZY_CANDIDATES):
+            name = self._unique_names[name_id]
+            score = SequenceMatcher(None, query, name).ratio()
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((score, name))
+        scored.sort(key=lambda item: -item[0])
+        return [name for _, name in scored[:limit]]
+
+    def suggestions(self, query, limit=5):
+        return [self.names[self._order[self._name_range(name)[0]]] for name in self.fuzzy(query, limit)]
+
+    def page(self, prefix="", offset=0, limit=100):
+        # Rows in name order (optionally under a prefix): (rows, next offset or None)
+        lo, hi = self._prefix_range(normalize(prefix)) if prefix else (0, len(self._order))
+        start = lo + offset
+        end = min(hi, start + limit)
+        rows = [self._order[position] for position in range(start, end)]
+        return rows, (end - lo if end < hi else None)
+
+    # -- geography -----------------------------------------------------------
+
+    def _build_kdtree(self):
+        # Implicit balanced tree: the subtree over tree[lo:hi] has its root at
+        # the median position (lo + hi) // 2 and splits on axis depth % 3
+        coordinates = [_unit_vector(lat, lon) for lat, lon in zip(self.latitudes, self.longitudes)]
+        self._axes = [array("d", (c[axis] for c in coordinates)) for axis in range(3)]
+        tree = list(range(len(coordinates)))
+        stack = [(0, len(tree), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= 1:
+                continue
+            tree[lo:hi] = sorted(tree[lo:hi], key=self._axes[depth % 3].__getitem__)
+            mid = (lo + hi) // 2
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+        self._tree = array("l", tree)
+
+    def nearest(self, latitude, longitude, count=1):
+        # [(row, distance_km)] for the `count` cities closest to the point
+        target = _unit_vector(latitude, longitude)
+        axes, tree = self._axes, self._tree
+        best = []  # (negated squared chord distance, row); a max-heap of size count
+
+        def search(lo, hi, depth):
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            row = tree[mid]
+            distance = sum((target[axis] - axes[axis][row]) ** 2 for axis in range(3))
+            if len(best) < count:
+                heappush(best, (-distance, row))
+            elif distance < -best[0][0]:
+                heapreplace(best, (-distance, row))
+            axis = depth % 3
+            difference = target[axis] - axes[axis][row]
+            near, far = ((lo, mid), (mid + 1, hi)) if difference < 0 else ((mid + 1, hi), (lo, mid))
+            search(*near, depth + 1)
+            if len(best) < count or difference * difference < -best[0][0]:
+                search(*far, depth + 1)
+
+        search(0, len(tree), 0)
+        return [(row, _chord_to_km(-negated)) for negated, row in sorted(best, reverse=True)]
+
+    def _build_latitude_index(self):
+        self._by_latitude = array("l", sorted(range(len(self.names)), key=self.latitudes.__getitem__))
+        self._sorted_latitudes = array("d", (self.latitudes[row] for row in self._by_latitude))
+
+    def within(self, south, west, north, east, limit=None):
+        # Rows inside the box, most populous first. west > east means the box
+        # crosses the 180th meridian.
+        lo = bisect_left(self._sorted_latitudes, south)
+        hi = bisect_right(self._sorted_latitudes, north)
+        longitudes = self.longitudes
+        if west <= east:
+            rows = [row for row in self._by_latitude[lo:hi] if west <= longitudes[row] <= east]
+        else:
+            rows = [row for row in self._by_latitude[lo:hi] if longitudes[row] >= west or longitudes[row] <= east]
+        if limit is not None and len(rows) > limit:
+            return nlargest(limit, rows, key=self.populations.__getitem__)
+        return sorted(rows, key=self.populations.__getitem__, reverse=True)
+
+
+def load_geonames(path, min_population=0):
+    # GeoNames dump (cities500.txt, cities15000.txt, ...): tab-separated with
+    # name in column 1, latitude/longitude in 4/5, country code in 8 and
+    # population in 14
+    names, countries, latitudes, longitudes, populations = [], [], [], [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15:
+                continue
+            population = int(fields[14] or 0)
+            if population < min_population:
+                continue
+            names.append(fields[1])
+            countries.append(fields[8])
+            latitudes.append(float(fields[4]))
+            longitudes.append(float(fields[5]))
+            populations.append(population)
+    return CityIndex(names, countries, latitudes, longitudes, populations)
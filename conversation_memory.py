@@ -0,0 +1,191 @@
+import json
+import threading
+
+# Conversation history for the chat client, kept within the model's context
+# window.
+#
+# Messages are grouped into turns (a user message and everything that
+# follows it up to the next user message), so an assistant tool_calls message
+# is never separated from its tool results. Each request sends the system
+# message plus as many of the most recent turns as fit in the token budget;
+# older turns are dropped - and, if a summarizer is configured, folded into a
+# running summary that is sent along with the system message.
+#
+# Tool results larger than compact_tokens are kept in a ResultStore and the
+# conversation only gets a handle plus a shortened preview; the model can
+# page through the full result with the memory___get_result tool.
+#
+# Token counts are estimates (about 4 characters per token for JSON and
+# English text), which is close enough for budgeting.
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4  # role and framing per message
+DEFAULT_BUDGET_TOKENS = 6000
+COMPACT_TOKENS = 400  # tool results above this go to the result store
+PREVIEW_TOKENS = 120
+RESULT_PAGE_CHARS = 2000
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+def message_tokens(message):
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or ():
+        tokens += estimate_tokens(tool_call["function"]["name"] + tool_call["function"]["arguments"])
+    return tokens
+
+
+def preview(value, max_chars, depth=0):
+    # Shrinks a JSON value to roughly max_chars: long lists keep their first
+    # items plus a count, long strings are cut, nesting is flattened
+    if isinstance(value, list):
+        if depth >= 3:
+            return f"[{len(value)} items]"
+        items = []
+        used = 0
+        for item in value:
+            shown = preview(item, max_chars // 4, depth + 1)
+            used += len(json.dumps(shown))
+            if used > max_chars and items:
+                items.append(f"... {len(value) - len(items)} more items")
+                break
+            items.append(shown)
+        return items
+    if isinstance(value, dict):
+        if depth >= 4:
+            return f"{{{len(value)} fields}}"
+        return {key: preview(item, max_chars // 2, depth + 1) for key, item in value.items()}
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "..."
+    return value
+
+
+class ResultStore:
+    # Full tool results that were too large to keep in the conversation
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def put(self, content):
+        with self._lock:
+            handle = f"result-{len(self._results) + 1}"
+            self._results[handle] = content
+        return handle
+
+    def read(self, parameters):
+        # memory___get_result handler: a page of the stored JSON text
+        content = self._results.get(parameters.get("handle"))
+        if content is None:
+            return {"error": f"Unknown result handle: {parameters.get('handle')}"}
+        try:
+            offset = max(0, int(parameters.get("offset") or 0))
+        except (TypeError, ValueError):
+            return {"error": "offset must be an integer"}
+        end = offset + RESULT_PAGE_CHARS
+        return {"result": {
+            "content": content[offset:end],
+            "next_offset": end if end < len(content) else None,
+            "total_chars": len(content),
+        }}
+
+
+RESULT_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "memory___get_result",
+        "description": "[MEMORY] Read a large tool result that was stored instead of shown in full, "
+                       f"{RESULT_PAGE_CHARS} characters of its JSON at a time",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string", "description": "The handle from the stored result"},
+                "offset": {"type": "integer", "description": "Character offset to read from (default 0)"}
+            },
+            "required": ["handle"]
+        }
+    }
+}
+
+
+class ConversationMemory:
+    def __init__(self, system_message, store=None, budget_tokens=DEFAULT_BUDGET_TOKENS,
+                 compact_tokens=COMPACT_TOKENS, summarizer=None):
+        self.system_message = system_message
+        self.store = store or ResultStore()
+        self.budget_tokens = budget_tokens
+        self.compact_tokens = compact_tokens
+        self.summarizer = summarizer  # callable(summary, messages) -> new summary text
+        self.summary = None
+        self.turns = []
+        self.compacted_results = 0
+        self.full_history_tokens = 0  # what the untrimmed, uncompacted history would cost
+        self.last_stats = {}
+
+    def add_user(self, content):
+        self.turns.append([])
+        self.add({"role": "user", "content": content})
+
+    def add(self, message, full_tokens=None):
+        if not self.turns:
+            self.turns.append([])
+        self.turns[-1].append(message)
+        self.full_history_tokens += full_tokens or message_tokens(message)
+
+    def add_tool_result(self, tool_call_id, result):
+        content = json.dumps(result)
+        full_tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content)
+        if full_tokens > self.compact_tokens:
+            handle = self.store.put(content)
+            content = json.dumps({
+                "stored_result": handle,
+                "total_chars": len(content),
+                "preview": preview(result, PREVIEW_TOKENS * CHARS_PER_TOKEN),
+                "note": "Result too large to show in full; call memory___get_result with this handle to read it"
+            })
+            self.compacted_results += 1
+        self.add({"role": "tool", "tool_call_id": tool_call_id, "content": content}, full_tokens)
+
+    def _system(self):
+        if not self.summary:
+            return self.system_message
+        return dict(self.system_message,
+                    content=self.system_message["content"] + "\n\nSummary of the earlier conversation:\n" + self.summary)
+
+    def messages(self, reserve_tokens=0):
+        # Messages for the next request: the system message and the newest
+        # turns that fit in budget_tokens - reserve_tokens (the tool schemas).
+        # The current turn is always sent in full.
+        budget = self.budget_tokens - reserve_tokens
+        turn_tokens = [sum(message_tokens(m) for m in turn) for turn in self.turns]
+        used = message_tokens(self._system())
+        keep = 0
+        for tokens in reversed(turn_tokens):
+            if keep and used + tokens > budget:
+                break
+            used += tokens
+            keep += 1
+
+        dropped = len(self.turns) - keep
+        if dropped:
+            old, self.turns = self.turns[:dropped], self.turns[dropped:]
+            if self.summarizer is not None:
+                self.summary = self.summarizer(self.summary, [m for turn in old for m in turn])
+                used = message_tokens(self._system()) + sum(turn_tokens[dropped:])
+
+        self.last_stats = {
+            "tokens": used + reserve_tokens,
+            "history_tokens": message_tokens(self.system_message) + self.full_history_tokens + reserve_tokens,
+            "dropped_turns": dropped,
+            "compacted_results": self.compacted_results,
+        }
+        return [self._system()] + [message for turn in self.turns for message in turn]
+
+    def log_line(self, prompt_tokens=None):
+        stats = self.last_stats
+        line = (f"[Context] ~{stats['tokens']} tokens sent (full history ~{stats['history_tokens']}, "
+                f"{stats['dropped_turns']} old turns dropped, {stats['compacted_results']} results stored)")
+        if prompt_tokens is not None:
+            line += f", model counted {prompt_tokens} prompt tokens"
+        return line
@@ -0,0 +1,116 @@
+import heapq
+from collections import OrderedDict
+
+# Bookkeeping structures used by KeyValueStore for TTL expiry and for
+# evicting keys once the store is over its memory cap. None of these are
+# thread-safe on their own; the store calls them under its lock.
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+
+class ExpiryHeap:
+    # Min-heap of (deadline, key). Entries are never removed in place: when a
+    # key's TTL changes or it is deleted, the old entry stays in the heap and
+    # is skipped when popped because it no longer matches the live deadline.
+    def __init__(self, deadlines=None):
+        self._heap = [(deadline, key) for key, deadline in (deadlines or {}).items()]
+        heapq.heapify(self._heap)
+
+    def push(self, key, deadline):
+        heapq.heappush(self._heap, (deadline, key))
+
+    def next_deadline(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now, deadlines, limit):
+        # Keys whose live deadline (from `deadlines`) is <= now, at most `limit`
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < limit:
+            deadline, key = heapq.heappop(self._heap)
+            if deadlines.get(key) == deadline:
+                due.append(key)
+        return due
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class LRUPolicy:
+    # Least recently used: an OrderedDict kept in access order
+    def __init__(self, keys=()):
+        self._order = OrderedDict.fromkeys(keys)
+
+    def add(self, key):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def touch(self, key):
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def remove(self, key):
+        self._order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self._order), None)
+
+
+class LFUPolicy:
+    # Least frequently used, ties broken by least recent use. Keys live in one
+    # insertion-ordered bucket per access count, so every operation is O(1)
+    # apart from skipping over emptied buckets when looking for a victim.
+    def __init__(self, keys=()):
+        self._counts = {}
+        self._buckets = {}
+        self._min_count = 1
+        for key in keys:
+            self.add(key)
+
+    def _bucket(self, count):
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = OrderedDict()
+        return bucket
+
+    def add(self, key):
+        if key in self._counts:
+            self.touch(key)
+            return
+        self._counts[key] = 1
+        self._bucket(1)[key] = None
+        self._min_count = 1
+
+    def touch(self, key):
+        count = self._counts.get(key)
+        if count is None:
+            return
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+        self._counts[key] = count + 1
+        self._bucket(count + 1)[key] = None
+
+    def remove(self, key):
+        count = self._counts.pop(key, None)
+        if count is None:
+            return
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+    def victim(self):
+        if not self._counts:
+            return None
+        while self._min_count not in self._buckets:
+            self._min_count += 1
+        return next(iter(self._buckets[self._min_count]))
+
+
+def make_policy(name, keys=()):
+    if name == "lru":
+        return LRUPolicy(keys)
+    if name == "lfu":
+        return LFUPolicy(keys)
+    raise ValueError(f"Unknown eviction policy: {name}")
@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+from multiprocessing import util
+from multiprocessing.managers import BaseManager, BaseProxy
+
+from kv_storage import KeyValueStore, open_backend
+
+# One key-value store shared by the worker processes of a multi-process
+# key-value server (server_SGL.py --processes N, see mcp_prefork.py).
+#
+# Copies of the store in each worker would drift apart, so the store lives in
+# a single owner process and the workers reach it over a Unix socket. The
+# owner is a multiprocessing manager: StoreOwner starts it before the workers
+# are forked, and each worker's connect_store() returns a proxy with the same
+# methods as KeyValueStore, so the tool handlers do not know the difference.
+#
+# Every store operation is one round trip to the owner, where it runs under
+# the store lock as before, so multi-key writes, incr and compare_and_set stay
+# atomic across all workers, and TTL expiry, eviction and the write-ahead log
+# are handled in one place. What the workers gain is everything around the
+# store - parsing, validation, encoding - running in parallel; a store call
+# costs a local socket round trip (tens of microseconds) instead of a lock.
+#
+# The socket is created in a fresh directory only this user can enter, and
+# connections must also present a random per-run key. Proxies keep one
+# connection per thread, so worker threads do not queue behind each other.
+
+AUTHKEY_BYTES = 32
+
+_store = None  # the KeyValueStore, in the owner process
+
+
+def _open_store(kind, directory, sync, max_bytes, eviction):
+    # Runs in the owner process before it starts taking connections
+    global _store
+    _store = KeyValueStore(open_backend(kind, directory, sync), max_bytes=max_bytes, eviction=eviction)
+    # Closed when the owner exits after shutdown(), so the log ends cleanly
+    util.Finalize(_store, _store.close, exitpriority=10)
+
+
+def _get_store():
+    return _store
+
+
+class StoreProxy(BaseProxy):
+    # KeyValueStore's interface, forwarded to the owner process
+    _exposed_ = ("get", "mget", "ttl", "set", "delete", "mset", "delete_many", "incr", "compare_and_set",
+                 "scan", "read_page", "counters", "stats", "__len__", "__contains__")
+
+    def get(self, key):
+        return self._callmethod("get", (key,))
+
+    def mget(self, keys):
+        return self._callmethod("mget", (list(keys),))
+
+    def ttl(self, key):
+        return self._callmethod("ttl", (key,))
+
+    def set(self, key, value, ttl_seconds=None):
+        return self._callmethod("set", (key, value, ttl_seconds))
+
+    def delete(self, key):
+        return self._callmethod("delete", (key,))
+
+    def mset(self, items, ttl_seconds=None):
+        # items may be a dict view, which does not pickle
+        return self._callmethod("mset", (list(items), ttl_seconds))
+
+    def delete_many(self, keys):
+        return self._callmethod("delete_many", (list(keys),))
+
+    def incr(self, key, amount=1):
+        return self._callmethod("incr", (key, amount))
+
+    def compare_and_set(self, key, expected, value, ttl_seconds=None):
+        return self._callmethod("compare_and_set", (key, expected, value, ttl_seconds))
+
+    def scan(self, prefix="", after=None, limit=None):
+        return self._callmethod("scan", (prefix, after, limit))
+
+    def read_page(self, prefix="", after=None, limit=1000):
+        return self._callmethod("read_page", (prefix, after, limit))
+
+    def items(self, prefix="", page_size=1000):
+        # Same paging as KeyValueStore.items(), one round trip per page
+        after = None
+        while True:
+            pairs, after = self.read_page(prefix, after, page_size)
+            yield from pairs
+            if after is None:
+                return
+
+    def counters(self):
+        return self._callmethod("counters")
+
+    def stats(self):
+        return self._callmethod("stats")
+
+    def __len__(self):
+        return self._callmethod("__len__")
+
+    def __contains__(self, key):
+        return self._callmethod("__contains__", (key,))
+
+    def close(self):
+        # The store belongs to the owner process; StoreOwner.shutdown() closes it
+        pass
+
+
+class _StoreManager(BaseManager):
+    pass
+
+
+_StoreManager.register("store", callable=_get_store, proxytype=StoreProxy)
+
+
+class StoreOwner:
+    # Runs the store in a child process; address is what the workers pass
+    # to connect_store()
+    def __init__(self, kind="memory", directory=None, sync="group", max_bytes=None, eviction="lru"):
+        self._socket_dir = tempfile.mkdtemp(prefix="mcp-kv-")  # mode 0700
+        self.address = (os.path.join(self._socket_dir, "store.sock"), os.urandom(AUTHKEY_BYTES))
+        self._manager = _StoreManager(address=self.address[0], authkey=self.address[1])
+        try:
+            self._manager.start(_open_store, (kind, directory, sync, max_bytes, eviction))
+        except EOFError:
+            # The owner printed why (e.g. an unusable data directory) and exited
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            raise RuntimeError("The key-value store owner process failed to start") from None
+
+    def shutdown(self):
+        self._manager.shutdown()
+        shutil.rmtree(self._socket_dir, ignore_errors=True)
+
+
+def connect_store(address):
+    # A StoreProxy for the store of the StoreOwner at address
+    path, authkey = address
+    manager = _StoreManager(address=path, authkey=authkey)
+    manager.connect()
+    return manager.store()
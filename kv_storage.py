@@ -0,0 +1,907 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+from kv_policies import ExpiryHeap, make_policy
+from sorted_keys import SortedKeyList
+
+# Storage backends for the key-value server.
+#
+#   memory - plain dict, nothing survives a restart (the original behaviour)
+#   wal    - dict in memory, every write appended to a write-ahead log with
+#            group commit; the log is periodically compacted into a snapshot
+#   mmap   - like wal, but the snapshot is paired with an on-disk hash index
+#            that is memory-mapped at startup, so only the log written since
+#            the last compaction has to be replayed and values stay on disk
+#
+# On-disk layout of a wal/mmap directory, where N is the generation number:
+#   CURRENT    - generation of the newest complete snapshot
+#   data.N     - snapshot: one SET record per live key
+#   index.N    - (mmap only) open-addressing table of key hash -> data.N offset
+#   ttl.N      - EXPIRE records for the keys in data.N that have a TTL
+#   wal.N      - records written since data.N was started
+# Compaction starts wal.N+1, writes data.N+1 from a frozen view of the store,
+# switches CURRENT and then removes generation N. Recovery loads the snapshot
+# named by CURRENT and replays every wal.M with M >= N in order, so a crash at
+# any point in that sequence loses nothing that was acknowledged.
+
+BACKENDS = ("memory", "wal", "mmap")
+SYNC_MODES = ("group", "always", "none")
+
+OP_SET = 1
+OP_DELETE = 2
+OP_BATCH = 3  # value holds several SET/DELETE records that must apply all-or-nothing
+OP_EXPIRE = 4  # value is the key's absolute expiry time (Unix seconds); SET and DELETE clear it
+
+_CRC = struct.Struct("<I")
+_RECORD = struct.Struct("<BII")  # op, key length, value length
+_RECORD_HEADER_SIZE = _CRC.size + _RECORD.size
+_INDEX_HEADER = struct.Struct("<8sQQ")  # magic, capacity, live keys
+_INDEX_SLOT = struct.Struct("<QQ")  # key hash, record offset + 1 (0 marks an empty slot)
+INDEX_MAGIC = b"KVIDX001"
+
+NONE_SYNC_INTERVAL = 1.0  # seconds between background fsyncs with sync="none"
+COMPACT_INTERVAL = 5.0  # seconds between compaction checks
+COMPACT_MIN_BYTES = 64 * 1024 * 1024  # never compact a log smaller than this
+SWEEP_BATCH = 1000  # expired keys deleted per sweeper pass before yielding the lock
+ENTRY_OVERHEAD = 100  # approximate per-key bookkeeping bytes counted towards max_bytes
+
+_MISSING = object()
+
+
+def encode_record(op, key, value=None):
+    key_bytes = key.encode("utf-8")
+    value_bytes = value.encode("utf-8") if value is not None else b""
+    body = _RECORD.pack(op, len(key_bytes), len(value_bytes)) + key_bytes + value_bytes
+    return _CRC.pack(zlib.crc32(body)) + body
+
+
+def encode_batch(operations):
+    # One record wrapping (op, key, value) operations: the CRC covers the whole
+    # batch, so a torn batch is dropped entirely on recovery
+    payload = b"".join(encode_record(op, key, value) for op, key, value in operations)
+    body = _RECORD.pack(OP_BATCH, 0, len(payload)) + payload
+    return _CRC.pack(zlib.crc32(body)) + body
+
+
+def iter_records(buffer, offset=0):
+    # Yields (offset, end, op, key_bytes, value_bytes) for every intact record
+    # and stops at the first torn or corrupt one
+    size = len(buffer)
+    while offset + _RECORD_HEADER_SIZE <= size:
+        (crc,) = _CRC.unpack_from(buffer, offset)
+        op, key_length, value_length = _RECORD.unpack_from(buffer, offset + _CRC.size)
+        key_start = offset + _RECORD_HEADER_SIZE
+        end = key_start + key_length + value_length
+        if end > size or zlib.crc32(buffer[offset + _CRC.size:end]) != crc:
+            return
+        yield offset, end, op, bytes(buffer[key_start:key_start + key_length]), bytes(buffer[key_start + key_length:end])
+        offset = end
+
+
+def key_hash(key_bytes):
+    return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), "little")
+
+
+def fsync_directory(directory):
+    # Makes renames durable; not supported (or needed) on Windows
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    # Append-only record log with group commit.
+    #
+    # append() only buffers the record and returns a sequence number; wait()
+    # blocks until that record is on disk. A committer thread fsyncs whatever
+    # has accumulated while the previous fsync ran, so N concurrent writers
+    # share one fsync instead of paying for N.
+    def __init__(self, path, sync="group"):
+        if sync not in SYNC_MODES:
+            raise ValueError(f"Unknown sync mode: {sync}")
+        self.path = path
+        self.sync = sync
+        self._file = open(path, "ab")
+        self.size = self._file.tell()
+        self._cond = threading.Condition()
+        self._written = 0
+        self._durable = 0
+        self._closed = False
+        self._committer = None
+        if sync != "always":
+            self._committer = threading.Thread(target=self._commit_loop, name="kv-wal-commit", daemon=True)
+            self._committer.start()
+
+    def append(self, record):
+        with self._cond:
+            if self._closed:
+                raise ValueError("Write-ahead log is closed")
+            self._file.write(record)
+            self.size += len(record)
+            self._written += 1
+            if self.sync == "always":
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._durable = self._written
+            else:
+                self._cond.notify_all()
+            return self._written
+
+    def wait(self, seq):
+        if self.sync != "group":
+            return
+        with self._cond:
+            while self._durable < seq:
+                self._cond.wait()
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while self._written == self._durable and not self._closed:
+                    self._cond.wait()
+                if self._written == self._durable:
+                    return
+                target = self._written
+                self._file.flush()
+            os.fsync(self._file.fileno())
+            with self._cond:
+                self._durable = target
+                self._cond.notify_all()
+                if self.sync == "none" and not self._closed:
+                    self._cond.wait(NONE_SYNC_INTERVAL)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._committer is not None:
+            self._committer.join()
+        with self._cond:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._durable = self._written
+            self._cond.notify_all()
+            self._file.close()
+
+
+def _no_wait():
+    pass
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data = {}
+        self.expiries = {}  # key -> absolute expiry time, for keys with a TTL
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def write(self, op, key, value=None):
+        if op == OP_EXPIRE:
+            self.expiries[key] = float(value)
+            return _no_wait
+        self.expiries.pop(key, None)
+        if op == OP_SET:
+            self._data[key] = value
+        else:
+            self._data.pop(key, None)
+        return _no_wait
+
+    def write_many(self, operations):
+        for op, key, value in operations:
+            self.write(op, key, value)
+        return _no_wait
+
+    def set(self, key, value):
+        self._data[key] = value
+
+    def delete(self, key):
+        return self._data.pop(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        return list(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def close(self):
+        pass
+
+
+class _LogStructuredBackend:
+    # Generation bookkeeping, WAL replay and compaction shared by the wal and
+    # mmap backends. Subclasses provide the in-memory view through the
+    # _load_base/_apply/_freeze/_install_base hooks.
+    def __init__(self, directory, sync="group", compact_min_bytes=COMPACT_MIN_BYTES,
+                 compact_interval=COMPACT_INTERVAL):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sync = sync
+        self.compact_min_bytes = compact_min_bytes
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._closed = threading.Event()
+
+        self._generation = self._read_current()
+        self.expiries = {}  # key -> absolute expiry time, for keys with a TTL
+        self._load_base(self._generation)
+        self._replay(self._path("ttl", self._generation))
+        self._base_bytes = self._file_size(self._path("data", self._generation))
+
+        wal_generations = [gen for gen in self._generations("wal") if gen >= self._generation]
+        self._wal_generation = max(wal_generations + [self._generation])
+        for gen in wal_generations:
+            valid_end = self._replay(self._path("wal", gen))
+            if gen == self._wal_generation:
+                # Drop a torn tail left by a crash mid-append
+                with open(self._path("wal", gen), "r+b") as f:
+                    f.truncate(valid_end)
+        self._wal = WriteAheadLog(self._path("wal", self._wal_generation), sync)
+
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(target=self._compact_loop, args=(compact_interval,),
+                                               name="kv-compactor", daemon=True)
+            self._compactor.start()
+
+    # -- files -------------------------------------------------------------
+
+    def _path(self, kind, generation):
+        return os.path.join(self.directory, f"{kind}.{generation:06d}")
+
+    def _generations(self, kind):
+        pattern = re.compile(re.escape(kind) + r"\.(\d+)$")
+        return sorted(int(m.group(1)) for m in map(pattern.match, os.listdir(self.directory)) if m)
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _read_current(self):
+        try:
+            with open(os.path.join(self.directory, "CURRENT"), "r") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return 0
+
+    def _write_current(self, generation):
+        path = os.path.join(self.directory, "CURRENT")
+        with open(path + ".tmp", "w") as f:
+            f.write(str(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        fsync_directory(self.directory)
+
+    def _replay(self, path):
+        try:
+            with open(path, "rb") as f:
+                buffer = f.read()
+        except OSError:
+            return 0
+        end = 0
+        for _, end, op, key, value in iter_records(buffer):
+            if op == OP_BATCH:
+                for _, _, op, key, value in iter_records(value):
+                    self._apply_record(op, key.decode("utf-8"), value.decode("utf-8") if op != OP_DELETE else None)
+            else:
+                self._apply_record(op, key.decode("utf-8"), value.decode("utf-8") if op != OP_DELETE else None)
+        return end
+
+    def _apply_record(self, op, key, value):
+        # Expiry times are tracked here for every backend; subclasses only see SET/DELETE
+        if op == OP_EXPIRE:
+            self.expiries[key] = float(value)
+            return
+        self.expiries.pop(key, None)
+        self._apply(op, key, value)
+
+    # -- writes ------------------------------------------------------------
+
+    def write(self, op, key, value=None):
+        # Applies and logs one record without waiting for it to be durable.
+        # Returns a function that blocks until it is; call it after releasing
+        # any locks so concurrent writers can share a group commit.
+        with self._lock:
+            self._apply_record(op, key, value)
+            wal = self._wal
+            seq = wal.append(encode_record(op, key, value))
+        return lambda: wal.wait(seq)
+
+    def write_many(self, operations):
+        # Like write() for a list of (op, key, value), logged as one batch record
+        with self._lock:
+            for op, key, value in operations:
+                self._apply_record(op, key, value)
+            wal = self._wal
+            seq = wal.append(encode_batch(operations))
+        return lambda: wal.wait(seq)
+
+    def set(self, key, value):
+        self.write(OP_SET, key, value)()
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self:
+                return False
+            wait = self.write(OP_DELETE, key)
+        wait()
+        return True
+
+    # -- compaction --------------------------------------------------------
+
+    def needs_compaction(self):
+        return self._wal.size > max(self.compact_min_bytes, self._base_bytes)
+
+    def compact(self):
+        with self._lock:
+            if self._compacting:
+                return False
+            self._compacting = True
+            old_wal = self._wal
+            generation = self._wal_generation + 1
+            self._wal = WriteAheadLog(self._path("wal", generation), self.sync)
+            self._wal_generation = generation
+            source = self._freeze()
+            expiries = list(self.expiries.items())
+        try:
+            old_wal.close()
+            self._write_base(generation, source)
+            self._write_records(self._path("ttl", generation),
+                                (encode_record(OP_EXPIRE, key, repr(deadline)) for key, deadline in expiries))
+            self._write_current(generation)
+            with self._lock:
+                self._install_base(generation)
+                self._generation = generation
+                self._base_bytes = self._file_size(self._path("data", generation))
+            for kind in ("data", "index", "ttl", "wal"):
+                for old in self._generations(kind):
+                    if old < generation:
+                        os.remove(self._path(kind, old))
+        finally:
+            self._compacting = False
+        return True
+
+    @staticmethod
+    def _write_records(path, records):
+        with open(path + ".tmp", "wb") as f:
+            for record in records:
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _write_base(self, generation, items):
+        self._write_records(self._path("data", generation),
+                            (encode_record(OP_SET, key, value) for key, value in items))
+
+    def _compact_loop(self, interval):
+        while not self._closed.wait(interval):
+            if self.needs_compaction():
+                self.compact()
+
+    def close(self):
+        self._closed.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._wal.close()
+
+
+class WALBackend(_LogStructuredBackend):
+    # Every key and value lives in a dict; the disk is only read at startup
+    def _load_base(self, generation):
+        self._data = {}
+        self._replay(self._path("data", generation))
+
+    def _apply(self, op, key, value):
+        if op == OP_SET:
+            self._data[key] = value
+        else:
+            self._data.pop(key, None)
+
+    def _freeze(self):
+        return list(self._data.items())
+
+    def _install_base(self, generation):
+        pass
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def keys(self):
+        return list(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MmapTable:
+    # One immutable snapshot generation: data.N holds the records and index.N
+    # maps key hashes to their offsets. Both are memory-mapped read-only, so
+    # opening a table costs nothing and pages are faulted in on demand.
+    def __init__(self, data_path, index_path):
+        self._data = self._map(data_path)
+        self._index = self._map(index_path)
+        self.capacity = 0
+        self.count = 0
+        if self._index is not None:
+            magic, self.capacity, self.count = _INDEX_HEADER.unpack_from(self._index, 0)
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"Not a key-value index file: {index_path}")
+
+    @staticmethod
+    def _map(path):
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+    def get(self, key):
+        if not self.capacity:
+            return None
+        key_bytes = key.encode("utf-8")
+        wanted = key_hash(key_bytes)
+        mask = self.capacity - 1
+        slot = wanted & mask
+        while True:
+            stored_hash, location = _INDEX_SLOT.unpack_from(self._index, _INDEX_HEADER.size + slot * _INDEX_SLOT.size)
+            if location == 0:
+                return None
+            if stored_hash == wanted:
+                offset = location - 1
+                _, key_length, value_length = _RECORD.unpack_from(self._data, offset + _CRC.size)
+                key_start = offset + _RECORD_HEADER_SIZE
+                if self._data[key_start:key_start + key_length] == key_bytes:
+                    value_start = key_start + key_length
+                    return self._data[value_start:value_start + value_length].decode("utf-8")
+            slot = (slot + 1) & mask
+
+    def items(self):
+        if self._data is None:
+            return
+        for _, _, _, key, value in iter_records(self._data):
+            yield key.decode("utf-8"), value.decode("utf-8")
+
+    def close(self):
+        for mapped in (self._data, self._index):
+            if mapped is not None:
+                mapped.close()
+
+
+def write_index(path, entries, count):
+    # entries: (key hash, record offset) pairs; linear probing, load factor <= 0.5
+    capacity = 8
+    while capacity < count * 2:
+        capacity *= 2
+    mask = capacity - 1
+    table = bytearray(_INDEX_HEADER.size + capacity * _INDEX_SLOT.size)
+    _INDEX_HEADER.pack_into(table, 0, INDEX_MAGIC, capacity, count)
+    for hashed, offset in entries:
+        slot = hashed & mask
+        while _INDEX_SLOT.unpack_from(table, _INDEX_HEADER.size + slot * _INDEX_SLOT.size)[1]:
+            slot = (slot + 1) & mask
+        _INDEX_SLOT.pack_into(table, _INDEX_HEADER.size + slot * _INDEX_SLOT.size, hashed, offset + 1)
+    with open(path + ".tmp", "wb") as f:
+        f.write(table)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class MmapIndexBackend(_LogStructuredBackend):
+    # Reads go overlay -> frozen overlay -> mmapped snapshot. The overlay holds
+    # only what was written since the last compaction (None marks a delete), so
+    # memory use and startup replay are bounded by the compaction threshold
+    # rather than by the size of the store.
+    def _load_base(self, generation):
+        self._overlay = {}
+        self._frozen = {}
+        self._table = MmapTable(self._path("data", generation), self._path("index", generation))
+        self._count = self._table.count
+
+    def _lookup(self, key):
+        value = self._overlay.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._frozen.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._table.get(key)
+        return value
+
+    def _apply(self, op, key, value):
+        existed = self._lookup(key) is not None
+        if op == OP_SET:
+            self._overlay[key] = value
+            self._count += 0 if existed else 1
+        else:
+            self._overlay[key] = None
+            self._count -= 1 if existed else 0
+
+    def _freeze(self):
+        # A failed compaction leaves its frozen overlay behind; fold it in
+        self._frozen.update(self._overlay)
+        self._overlay = {}
+        frozen, table = self._frozen, self._table
+
+        def merged():
+            for key, value in table.items():
+                if key not in frozen:
+                    yield key, value
+            for key, value in frozen.items():
+                if value is not None:
+                    yield key, value
+        return merged()
+
+    def _write_base(self, generation, items):
+        entries = []
+        path = self._path("data", generation)
+        with open(path + ".tmp", "wb") as f:
+            offset = 0
+            for key, value in items:
+                record = encode_record(OP_SET, key, value)
+                entries.append((key_hash(key.encode("utf-8")), offset))
+                f.write(record)
+                offset += len(record)
+            f.flush()
+            os.fsync(f.fileno())
+        write_index(self._path("index", generation), entries, len(entries))
+        os.replace(path + ".tmp", path)
+
+    def _install_base(self, generation):
+        old_table = self._table
+        self._table = MmapTable(self._path("data", generation), self._path("index", generation))
+        self._frozen = {}
+        old_table.close()
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key)
+
+    def keys(self):
+        with self._lock:
+            overlay = dict(self._frozen)
+            overlay.update(self._overlay)
+            table = self._table
+            keys = [key for key, _ in table.items() if key not in overlay]
+        keys.extend(key for key, value in overlay.items() if value is not None)
+        return keys
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        super().close()
+        self._table.close()
+
+
+class KeyValueStore:
+    # What the keyvalue___* tools talk to: a storage backend plus a sorted key
+    # index for ordered prefix/range listing. The index is built on first use,
+    # so the mmap backend keeps its fast startup until someone lists keys.
+    #
+    # Keys may carry a TTL. Expired keys are removed lazily when they are read
+    # and by a background sweeper that sleeps until the earliest deadline in
+    # an expiry heap. With max_bytes set, the store tracks the approximate
+    # size of every entry and evicts keys by the chosen policy (lru or lfu)
+    # whenever a write takes it over the cap.
+    def __init__(self, backend, max_bytes=None, eviction="lru"):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self._lock = threading.RLock()
+        self._sorted = None
+        self._counters = dict.fromkeys(("hits", "misses", "evictions", "expirations"), 0)
+        self._sizes = None  # key -> approximate bytes, once accounting has started
+        self._bytes_used = 0
+        self._policy = None
+        if max_bytes:
+            make_policy(eviction)  # fail fast on an unknown policy name
+            self._start_accounting()
+
+        self._expiry_heap = ExpiryHeap(backend.expiries)
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="kv-expiry", daemon=True)
+        self._sweeper.start()
+
+    # -- reads -------------------------------------------------------------
+
+    def _lookup(self, key, now, count=False):
+        # Caller holds self._lock; expires the key if its TTL has passed
+        deadline = self.backend.expiries.get(key)
+        if deadline is not None and deadline <= now:
+            self._expire([key], now)
+            value = None
+        else:
+            value = self.backend.get(key)
+        if value is not None and self._policy is not None:
+            self._policy.touch(key)
+        if count:
+            self._counters["hits" if value is not None else "misses"] += 1
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key, time.time(), count=True)
+
+    def mget(self, keys):
+        with self._lock:
+            now = time.time()
+            return [self._lookup(key, now, count=True) for key in keys]
+
+    def ttl(self, key):
+        # Seconds until key expires, or None if it has no TTL
+        with self._lock:
+            deadline = self.backend.expiries.get(key)
+            return None if deadline is None else max(0.0, deadline - time.time())
+
+    # -- writes ------------------------------------------------------------
+
+    def set(self, key, value, ttl_seconds=None):
+        self.mset([(key, value)], ttl_seconds)
+
+    def delete(self, key):
+        return self.delete_many([key]) == 1
+
+    # Multi-key and read-modify-write operations hold the store lock from the
+    # first read to the last write, so they are atomic with respect to every
+    # other store operation; multi-key writes are also logged as one batch.
+
+    def _write_many(self, operations):
+        # Caller holds self._lock; returns the durability waiter
+        if not operations:
+            return _no_wait
+        if len(operations) == 1:
+            wait = self.backend.write(*operations[0])
+        else:
+            wait = self.backend.write_many(operations)
+        for op, key, value in operations:
+            if op == OP_SET:
+                if self._sorted is not None:
+                    self._sorted.add(key)
+                self._account(key, value)
+            elif op == OP_DELETE:
+                if self._sorted is not None:
+                    self._sorted.discard(key)
+                self._account(key, None)
+            else:
+                deadline = float(value)
+                if deadline < (self._expiry_heap.next_deadline() or float("inf")):
+                    self._wakeup.notify()
+                self._expiry_heap.push(key, deadline)
+        if self.max_bytes:
+            self._evict({key for _, key, _ in operations})
+        return wait
+
+    @staticmethod
+    def _with_ttl(operations, ttl_seconds):
+        if ttl_seconds is None:
+            return operations
+        deadline = repr(time.time() + ttl_seconds)
+        return operations + [(OP_EXPIRE, key, deadline) for op, key, _ in operations if op == OP_SET]
+
+    def mset(self, items, ttl_seconds=None):
+        operations = [(OP_SET, key, value) for key, value in items]
+        with self._lock:
+            wait = self._write_many(self._with_ttl(operations, ttl_seconds))
+        wait()
+
+    def delete_many(self, keys):
+        with self._lock:
+            now = time.time()
+            existing = [key for key in dict.fromkeys(keys) if self._lookup(key, now) is not None]
+            wait = self._write_many([(OP_DELETE, key, None) for key in existing])
+        wait()
+        return len(existing)
+
+    def incr(self, key, amount=1):
+        # Missing keys count as 0; raises ValueError if the value is not an
+        # integer. An existing TTL is kept.
+        with self._lock:
+            current = self._lookup(key, time.time())
+            value = (int(current) if current is not None else 0) + amount
+            operations = [(OP_SET, key, str(value))]
+            deadline = self.backend.expiries.get(key)
+            if deadline is not None:
+                operations.append((OP_EXPIRE, key, repr(deadline)))
+            wait = self._write_many(operations)
+        wait()
+        return value
+
+    def compare_and_set(self, key, expected, value, ttl_seconds=None):
+        # Sets key to value only if it currently holds expected (None: key must
+        # not exist). Returns (swapped, value the key held before). Without
+        # ttl_seconds an existing TTL is kept, as in incr().
+        with self._lock:
+            current = self._lookup(key, time.time())
+            if current != expected:
+                return False, current
+            operations = self._with_ttl([(OP_SET, key, value)], ttl_seconds)
+            deadline = self.backend.expiries.get(key)
+            if ttl_seconds is None and deadline is not None:
+                operations.append((OP_EXPIRE, key, repr(deadline)))
+            wait = self._write_many(operations)
+        wait()
+        return True, current
+
+    # -- expiry and eviction -------------------------------------------------
+
+    def _expire(self, keys, now):
+        # Caller holds self._lock. Expiry deletes are not waited on: if one is
+        # lost in a crash the key's EXPIRE record survives and it expires again.
+        expired = [key for key in keys if self.backend.expiries.get(key, now + 1) <= now]
+        self._write_many([(OP_DELETE, key, None) for key in expired])
+        self._counters["expirations"] += len(expired)
+
+    def _sweep_loop(self):
+        with self._lock:
+            while not self._closed:
+                now = time.time()
+                deadline = self._expiry_heap.next_deadline()
+                if deadline is None or deadline > now:
+                    self._wakeup.wait(None if deadline is None else deadline - now)
+                    continue
+                self._expire(self._expiry_heap.pop_due(now, self.backend.expiries, SWEEP_BATCH), now)
+                # Let waiting requests in between batches
+                self._wakeup.wait(0)
+
+    def _entry_size(self, key, value):
+        return len(key) + len(value) + ENTRY_OVERHEAD
+
+    def _start_accounting(self):
+        # Caller holds self._lock (or is the constructor). One pass over the
+        # backend; from then on sizes are kept up to date by _write_many.
+        self._sizes = {}
+        for key in self.backend.keys():
+            value = self.backend.get(key)
+            if value is not None:
+                self._sizes[key] = self._entry_size(key, value)
+        self._bytes_used = sum(self._sizes.values())
+        if self.max_bytes:
+            self._policy = make_policy(self.eviction, self._sizes)
+
+    def _account(self, key, value):
+        if self._sizes is None:
+            return
+        self._bytes_used -= self._sizes.pop(key, 0)
+        if value is None:
+            if self._policy is not None:
+                self._policy.remove(key)
+            return
+        size = self._sizes[key] = self._entry_size(key, value)
+        self._bytes_used += size
+        if self._policy is not None:
+            self._policy.add(key)
+
+    def _evict(self, protected):
+        # Caller holds self._lock. Keys just written are never chosen, so a
+        # write always succeeds even if it alone exceeds the cap.
+        victims = []
+        while self._bytes_used > self.max_bytes:
+            key = self._policy.victim()
+            if key is None or key in protected:
+                break
+            victims.append(key)
+            self._account(key, None)
+        if victims:
+            # Logged like any other delete, so evictions survive a restart
+            self._write_many([(OP_DELETE, key, None) for key in victims])
+            self._counters["evictions"] += len(victims)
+
+    def counters(self):
+        # The cheap part of stats(): does not switch on size accounting
+        with self._lock:
+            return dict(self._counters, keys=len(self.backend), keys_with_ttl=len(self.backend.expiries))
+
+    def stats(self):
+        with self._lock:
+            if self._sizes is None:
+                self._start_accounting()
+            return dict(self.counters(),
+                        bytes_used=self._bytes_used,
+                        max_bytes=self.max_bytes,
+                        eviction_policy=self.eviction if self.max_bytes else None)
+
+    # -- listing -------------------------------------------------------------
+
+    def _sorted_keys(self):
+        # Caller holds self._lock
+        if self._sorted is None:
+            self._sorted = SortedKeyList(self.backend.keys())
+        return self._sorted
+
+    def scan(self, prefix="", after=None, limit=None):
+        # Sorted keys starting with prefix, strictly after the key `after`.
+        # Expired keys the sweeper has not reached yet are skipped.
+        with self._lock:
+            if after is not None and after >= prefix:
+                keys = self._sorted_keys().irange(after, inclusive=False)
+            else:
+                keys = self._sorted_keys().irange(prefix)
+            now = time.time()
+            expiries = self.backend.expiries
+            result = []
+            for key in keys:
+                if not key.startswith(prefix) or (limit is not None and len(result) >= limit):
+                    break
+                if expiries.get(key, now + 1) > now:
+                    result.append(key)
+            return result
+
+    def read_page(self, prefix="", after=None, limit=1000):
+        # One page of items(): ([(key, value)], the key to continue after or
+        # None at the end), read under one hold of the lock
+        with self._lock:
+            keys = self.scan(prefix, after, limit)
+            pairs = []
+            for key in keys:
+                value = self.backend.get(key)
+                if value is not None:
+                    pairs.append((key, value))
+        return pairs, (keys[-1] if len(keys) == limit else None)
+
+    def items(self, prefix="", page_size=1000):
+        # (key, value) pairs in key order, read a page at a time so writers are
+        # only held up for one page of the index walk
+        after = None
+        while True:
+            pairs, after = self.read_page(prefix, after, page_size)
+            yield from pairs
+            if after is None:
+                return
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key, time.time()) is not None
+
+    def __len__(self):
+        return len(self.backend)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._sweeper.join()
+        self.backend.close()
+
+
+def open_backend(kind="memory", directory=None, sync="group", **options):
+    if kind == "memory":
+        return MemoryBackend()
+    if directory is None:
+        raise ValueError(f"The {kind} backend needs a data directory")
+    if kind == "wal":
+        return WALBackend(directory, sync=sync, **options)
+    if kind == "mmap":
+        return MmapIndexBackend(directory, sync=sync, **options)
+    raise ValueError(f"Unknown key-value backend: {kind}")
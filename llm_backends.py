@@ -0,0 +1,161 @@
+import json
+import time
+import zlib
+from types import SimpleNamespace
+
+from conversation_memory import estimate_tokens
+
+# LLM backends for the chat client.
+#
+# A backend has one method, create(**request), with the arguments and return
+# shape of the OpenAI/Groq chat.completions.create: with stream=True it yields
+# chunks whose choices[0].delta carries content and tool_calls fragments,
+# otherwise it returns a response with choices[0].message. The agent loop and
+# the summarizer only talk to that method, so the real API and the mock are
+# interchangeable.
+#
+# MockBackend is deterministic and needs no network or API key. It replays
+# scripted scenarios: each scenario is a list of steps, and step N is the
+# model's reply in the Nth round after the user's message - a set of tool
+# calls, or the final answer. The scenario is the one whose "prompt" matches
+# the user's message, or otherwise picked by a hash of the message, so the
+# same conversation always replays the same calls. String arguments may
+# contain ${name} placeholders filled from the backend's variables (the load
+# test gives every session its own keys that way).
+#
+#   [{"prompt": "store and read", "steps": [
+#       {"tool_calls": [{"name": "keyvalue___set", "arguments": {"key": "k", "value": "v"}}]},
+#       {"tool_calls": [{"name": "keyvalue___get", "arguments": {"key": "k"}}]},
+#       {"content": "Stored and read back k."}]}]
+
+BACKENDS = ("groq", "mock")
+MOCK_CHUNK_CHARS = 8  # streamed text and arguments are split into pieces this long
+MOCK_FINAL_ANSWER = "Done."
+
+DEFAULT_SCENARIOS = [
+    {"prompt": "Remember my favourite city and tell me its weather", "steps": [
+        {"tool_calls": [{"name": "keyvalue___set", "arguments": {"key": "session:${session}:city", "value": "Paris"}}]},
+        {"tool_calls": [{"name": "keyvalue___get", "arguments": {"key": "session:${session}:city"}}]},
+        {"tool_calls": [{"name": "weather___current", "arguments": {"city": "Paris"}},
+                        {"name": "weather___forecast", "arguments": {"city": "Paris", "days": 3}}]},
+        {"content": "Your favourite city is Paris; it is mild there and the next three days look similar."}]},
+    {"prompt": "Work out a formula", "steps": [
+        {"tool_calls": [{"name": "calc___eval", "arguments": {"expression": "sqrt(a*b + c)/d",
+                                                              "variables": {"a": 3, "b": 12, "c": 4, "d": 2}}}]},
+        {"tool_calls": [{"name": "calc___multiply", "arguments": {"a": 2, "b": 21}}]},
+        {"content": "The formula gives 3.16 and doubling 21 gives 42."}]},
+    {"prompt": "Count my visits", "steps": [
+        {"tool_calls": [{"name": "keyvalue___incr", "arguments": {"key": "session:${session}:visits", "amount": 1}},
+                        {"name": "keyvalue___mget", "arguments": {"keys": ["session:${session}:city",
+                                                                           "session:${session}:visits"]}}]},
+        {"content": "I have counted this visit."}]},
+    {"prompt": "Weather near me", "steps": [
+        {"tool_calls": [{"name": "weather___nearest_city", "arguments": {"latitude": 48.9, "longitude": 2.4, "count": 2}}]},
+        {"tool_calls": [{"name": "weather___current_many", "arguments": {"cities": ["Paris", "London"], "units": "c"}}]},
+        {"content": "Paris is closest; here is the weather there and in London."}]},
+    {"prompt": "Some arithmetic", "steps": [
+        {"tool_calls": [{"name": "calc___add", "arguments": {"a": 2, "b": 3}},
+                        {"name": "calc___sqrt", "arguments": {"n": 144}},
+                        {"name": "calc___array_mean", "arguments": {"x": [1, 2, 3, 4, 5, 6]}}]},
+        {"content": "2 + 3 = 5, the square root of 144 is 12 and the mean is 3.5."}]},
+]
+
+
+def load_scenarios(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _pieces(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def _chunk(content=None, tool_calls=None, usage=None):
+    choices = [] if usage is not None else [SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=tool_calls))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class MockBackend:
+    def __init__(self, scenarios=None, variables=None, chunk_chars=MOCK_CHUNK_CHARS, chunk_delay=0.0):
+        self.scenarios = scenarios or DEFAULT_SCENARIOS
+        self.variables = variables or {}
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay  # seconds between streamed chunks, to imitate generation speed
+        self._by_prompt = {scenario["prompt"]: scenario for scenario in self.scenarios if "prompt" in scenario}
+
+    def scenario_for(self, prompt):
+        scenario = self._by_prompt.get(prompt)
+        if scenario is None:
+            scenario = self.scenarios[zlib.crc32(prompt.encode("utf-8")) % len(self.scenarios)]
+        return scenario
+
+    def _fill(self, value):
+        if isinstance(value, str):
+            for name, replacement in self.variables.items():
+                value = value.replace("${" + name + "}", str(replacement))
+            return value
+        if isinstance(value, list):
+            return [self._fill(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._fill(item) for key, item in value.items()}
+        return value
+
+    def _step(self, messages, offer_tools):
+        # Round number = assistant messages since the last user message
+        last_user = max(i for i, m in enumerate(messages) if m["role"] == "user")
+        round_number = sum(1 for m in messages[last_user:] if m["role"] == "assistant")
+        steps = self.scenario_for(messages[last_user]["content"] or "")["steps"]
+        step = steps[round_number] if round_number < len(steps) else {"content": MOCK_FINAL_ANSWER}
+        if step.get("tool_calls") and not offer_tools:
+            # The agent loop hit its round limit; answer instead of calling more tools
+            return {"content": steps[-1].get("content") or MOCK_FINAL_ANSWER}, round_number
+        return step, round_number
+
+    def create(self, messages, stream=False, tools=None, **request):
+        step, round_number = self._step(messages, bool(tools))
+        calls = [
+            {"id": f"call_{round_number}_{index}", "name": call["name"],
+             "arguments": json.dumps(self._fill(call.get("arguments", {})))}
+            for index, call in enumerate(step.get("tool_calls") or ())
+        ]
+        content = step.get("content")
+        prompt_tokens = estimate_tokens(json.dumps(messages)) + (estimate_tokens(json.dumps(tools)) if tools else 0)
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens)
+        if not stream:
+            tool_calls = [SimpleNamespace(id=call["id"], type="function",
+                                          function=SimpleNamespace(name=call["name"], arguments=call["arguments"]))
+                          for call in calls]
+            message = SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls or None)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+        return self._stream(content, calls, usage)
+
+    def _stream(self, content, calls, usage):
+        pause = (lambda: time.sleep(self.chunk_delay)) if self.chunk_delay else (lambda: None)
+        if content:
+            for piece in _pieces(content, self.chunk_chars):
+                pause()
+                yield _chunk(content=piece)
+        for index, call in enumerate(calls):
+            # id and name first, then the arguments a few characters at a time
+            function = SimpleNamespace(name=call["name"], arguments="")
+            pause()
+            yield _chunk(tool_calls=[SimpleNamespace(index=index, id=call["id"], function=function)])
+            for piece in _pieces(call["arguments"], self.chunk_chars):
+                pause()
+                yield _chunk(tool_calls=[SimpleNamespace(index=index, id=None,
+                                                         function=SimpleNamespace(name=None, arguments=piece))])
+        yield _chunk(usage=usage)
+
+
+class GroqBackend:
+    def __init__(self, api_key):
+        from groq import Groq
+        self.create = Groq(api_key=api_key).chat.completions.create
+
+
+def make_backend(name, api_key=None, scenarios_file=None):
+    if name == "mock":
+        return MockBackend(load_scenarios(scenarios_file) if scenarios_file else None, variables={"session": "chat"})
+    if name == "groq":
+        return GroqBackend(api_key)
+    raise ValueError(f"Unknown LLM backend: {name} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,172 @@
+import argparse
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+from agent_loop import DEFAULT_MAX_ROUNDS, StreamingAgent
+from conversation_memory import ConversationMemory
+from llm_backends import DEFAULT_SCENARIOS, MockBackend, load_scenarios
+from mcp_http import SERVER_MODES
+from mcp_host import load_servers, stop_servers
+from mcp_transport import InProcessTransport, MCPTransport
+from multi_server_client import MCP_SERVERS, get_server_for_tool
+
+# End-to-end load test of the client's tool path, without an LLM API.
+#
+# Runs N concurrent chat sessions, each a StreamingAgent driven by the
+# deterministic MockBackend, against the three servers configured in
+# multi_server_client.MCP_SERVERS. Every session sends --turns user messages
+# (cycling through the scenario prompts from its own starting point) and each
+# tool call the mock replays goes over HTTP to its server. The client-side
+# result cache is bypassed so every call reaches a server. Reports latency
+# percentiles and throughput per tool and per server, plus whole-turn latency.
+#
+#   python load_test.py --sessions 32 --turns 20
+#   python load_test.py --spawn --mode asyncio --sessions 64   # starts the servers itself
+#   python load_test.py --spawn --processes 4 --sessions 64    # ... with 4 worker processes each
+#   python load_test.py --scenarios my_scenarios.json --chunk-delay 0.002
+#   python load_test.py --in-process   # servers inside this process, no HTTP
+
+SERVER_SCRIPTS = {"keyvalue": "server_SGL.py", "calc": "server_CALC.py", "weather": "server_WEATHER.py"}
+STARTUP_TIMEOUT = 15.0
+MOCK_TOOLS = [{"type": "function"}]  # the mock replays its script; it only checks that tools are offered
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def summarize(samples, elapsed):
+    # samples: (latency seconds, failed) pairs
+    latencies = sorted(latency for latency, _ in samples)
+    count = len(latencies)
+    return {
+        "calls": count,
+        "errors": sum(1 for _, failed in samples if failed),
+        "rps": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if count else float("nan"),
+        "p95_ms": percentile(latencies, 0.95) * 1000 if count else float("nan"),
+        "p99_ms": percentile(latencies, 0.99) * 1000 if count else float("nan"),
+    }
+
+
+def spawn_servers(mode, worker_processes=1):
+    processes = []
+    for server_name, script in SERVER_SCRIPTS.items():
+        port = urlparse(MCP_SERVERS[server_name]["url"]).port
+        command = [sys.executable, script, str(port), "--mode", mode, "--processes", str(worker_processes)]
+        processes.append(subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    return processes
+
+
+def wait_for_servers(transport):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    for server_name in MCP_SERVERS:
+        while True:
+            try:
+                transport.list_tools(server_name, timeout=(0.5, 2))
+                break
+            except Exception as e:
+                if time.monotonic() > deadline:
+                    raise SystemExit(f"{server_name} server did not come up: {e}")
+                time.sleep(0.2)
+
+
+def run_session(index, transport, scenarios, turns, max_rounds, chunk_delay, calls, turn_latencies, lock):
+    samples = []  # (tool name, server name, seconds, failed)
+    durations = []
+
+    def invoke(tool_name, parameters):
+        server_name = get_server_for_tool(tool_name) or "unknown"
+        start = time.perf_counter()
+        try:
+            result = transport.invoke(server_name, tool_name, parameters)
+            failed = not isinstance(result, dict) or "error" in result
+        except Exception as e:
+            result, failed = {"error": f"Error invoking tool: {e}"}, True
+        samples.append((tool_name, server_name, time.perf_counter() - start, failed))
+        return result
+
+    backend = MockBackend(scenarios, variables={"session": index}, chunk_delay=chunk_delay)
+    memory = ConversationMemory({"role": "system", "content": "Load test session"})
+    agent = StreamingAgent(backend.create, invoke, get_server_for_tool, model="mock", max_tokens=1000,
+                           max_rounds=max_rounds)
+    prompts = [scenario["prompt"] for scenario in scenarios]
+    try:
+        for turn in range(turns):
+            memory.add_user(prompts[(index + turn) % len(prompts)])
+            start = time.perf_counter()
+            agent.run(memory, tools=MOCK_TOOLS)
+            durations.append(time.perf_counter() - start)
+    finally:
+        agent.close()
+    with lock:
+        calls.extend(samples)
+        turn_latencies.extend(durations)
+
+
+def print_table(title, rows):
+    print(f"\n{title:<24} {'calls':>7} {'errors':>7} {'calls/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in rows:
+        print(f"{name:<24} {row['calls']:>7} {row['errors']:>7} {row['rps']:>9.0f} "
+              f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the MCP servers through the client's agent loop")
+    parser.add_argument("--sessions", type=int, default=16, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=10, help="User messages per session")
+    parser.add_argument("--scenarios", help="JSON file of mock scenarios (default: the built-in ones)")
+    parser.add_argument("--max-rounds", type=int, default=DEFAULT_MAX_ROUNDS, help="Tool rounds per turn")
+    parser.add_argument("--chunk-delay", type=float, default=0.0,
+                        help="Seconds between streamed mock chunks, to imitate generation speed")
+    parser.add_argument("--spawn", action="store_true", help="Start the three servers for the run")
+    parser.add_argument("--mode", choices=SERVER_MODES, default="threaded", help="Serving mode with --spawn")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes per server with --spawn")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run the servers in this process and call them without HTTP")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios) if args.scenarios else DEFAULT_SCENARIOS
+    modules = load_servers(MCP_SERVERS) if args.in_process else {}
+    if modules:
+        transport = InProcessTransport({name: module.app for name, module in modules.items()})
+    else:
+        transport = MCPTransport(MCP_SERVERS, pool_size=max(args.sessions, 1))
+    processes = spawn_servers(args.mode, args.processes) if args.spawn and not modules else []
+    try:
+        wait_for_servers(transport)
+        calls, turn_latencies = [], []
+        lock = threading.Lock()
+        threads = [threading.Thread(target=run_session,
+                                    args=(index, transport, scenarios, args.turns, args.max_rounds,
+                                          args.chunk_delay, calls, turn_latencies, lock))
+                   for index in range(args.sessions)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        transport.close()
+        for process in processes:
+            process.terminate()
+            process.wait()
+        stop_servers(modules)
+
+    print(f"{args.sessions} sessions x {args.turns} turns: {len(turn_latencies)} turns, "
+          f"{len(calls)} tool calls in {elapsed:.2f}s")
+    print_table("turn", [("all turns", summarize([(latency, False) for latency in turn_latencies], elapsed))])
+    by_server, by_tool = {}, {}
+    for tool_name, server_name, latency, failed in calls:
+        by_server.setdefault(server_name, []).append((latency, failed))
+        by_tool.setdefault(tool_name, []).append((latency, failed))
+    print_table("server", [(name, summarize(samples, elapsed)) for name, samples in sorted(by_server.items())])
+    print_table("tool", [(name, summarize(samples, elapsed)) for name, samples in sorted(by_tool.items())])
+
+
+if __name__ == "__main__":
+    main()
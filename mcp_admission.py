@@ -0,0 +1,205 @@
+import math
+import threading
+import time
+
+from mcp_codec import JSON
+
+# Request coalescing and admission control for tool calls, used by MCPApp.
+#
+# Coalescing (single flight): when a read tool (cache mode "read", see
+# mcp_registry.py) is called with the same parameters as a call of it that
+# is still running, the new call waits for that result instead of computing
+# it again - a burst of identical weather___forecast or keyvalue___get calls
+# costs one handler run. A call never joins a flight that started before the
+# last write to its resource finished: every mutating tool bumps its
+# resource's generation when it returns, and the generation is part of the
+# flight key, so a client that wrote and then reads sees its own write.
+#
+# Admission: tool calls may be limited to a number running at once, across
+# all tools (--max-concurrent) and per tool (--tool-limit name=N). A call
+# that finds its limit reached waits in a bounded FIFO queue; when the queue
+# is full, or the call has waited --queue-timeout seconds, it is shed at once
+# with a busy error instead of adding to the latency of everything queued:
+#
+#   {"error": "Server busy: ...", "busy": true, "retry_after": 0.4}
+#
+# /mcp/invoke answers it with 503 and a Retry-After header. retry_after is an
+# estimate of when a slot frees up: the recent average call time times the
+# number of calls ahead, divided by the limit. Leaders of a coalesced flight
+# take the admission slot; the calls that join them do not.
+#
+# The limits only see calls that reach a worker thread, so --workers should
+# be larger than the concurrency limit plus the queue; requests beyond that
+# still wait in the listen backlog as before.
+
+DEFAULT_MAX_QUEUED = 64
+DEFAULT_QUEUE_TIMEOUT = 1.0  # seconds a call waits for a slot before it is shed
+MIN_RETRY_AFTER = 0.05  # seconds
+LATENCY_SMOOTHING = 0.1  # weight of the newest call in the average call time
+GLOBAL_LIMIT = "all"  # metrics label of the --max-concurrent limit
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> _Flight
+        self._generations = {}  # resource -> number of finished writes
+
+    def generation(self, resource):
+        return self._generations.get(resource, 0)
+
+    def wrote(self, resource):
+        with self._lock:
+            self._generations[resource] = self._generations.get(resource, 0) + 1
+
+    def do(self, key, function):
+        # Returns (result, shared): shared is True if another call computed it
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = function()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class ConcurrencyLimit:
+    # At most `limit` holders; up to max_queued callers wait in FIFO order
+    def __init__(self, label, limit, max_queued=DEFAULT_MAX_QUEUED, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        if limit < 1:
+            raise ValueError(f"Concurrency limit for {label} must be at least 1")
+        self.label = label
+        self.limit = limit
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.queued = 0
+        self.average_seconds = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, metrics):
+        # None once a slot is held, otherwise why the call was shed
+        with self._condition:
+            if self.running < self.limit and not self.queued:
+                self.running += 1
+                return None
+            if self.queued >= self.max_queued:
+                return "queue_full"
+            self.queued += 1
+            metrics.admission_queued.inc(self.label)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.running >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return "timeout"
+                    self._condition.wait(remaining)
+                self.running += 1
+                return None
+            finally:
+                self.queued -= 1
+                metrics.admission_queued.dec(self.label)
+
+    def release(self, seconds=None):
+        # seconds: how long the call ran, for the retry_after estimate
+        with self._condition:
+            self.running -= 1
+            if seconds is not None:
+                if not self.average_seconds:
+                    self.average_seconds = seconds
+                self.average_seconds += LATENCY_SMOOTHING * (seconds - self.average_seconds)
+            self._condition.notify()
+
+    def retry_after(self):
+        with self._condition:
+            ahead = self.queued + 1
+        return max(MIN_RETRY_AFTER, round(self.average_seconds * ahead / self.limit, 2))
+
+
+class AdmissionControl:
+    def __init__(self):
+        self.flights = SingleFlight()
+        self.configure()
+
+    def configure(self, max_concurrent=None, max_queued=DEFAULT_MAX_QUEUED, queue_timeout=DEFAULT_QUEUE_TIMEOUT,
+                  tool_limits=None, coalesce=True):
+        # tool_limits: {tool name: concurrent calls}
+        self.coalesce = coalesce
+        self.global_limit = (ConcurrencyLimit(GLOBAL_LIMIT, max_concurrent, max_queued, queue_timeout)
+                             if max_concurrent else None)
+        self.tool_limits = {name: ConcurrencyLimit(name, limit, max_queued, queue_timeout)
+                            for name, limit in (tool_limits or {}).items()}
+
+    def call(self, tool, parameters, function, metrics):
+        # Runs function() (the tool call) under coalescing and the limits
+        cache = tool.cache if tool is not None else None
+        mode = cache["mode"] if cache else None
+        if mode == "read" and self.coalesce:
+            try:
+                key = (tool.name, self.flights.generation(cache["resource"]), JSON.dumps(parameters))
+            except TypeError:
+                key = None
+            if key is not None:
+                result, shared = self.flights.do(key, lambda: self._admit(tool.name, function, metrics))
+                if shared:
+                    metrics.coalesced.inc(tool.name)
+                return result
+        try:
+            return self._admit(tool.name if tool is not None else None, function, metrics)
+        finally:
+            if mode == "mutating":
+                self.flights.wrote(cache["resource"])
+
+    def _admit(self, name, function, metrics):
+        limits = [limit for limit in (self.global_limit, self.tool_limits.get(name)) if limit is not None]
+        held = []
+        try:
+            for limit in limits:
+                reason = limit.acquire(metrics)
+                if reason is not None:
+                    metrics.admission_shed.inc(limit.label, reason)
+                    return busy_result(name, limit, reason)
+                held.append(limit)
+            started = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - started
+            for limit in held:
+                limit.release(elapsed)
+            held = []
+            return result
+        finally:
+            for limit in held:
+                limit.release()
+
+
+def busy_result(name, limit, reason):
+    retry_after = limit.retry_after()
+    scope = "tool calls" if limit.label == GLOBAL_LIMIT else f"{name} calls"
+    why = "queue is full" if reason == "queue_full" else f"no slot freed up within {limit.queue_timeout:g}s"
+    return {"error": f"Server busy: too many concurrent {scope} ({why}); retry after {retry_after:g}s",
+            "busy": True, "retry_after": retry_after}
+
+
+def retry_after_header(result):
+    # Retry-After takes whole seconds
+    return str(max(1, math.ceil(result["retry_after"])))
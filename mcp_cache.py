@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Client-side cache of tool results, driven by the "cache" declarations tools
+# publish in /mcp/tools (see mcp_registry.py).
+#
+# Entries are keyed on the tool name plus its canonicalized parameters
+# (sorted keys, no whitespace), so {"a": 2, "b": 3} and {"b": 3, "a": 2} hit
+# the same entry. The cache holds at most max_entries results, evicting the
+# least recently used, and read entries also expire after their tool's TTL.
+# A mutating tool invalidates every cached read of the same resource.
+#
+# Each resource has a generation number that invalidation bumps. Callers take
+# a token before sending a call and pass it to store(); a result is only
+# stored if no invalidation happened in between, so a read racing with a
+# write can never put a stale result back into the cache.
+
+DEFAULT_MAX_ENTRIES = 1024
+MAX_KEY_BYTES = 64 * 1024  # calls with larger parameters (big arrays) are not cached
+
+
+class ResultCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._policies = {}  # tool name -> (mode, resource, ttl)
+        self._entries = OrderedDict()  # key -> (expires_at, resource, result)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def set_policies(self, server_name, tools):
+        # Reads the cache declarations of one server's /mcp/tools entries.
+        # Resources are scoped by server so two servers never share one.
+        with self._lock:
+            for tool in tools:
+                cache = tool.get("cache") or {}
+                mode = cache.get("mode")
+                if mode in ("pure", "read", "mutating"):
+                    resource = f"{server_name}:{cache.get('resource', '')}"
+                    self._policies[tool["name"]] = (mode, resource, cache.get("ttl"))
+                else:
+                    self._policies.pop(tool["name"], None)
+
+    @staticmethod
+    def _key(name, parameters):
+        try:
+            key = name + "\0" + json.dumps(parameters, sort_keys=True, separators=(",", ":"))
+        except (TypeError, ValueError):
+            return None
+        return key if len(key) <= MAX_KEY_BYTES else None
+
+    def is_mutating(self, name):
+        policy = self._policies.get(name)
+        return policy is not None and policy[0] == "mutating"
+
+    def is_idempotent(self, name):
+        # Pure and read-only calls can safely be sent again
+        policy = self._policies.get(name)
+        return policy is not None and policy[0] in ("pure", "read")
+
+    def resource(self, name):
+        policy = self._policies.get(name)
+        return policy[1] if policy else None
+
+    def lookup(self, name, parameters):
+        # (True, result) on a hit, (False, None) otherwise
+        policy = self._policies.get(name)
+        if policy is None or policy[0] == "mutating":
+            return False, None
+        key = self._key(name, parameters)
+        if key is None:
+            return False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[2]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def token(self, name):
+        # Generation of the tool's resource, to be passed to store()
+        with self._lock:
+            return self._generations.get(self.resource(name), 0)
+
+    def store(self, name, parameters, result, token):
+        policy = self._policies.get(name)
+        if policy is None or policy[0] == "mutating" or not isinstance(result, dict) or "error" in result:
+            return
+        key = self._key(name, parameters)
+        if key is None:
+            return
+        mode, resource, ttl = policy
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if self._generations.get(resource, 0) != token:
+                return
+            self._entries[key] = (expires_at, resource, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name):
+        # Called after a mutating tool ran: drops cached reads of its resource
+        # and returns the resource's new generation
+        resource = self.resource(name)
+        with self._lock:
+            generation = self._generations[resource] = self._generations.get(resource, 0) + 1
+            for key in [key for key, entry in self._entries.items() if entry[1] == resource]:
+                del self._entries[key]
+            return generation
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
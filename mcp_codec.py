@@ -0,0 +1,154 @@
+import base64
+import json
+import os
+
+# Body codecs shared by the servers and the client transport.
+#
+# JSON is the wire format. It is encoded and decoded with the fastest library
+# installed - orjson, then msgspec, then the standard library (set
+# MCP_JSON_CODEC=stdlib|orjson|msgspec to choose) - always straight to and
+# from bytes, so a request body is parsed without first being decoded to str
+# and a response is produced as the bytes that go on the wire.
+#
+# Bytes values (e.g. the data buffer of a binary calc array) are written as
+# base64 strings in JSON. MessagePack (application/msgpack) is available as
+# an opt-in alternative when msgpack or msgspec is installed: a request sent
+# with that Content-Type, or with it in Accept, gets a MessagePack response,
+# and bytes values travel as raw binary instead of base64.
+#
+# The fast libraries differ from the stdlib json module at the edges: NaN and
+# infinity become null, and values they cannot encode (integers beyond 64
+# bits, unusual types) fall back to the stdlib encoder.
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+MSGPACK_CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+def _default(value):
+    # Types JSON has no form for
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode("ascii")
+    if hasattr(value, "tolist"):  # NumPy arrays and scalars
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class Codec:
+    def __init__(self, name, content_type, dumps, loads):
+        self.name = name
+        self.content_type = content_type
+        self.dumps = dumps  # object -> bytes
+        self.loads = loads  # bytes -> object; raises ValueError on malformed input
+
+    def __repr__(self):
+        return f"<Codec {self.name}>"
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, default=_default).encode("utf-8")
+
+
+STDLIB_JSON = Codec("stdlib", JSON_CONTENT_TYPE, _stdlib_dumps, json.loads)
+JSON_CODECS = {"stdlib": STDLIB_JSON}
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def _orjson_dumps(obj):
+        try:
+            return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            return _stdlib_dumps(obj)
+
+    def _orjson_loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)  # big integers; raises ValueError if really malformed
+
+    JSON_CODECS["orjson"] = Codec("orjson", JSON_CONTENT_TYPE, _orjson_dumps, _orjson_loads)
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder(enc_hook=_default)
+
+    def _msgspec_dumps(obj):
+        try:
+            return _msgspec_encoder.encode(obj)
+        except (TypeError, OverflowError):
+            return _stdlib_dumps(obj)
+
+    def _msgspec_loads(data):
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e))
+
+    JSON_CODECS["msgspec"] = Codec("msgspec", JSON_CONTENT_TYPE, _msgspec_dumps, _msgspec_loads)
+
+_preferred = os.getenv("MCP_JSON_CODEC")
+if _preferred and _preferred not in JSON_CODECS:
+    raise ImportError(f"MCP_JSON_CODEC={_preferred} is not installed (available: {', '.join(JSON_CODECS)})")
+JSON = JSON_CODECS[_preferred or next(name for name in ("orjson", "msgspec", "stdlib") if name in JSON_CODECS)]
+
+MSGPACK = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+if msgpack is not None:
+    def _msgpack_dumps(obj):
+        return msgpack.packb(obj, default=lambda value: value.tolist() if hasattr(value, "tolist") else _default(value))
+
+    def _msgpack_loads(data):
+        try:
+            return msgpack.unpackb(data, strict_map_key=False)
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as e:
+            raise ValueError(f"Invalid MessagePack body: {e}")
+
+    MSGPACK = Codec("msgpack", MSGPACK_CONTENT_TYPE, _msgpack_dumps, _msgpack_loads)
+elif msgspec is not None:
+    def _msgspec_msgpack_loads(data):
+        try:
+            return msgspec.msgpack.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(f"Invalid MessagePack body: {e}")
+
+    MSGPACK = Codec("msgpack", MSGPACK_CONTENT_TYPE, msgspec.msgpack.Encoder(enc_hook=_default).encode,
+                    _msgspec_msgpack_loads)
+
+
+def _media_type(header):
+    return (header or "").split(";", 1)[0].strip().lower()
+
+
+def is_msgpack(content_type):
+    return _media_type(content_type) in MSGPACK_CONTENT_TYPES
+
+
+def request_codec(headers):
+    # Codec for a request body. Anything that is not MessagePack is read as
+    # JSON (curl and many clients send JSON without a Content-Type). None
+    # when the body is MessagePack but no MessagePack library is installed.
+    if is_msgpack(headers.get("Content-Type")):
+        return MSGPACK
+    return JSON
+
+
+def response_codec(headers):
+    # MessagePack if the client sent it or asked for it, JSON otherwise
+    if MSGPACK is not None:
+        if is_msgpack(headers.get("Content-Type")):
+            return MSGPACK
+        accept = headers.get("Accept") or ""
+        if any(is_msgpack(media_type) for media_type in accept.split(",")):
+            return MSGPACK
+    return JSON
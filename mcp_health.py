@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from collections import deque
+
+# Client-side health state of MCP server endpoints, used by mcp_transport.py.
+#
+# Every URL a server is reachable at (one, or several replicas) has a circuit
+# breaker:
+#   closed    - requests flow; consecutive failures (connection errors,
+#               timeouts, 5xx other than a busy 503) are counted
+#   open      - after FAILURE_THRESHOLD failures in a row the endpoint is
+#               skipped without a connection attempt, so a down server costs
+#               nothing, until its cooldown has passed
+#   half-open - the next caller probes GET /mcp/health with a short timeout;
+#               success closes the breaker, failure reopens it with twice the
+#               cooldown (up to MAX_COOLDOWN)
+# A success resets the failure count. Busy responses (admission control
+# shedding, see mcp_admission.py) are not failures: the server is up.
+#
+# Each endpoint also keeps its recent latencies, which give the delay before a
+# read call is hedged to a replica when a server is configured with
+# "hedge_after": "auto".
+
+FAILURE_THRESHOLD = 3
+COOLDOWN = 2.0  # seconds an endpoint stays open after it trips
+MAX_COOLDOWN = 30.0
+HEALTH_TIMEOUT = (0.5, 1.0)  # (connect, read) seconds for a /mcp/health probe
+LATENCY_WINDOW = 200  # recent latencies kept per endpoint
+MIN_LATENCY_SAMPLES = 20  # before that, "auto" hedging waits DEFAULT_HEDGE_AFTER
+DEFAULT_HEDGE_AFTER = 0.1  # seconds
+HEDGE_PERCENTILE = 0.95
+BACKOFF_BASE = 0.05  # seconds before the first retry, doubled for each one after
+BACKOFF_MAX = 1.0
+MAX_RETRY_WAIT = 2.0  # a busy server asking for a longer wait is not retried
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class EndpointHealth:
+    def __init__(self, url, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, max_cooldown=MAX_COOLDOWN):
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.reopen_at = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def admit(self):
+        # "send" if requests may go out, "probe" if this caller must check
+        # /mcp/health first (it then reports with probed()), None if skipped
+        with self._lock:
+            if self.state == CLOSED:
+                return "send"
+            if self.state == OPEN and time.monotonic() >= self.reopen_at:
+                self.state = HALF_OPEN  # only this caller probes
+                return "probe"
+            return None
+
+    def probed(self, healthy):
+        with self._lock:
+            if healthy:
+                self._close()
+            else:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._open()
+
+    def succeeded(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+            if self.state != CLOSED or self.failures:
+                self._close()
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.reopen_at = time.monotonic() + self.cooldown
+
+    def _close(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+
+    def retry_in(self):
+        with self._lock:
+            return max(0.0, self.reopen_at - time.monotonic()) if self.state == OPEN else 0.0
+
+    def hedge_after(self, setting):
+        # Seconds to wait for this endpoint before hedging: a fixed number, or
+        # "auto" for its recent 95th percentile latency
+        if setting != "auto":
+            return float(setting)
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return DEFAULT_HEDGE_AFTER
+        return latencies[min(len(latencies) - 1, int(len(latencies) * HEDGE_PERCENTILE))]
+
+    def status(self):
+        with self._lock:
+            return {"url": self.url, "state": self.state, "failures": self.failures}
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    # "Full jitter": uniform in [0, base * 2^attempt], so clients retrying
+    # after the same failure spread out instead of arriving together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class ServerUnavailable(ConnectionError):
+    # Every endpoint of a server has its circuit open
+    pass
@@ -0,0 +1,105 @@
+import importlib
+import inspect
+from urllib.parse import urlparse
+
+from mcp_http import MCPApp, json_response
+from mcp_registry import ToolRegistry
+
+# Runs several MCP servers in one process.
+#
+# HostApp mounts the apps of the keyvalue, calc and weather server modules
+# and serves them all from one port, with two kinds of routing:
+#   path   - /<server>/<endpoint> goes to that server's app unchanged, so a
+#            client pointed at http://host:port/calc sees the calc server
+#   prefix - the unprefixed /mcp/tools lists every mounted tool, and
+#            /mcp/invoke and /mcp/invoke_batch dispatch each call by its tool
+#            name (calc___add -> calc) through one merged registry
+# Mounted apps share the host's metrics, so /metrics covers all of them, and
+# its admission control, so concurrency limits and coalescing apply to a tool
+# whichever way it is routed.
+#
+# load_servers() imports the server modules and runs their start() hooks (the
+# key-value store backend, the hourly forecast refresher); the in-process
+# client transport in mcp_transport.py uses the same apps without a socket.
+# server_HOST.py --processes N imports the modules once and starts them in
+# every worker process.
+
+SERVER_MODULES = {"keyvalue": "server_SGL", "calc": "server_CALC", "weather": "server_WEATHER"}
+
+
+def import_servers(names):
+    # Imports the named server modules; returns {name: module}
+    modules = {}
+    for name in names:
+        if name not in SERVER_MODULES:
+            raise ValueError(f"Unknown server: {name} (expected one of {', '.join(SERVER_MODULES)})")
+        modules[name] = importlib.import_module(SERVER_MODULES[name])
+    return modules
+
+
+def start_servers(modules, **config):
+    # Runs the start() hooks of the modules. config holds start() options for
+    # all of them (kv_backend=..., cities_file=...); each module gets the ones
+    # its start() accepts.
+    for module in modules.values():
+        start = getattr(module, "start", None)
+        if start is not None:
+            accepted = inspect.signature(start).parameters
+            start(**{option: value for option, value in config.items() if option in accepted})
+
+
+def load_servers(names, **config):
+    # Imports and starts the named server modules; returns {name: module}
+    modules = import_servers(names)
+    start_servers(modules, **config)
+    return modules
+
+
+def stop_servers(modules):
+    for module in modules.values():
+        stop = getattr(module, "stop", None)
+        if stop is not None:
+            stop()
+
+
+class HostApp(MCPApp):
+    def __init__(self, apps):
+        self.apps = dict(apps)  # mount name -> MCPApp
+        registry = ToolRegistry()
+        for app in self.apps.values():
+            for name in app.registry.names():
+                tool = app.registry.get(name)
+                registry.register(tool.name, tool.description, tool.parameters, tool.handler, tool.cache)
+        super().__init__("Host", registry)
+        for app in self.apps.values():
+            for family in app.metrics.extra:
+                self.metrics.add(family)
+            app.metrics = self.metrics
+            app.admission = self.admission
+
+    def _mount(self, path):
+        # (mounted app, path below the mount point) or (None, path)
+        url = urlparse(path)
+        name, _, rest = url.path.lstrip("/").partition("/")
+        app = self.apps.get(name)
+        if app is None:
+            return None, path
+        return app, "/" + rest + ("?" + url.query if url.query else "")
+
+    def handle(self, method, path, headers, body):
+        app, rest = self._mount(path)
+        if app is not None:
+            return app.handle(method, rest, headers, body)
+        if urlparse(path).path == "/":
+            return json_response({"servers": sorted(self.apps)})
+        return super().handle(method, path, headers, body)
+
+    def endpoint(self, path):
+        app, rest = self._mount(path)
+        if app is not None:
+            return "/" + urlparse(path).path.lstrip("/").partition("/")[0] + app.endpoint(rest)
+        return super().endpoint(path)
+
+
+def host_app(modules):
+    return HostApp({name: module.app for name, module in modules.items()})
@@ -0,0 +1,684 @@
+import argparse
+import asyncio
+import http.client
+import http.server
+import io
+import signal
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlparse
+
+from mcp_admission import DEFAULT_MAX_QUEUED, DEFAULT_QUEUE_TIMEOUT, AdmissionControl, retry_after_header
+from mcp_codec import JSON, request_codec, response_codec
+from mcp_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, AccessLog, ServerMetrics
+from mcp_prefork import run_workers
+
+# Shared HTTP serving layer used by every MCP server.
+#
+# Each server describes itself as an MCPApp (tool listing + tool invocation) and
+# hands it to serve(), which runs it in one of three modes:
+#   threaded - bounded worker pool, HTTP/1.1 persistent connections (default)
+#   asyncio  - event loop owns the sockets, tool calls run on a worker pool
+#   single   - the original one-connection-at-a-time TCPServer (HTTP/1.0),
+#              kept as a baseline for bench_servers.py
+#
+# Bodies are encoded and decoded by mcp_codec (the fastest JSON library
+# installed, or MessagePack when the client opts in), straight from and to
+# bytes; every non-streamed response is one pre-encoded buffer sent with its
+# Content-Length, so keep-alive connections can be reused.
+#
+# Every app records per-tool and per-endpoint metrics (see mcp_metrics.py),
+# served on /metrics, and writes its access log from a background thread.
+#
+# Tool calls go through the app's admission control (mcp_admission.py):
+# identical concurrent read calls are coalesced, and with --max-concurrent or
+# --tool-limit calls over the limit queue briefly and are then shed with a
+# busy error (503 and Retry-After on /mcp/invoke).
+#
+# With --processes N any mode runs in N forked worker processes sharing the
+# port through SO_REUSEPORT (see mcp_prefork.py), so CPU-bound tools use N
+# cores. serve()'s on_start/on_stop hooks run in every worker, which is where
+# servers open per-process resources such as background threads.
+
+DEFAULT_WORKERS = 32
+DEFAULT_BACKLOG = 128
+KEEPALIVE_TIMEOUT = 15  # seconds an idle persistent connection is kept open
+SHUTDOWN_GRACE = 10  # seconds in-flight requests get to finish on shutdown
+SERVER_MODES = ("threaded", "asyncio", "single")
+MAX_BATCH_SIZE = 1000  # invocations accepted by one /mcp/invoke_batch request
+BATCH_WORKERS = 8  # threads used for {"parallel": true} batches
+BUILTIN_ENDPOINTS = ("/mcp/tools", "/mcp/invoke", "/mcp/invoke_batch", "/mcp/health", "/metrics")
+
+
+class Response:
+    # body is either bytes or an iterator of bytes chunks; iterators are
+    # streamed with chunked transfer encoding
+    def __init__(self, body=b"", status=200, content_type="application/json", headers=None):
+        self.status = status
+        self.body = body
+        self.headers = [("Content-Type", content_type)] + list(headers or [])
+
+    @property
+    def streaming(self):
+        return not isinstance(self.body, (bytes, bytearray))
+
+
+def encode_chunk(chunk):
+    return b"%x\r\n%s\r\n" % (len(chunk), chunk)
+
+
+LAST_CHUNK = b"0\r\n\r\n"
+
+
+def json_response(obj, status=200, headers=None):
+    return Response(JSON.dumps(obj), status=status, headers=headers)
+
+
+def encoded_response(obj, codec, status=200, headers=None):
+    return Response(codec.dumps(obj), status=status, content_type=codec.content_type, headers=headers)
+
+
+def parse_content_length(headers):
+    # Body length, or None if Content-Length is not a non-negative integer
+    try:
+        length = int(headers.get("Content-Length") or 0)
+    except ValueError:
+        return None
+    return length if length >= 0 else None
+
+
+def parse_etags(header):
+    if not header:
+        return ()
+    return [tag.strip() for tag in header.split(",")]
+
+
+class MCPApp:
+    # Transport-independent request handling: maps (method, path, headers, body)
+    # onto the MCP endpoints so every serving mode shares the same logic
+    def __init__(self, name, registry):
+        self.name = name
+        self.registry = registry
+        registry.catalog()  # serialize the tool list once, up front
+        self.routes = {}
+        self._batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix=f"{name}-batch")
+        self.metrics = ServerMetrics(name)
+        self.access_log = AccessLog()
+        self.metrics.families.append(self.access_log.metric())
+        self.admission = AdmissionControl()
+
+    def configure_admission(self, **options):
+        # See AdmissionControl.configure(); serve() passes the command line options
+        self.admission.configure(**options)
+
+    def handle(self, method, path, headers, body):
+        url = urlparse(path)
+        path = url.path
+        codec = request_codec(headers)
+        if codec is None:
+            return json_response({"error": "MessagePack bodies are not supported: msgpack is not installed"},
+                                 status=415)
+        try:
+            request = codec.loads(body) if body else {}
+        except ValueError:
+            return json_response({"error": f"Invalid {'JSON' if codec is JSON else 'MessagePack'} body"}, status=400)
+        if not isinstance(request, dict):
+            return json_response({"error": "Request body must be a JSON object"}, status=400)
+        for name, value in parse_qsl(url.query):
+            request.setdefault(name, value)
+
+        if path == "/mcp/tools":
+            # Return available tools - this is how the LLM discovers what tools are available
+            catalog, etag = self.registry.catalog()
+            if etag in parse_etags(headers.get("If-None-Match")):
+                return Response(b"", status=304, headers=[("ETag", etag)])
+            return Response(catalog, headers=[("ETag", etag)])
+        if path == "/mcp/invoke":
+            # Handle tool invocation - this is how the LLM calls the tools
+            result = self.invoke_tool(request.get("name", ""), request.get("parameters", {}))
+            if isinstance(result, dict) and result.get("busy"):
+                return encoded_response(result, response_codec(headers), status=503,
+                                        headers=[("Retry-After", retry_after_header(result))])
+            return encoded_response(result, response_codec(headers))
+        if path == "/mcp/invoke_batch":
+            return self.invoke_batch(request, response_codec(headers))
+        if path == "/mcp/health":
+            # Liveness check for client circuit breakers: no tool runs, nothing is locked
+            return json_response({"status": "ok", "server": self.name, "tools": len(self.registry),
+                                  "uptime_seconds": round(time.time() - self.metrics.started, 1)})
+        if path == "/metrics":
+            return Response(self.metrics.render(), content_type=METRICS_CONTENT_TYPE)
+        if path in self.routes:
+            return self.routes[path](request)
+        return json_response({"error": "Unknown endpoint"})
+
+    def add_route(self, path, handler):
+        # Extra server-specific endpoint. The handler gets the JSON body merged
+        # with any query string parameters and returns a Response.
+        self.routes[path] = handler
+
+    def invoke_tool(self, name, parameters):
+        if not isinstance(parameters, dict):
+            return {"error": "Parameters must be a JSON object"}
+        label = name if name in self.registry else "unknown"
+        started = self.metrics.tool_started(label)
+        failed = True
+        try:
+            result = self.admission.call(self.registry.get(name), parameters,
+                                         lambda: self.registry.invoke(name, parameters), self.metrics)
+            failed = not isinstance(result, dict) or "error" in result
+            return result
+        finally:
+            self.metrics.tool_finished(label, started, failed)
+
+    def invoke_batch(self, request, codec=JSON):
+        # {"invocations": [{"name", "parameters"}, ...], "stream": bool, "parallel": bool}
+        # Results are returned by position. Invocations run in order unless
+        # "parallel" is set; with "stream" each result is sent as an NDJSON
+        # line ({"index": i, ...}) as soon as it finishes (always JSON).
+        invocations = request.get("invocations")
+        if not isinstance(invocations, list):
+            return json_response({"error": "Missing invocations list"}, status=400)
+        if len(invocations) > MAX_BATCH_SIZE:
+            return json_response({"error": f"Batch too large (max {MAX_BATCH_SIZE} invocations)"}, status=400)
+
+        parallel = bool(request.get("parallel"))
+        if request.get("stream"):
+            return Response(self._stream_batch(invocations, parallel), content_type="application/x-ndjson")
+        if parallel:
+            results = list(self._batch_pool.map(self._invoke_item, invocations))
+        else:
+            results = [self._invoke_item(item) for item in invocations]
+        return encoded_response({"results": results}, codec)
+
+    def _stream_batch(self, invocations, parallel):
+        if parallel:
+            futures = {self._batch_pool.submit(self._invoke_item, item): index
+                       for index, item in enumerate(invocations)}
+            completed = ((futures[future], future.result()) for future in as_completed(futures))
+        else:
+            completed = ((index, self._invoke_item(item)) for index, item in enumerate(invocations))
+        for index, result in completed:
+            yield JSON.dumps({"index": index, **result}) + b"\n"
+
+    def _invoke_item(self, item):
+        # Errors stay with their item so one bad invocation does not fail the batch
+        if not isinstance(item, dict) or not isinstance(item.get("name"), str):
+            return {"error": "Each invocation must be an object with a 'name'"}
+        try:
+            return self.invoke_tool(item["name"], item.get("parameters", {}))
+        except Exception as e:
+            return {"error": f"Error invoking {item['name']}: {e}"}
+
+    def endpoint(self, path):
+        # Metrics label for a request path
+        path = urlparse(path).path
+        return path if path in BUILTIN_ENDPOINTS or path in self.routes else "other"
+
+    def safe_handle(self, method, path, headers, body):
+        endpoint = self.endpoint(path)
+        started = self.metrics.request_started(endpoint, len(body))
+        try:
+            response = self.handle(method, path, headers, body)
+        except Exception as e:
+            response = json_response({"error": f"Internal server error: {e}"}, status=500)
+        if response.streaming:
+            response.body = self._measure_stream(response.body, endpoint, started, response.status)
+        else:
+            self.metrics.request_finished(endpoint, started, response.status, len(response.body))
+        return response
+
+    def _measure_stream(self, chunks, endpoint, started, status):
+        # A streamed response is finished when its last chunk has been produced
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.metrics.request_finished(endpoint, started, status, size)
+
+
+class MCPRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY the body
+    # waits on the client's delayed ACK on every keep-alive request
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # StreamRequestHandler applies self.timeout to the socket, which bounds
+        # how long an idle keep-alive connection can hold a worker
+        self.timeout = self.server.keepalive_timeout
+        super().setup()
+
+    def parse_request(self):
+        self.server.mark_busy(self.connection, True)
+        return super().parse_request()
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        try:
+            content_length = parse_content_length(self.headers)
+            if content_length is None:
+                # Where the body ends is unknown, so the connection cannot be reused
+                self.close_connection = True
+                response = json_response({"error": "Bad request"}, status=400)
+            else:
+                body = self.rfile.read(content_length) if content_length else b""
+                response = self.server.app.safe_handle(self.command, self.path, self.headers, body)
+
+            # Chunked encoding needs HTTP/1.1 on both ends; otherwise a streamed
+            # body is delimited by closing the connection
+            http11 = self.protocol_version >= "HTTP/1.1" and self.request_version >= "HTTP/1.1"
+            chunked = response.streaming and http11
+
+            self.send_response(response.status)
+            for name, value in response.headers:
+                self.send_header(name, value)
+            if not response.streaming:
+                self.send_header("Content-Length", str(len(response.body)))
+            elif chunked:
+                self.send_header("Transfer-Encoding", "chunked")
+            if self.server.closing or self.close_connection or (response.streaming and not chunked):
+                self.send_header("Connection", "close")
+            self.end_headers()
+
+            if not response.streaming:
+                self.wfile.write(response.body)
+            else:
+                self._write_stream(response.body, chunked)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            self.server.mark_busy(self.connection, False)
+
+    def _write_stream(self, chunks, chunked):
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(encode_chunk(chunk) if chunked else chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except Exception:
+            # The status line is already out; all we can do is cut the stream short
+            self.close_connection = True
+            self.log_error("Error while streaming response to %s", self.path)
+            return
+        if chunked:
+            self.wfile.write(LAST_CHUNK)
+
+    def log_message(self, format, *args):
+        # Queued and written by the access log thread, never on the request thread
+        if not self.server.quiet:
+            self.server.app.access_log.log("%s - - [%s] %s" % (self.address_string(), self.log_date_time_string(),
+                                                               format % args))
+
+
+class LegacyMCPRequestHandler(MCPRequestHandler):
+    # HTTP/1.0: the connection is closed after every response
+    protocol_version = "HTTP/1.0"
+
+
+class _StoppableMixin:
+    def _init_stop(self):
+        self._stop_lock = threading.Lock()
+        self._stopping = False
+        self._stopped = threading.Event()
+
+    def stop(self, grace=SHUTDOWN_GRACE):
+        # Safe to call more than once and from any thread other than the one
+        # running serve_forever(); later callers wait for the first to finish
+        with self._stop_lock:
+            first = not self._stopping
+            self._stopping = True
+        if first:
+            try:
+                self._shutdown(grace)
+            finally:
+                self._stopped.set()
+        else:
+            self._stopped.wait()
+
+
+class SingleThreadedHTTPServer(_StoppableMixin, socketserver.TCPServer):
+    keepalive_timeout = None
+    closing = False
+
+    def __init__(self, address, app, quiet=False, reuse_port=False):
+        self.app = app
+        self.quiet = quiet
+        self.allow_reuse_port = reuse_port  # read by server_bind()
+        self._init_stop()
+        super().__init__(address, LegacyMCPRequestHandler)
+
+    def mark_busy(self, connection, busy):
+        pass
+
+    def _shutdown(self, grace):
+        self.shutdown()
+        self.server_close()
+
+
+class ThreadPoolHTTPServer(_StoppableMixin, http.server.HTTPServer):
+    def __init__(self, address, app, workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, quiet=False, reuse_port=False):
+        self.app = app
+        self.quiet = quiet
+        self.request_queue_size = backlog  # read by server_activate() for listen()
+        self.allow_reuse_port = reuse_port  # read by server_bind()
+        self.keepalive_timeout = keepalive_timeout
+        self.closing = False
+        self._slots = threading.BoundedSemaphore(workers)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{app.name}-worker")
+        self._connections = {}  # socket -> busy flag
+        self._conn_lock = threading.Lock()
+        self._init_stop()
+        super().__init__(address, MCPRequestHandler)
+
+    def process_request(self, request, client_address):
+        # Once every worker is busy the accept loop stops pulling connections,
+        # so further clients queue in the kernel listen backlog
+        while not self._slots.acquire(timeout=0.5):
+            if self.closing:
+                self.shutdown_request(request)
+                return
+        with self._conn_lock:
+            self._connections[request] = False
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self._conn_lock:
+                self._connections.pop(request, None)
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def mark_busy(self, connection, busy):
+        with self._conn_lock:
+            if connection in self._connections:
+                self._connections[connection] = busy
+
+    def _close_idle_connections(self, include_busy=False):
+        with self._conn_lock:
+            connections = [sock for sock, busy in self._connections.items() if include_busy or not busy]
+        for sock in connections:
+            try:
+                # Only the read side: a worker mid-response can still finish writing
+                sock.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+    def _shutdown(self, grace):
+        self.closing = True
+        self.shutdown()
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline:
+            self._close_idle_connections()
+            with self._conn_lock:
+                if not self._connections:
+                    break
+            time.sleep(0.05)
+        self._close_idle_connections(include_busy=True)
+        self._pool.shutdown(wait=True)
+        self.server_close()
+
+
+class AsyncMCPServer(_StoppableMixin):
+    def __init__(self, address, app, workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, quiet=False, reuse_port=False):
+        self.app = app
+        self.quiet = quiet
+        self.keepalive_timeout = keepalive_timeout
+        self.closing = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{app.name}-worker")
+        self._connections = {}  # StreamWriter -> busy flag
+        self._loop = None
+        self._stop_event = None
+        self._grace = SHUTDOWN_GRACE
+        self._init_stop()
+
+        # Bind up front so the port is in use (or the error raised) before serve_forever()
+        host, port = address
+        self.socket = socket.create_server((host, port), backlog=backlog, reuse_port=reuse_port)
+        self.server_address = self.socket.getsockname()
+
+    def serve_forever(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if self._stopping:
+            return
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket)
+        try:
+            await self._stop_event.wait()
+        finally:
+            self.closing = True
+            server.close()
+            for writer, busy in list(self._connections.items()):
+                if not busy:
+                    writer.close()
+            deadline = time.monotonic() + self._grace
+            while self._connections and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            for writer in list(self._connections):
+                writer.close()
+            self._executor.shutdown(wait=True)
+
+    def _shutdown(self, grace):
+        self._grace = grace
+        if self._loop is None:
+            self.socket.close()
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        except RuntimeError:
+            return  # loop already closed
+        while self._loop.is_running():
+            time.sleep(0.05)
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[writer] = False
+        try:
+            while not self.closing:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    break
+                self._connections[writer] = True
+
+                request_line, _, raw_headers = head.partition(b"\r\n")
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    headers = http.client.parse_headers(io.BytesIO(raw_headers))
+                    content_length = parse_content_length(headers)
+                    if content_length is None:
+                        raise ValueError("invalid Content-Length")
+                except (ValueError, http.client.HTTPException):
+                    await self._write_response(writer, json_response({"error": "Bad request"}, status=400), True, False)
+                    break
+                body = await reader.readexactly(content_length) if content_length else b""
+
+                response = await self._loop.run_in_executor(
+                    self._executor, self.app.safe_handle, method, target, headers, body)
+                chunked = response.streaming and version == "HTTP/1.1"
+                close = self.closing or not self._keep_alive(version, headers) or (response.streaming and not chunked)
+                if not await self._write_response(writer, response, close, chunked):
+                    break
+                if not self.quiet:
+                    peer = writer.get_extra_info("peername") or ("-",)
+                    self.app.access_log.log(f'{peer[0]} - - "{method} {target} {version}" {response.status} -')
+                self._connections[writer] = False
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    @staticmethod
+    def _keep_alive(version, headers):
+        connection = (headers.get("Connection") or "").lower()
+        if version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+    async def _write_response(self, writer, response, close, chunked):
+        # Returns False when a streamed body failed part way and the connection must be dropped
+        lines = [f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}"]
+        lines.extend(f"{name}: {value}" for name, value in response.headers)
+        if not response.streaming:
+            lines.append(f"Content-Length: {len(response.body)}")
+        elif chunked:
+            lines.append("Transfer-Encoding: chunked")
+        if close:
+            lines.append("Connection: close")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        if not response.streaming:
+            writer.write(head + response.body)
+            await writer.drain()
+            return True
+
+        writer.write(head)
+        # Stream bodies produce their chunks by running tools, so pull them on
+        # the worker pool rather than the event loop
+        chunks = iter(response.body)
+        while True:
+            try:
+                chunk = await self._loop.run_in_executor(self._executor, next, chunks, None)
+            except Exception:
+                return False
+            if chunk is None:
+                break
+            if chunk:
+                writer.write(encode_chunk(chunk) if chunked else chunk)
+                await writer.drain()
+        if chunked:
+            writer.write(LAST_CHUNK)
+            await writer.drain()
+        return True
+
+
+def make_server(app, port=8000, mode="threaded", host="", workers=DEFAULT_WORKERS,
+                backlog=DEFAULT_BACKLOG, keepalive_timeout=KEEPALIVE_TIMEOUT, quiet=False, reuse_port=False):
+    # reuse_port: bind with SO_REUSEPORT, so other processes can listen on the port too
+    if mode == "single":
+        return SingleThreadedHTTPServer((host, port), app, quiet=quiet, reuse_port=reuse_port)
+    if mode == "threaded":
+        return ThreadPoolHTTPServer((host, port), app, workers=workers, backlog=backlog,
+                                    keepalive_timeout=keepalive_timeout, quiet=quiet, reuse_port=reuse_port)
+    if mode == "asyncio":
+        return AsyncMCPServer((host, port), app, workers=workers, backlog=backlog,
+                              keepalive_timeout=keepalive_timeout, quiet=quiet, reuse_port=reuse_port)
+    raise ValueError(f"Unknown server mode: {mode}")
+
+
+def serve(app, port=8000, mode="threaded", admission=None, processes=1, on_start=None, on_stop=None, **options):
+    # admission: AdmissionControl.configure() options for the app
+    # processes: worker processes sharing the port (see mcp_prefork.py)
+    # on_start/on_stop: called in each serving process before and after it serves
+    if admission:
+        app.configure_admission(**admission)
+    if processes > 1:
+        print(f"{app.name} MCP server running at http://localhost:{port} ({mode} mode, {processes} processes)")
+        run_workers(processes, lambda: _serve_process(app, port, mode, on_start, on_stop, reuse_port=True, **options),
+                    options.get("host", ""), port)
+    else:
+        print(f"{app.name} MCP server running at http://localhost:{port} ({mode} mode)")
+        _serve_process(app, port, mode, on_start, on_stop, **options)
+
+
+def _serve_process(app, port, mode, on_start, on_stop, **options):
+    if on_start is not None:
+        on_start()
+    try:
+        server = make_server(app, port, mode, **options)
+
+        # SIGINT/SIGTERM trigger a graceful shutdown: stop accepting, let
+        # in-flight requests finish, then close idle keep-alive connections
+        def request_stop(signum, frame):
+            print("Shutting down...")
+            threading.Thread(target=server.stop, daemon=True).start()
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+    finally:
+        if on_stop is not None:
+            on_stop()
+
+
+def tool_limit(value):
+    # --tool-limit weather___forecast=4 -> ("weather___forecast", 4)
+    name, _, limit = value.partition("=")
+    if not name or not limit.isdigit() or int(limit) < 1:
+        raise argparse.ArgumentTypeError(f"expected NAME=N with N >= 1, got {value!r}")
+    return name, int(limit)
+
+
+def make_arg_parser(default_port=8000):
+    # Options shared by every server; servers add their own before parsing
+    parser = argparse.ArgumentParser()
+    parser.add_argument("port", nargs="?", type=int, default=default_port, help="Port to listen on")
+    parser.add_argument("--mode", choices=SERVER_MODES, default="threaded", help="Serving mode")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Maximum number of requests handled concurrently")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help="Listen backlog for connections waiting for a worker")
+    parser.add_argument("--keepalive-timeout", type=float, default=KEEPALIVE_TIMEOUT,
+                        help="Seconds an idle persistent connection is kept open")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Maximum tool calls running at once; more wait in the admission queue (default: no limit)")
+    parser.add_argument("--tool-limit", action="append", type=tool_limit, metavar="NAME=N",
+                        help="Maximum concurrent calls of one tool (repeatable)")
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED,
+                        help="Calls waiting for a slot before new ones are shed as busy")
+    parser.add_argument("--queue-timeout", type=float, default=DEFAULT_QUEUE_TIMEOUT,
+                        help="Seconds a call waits for a slot before it is shed as busy")
+    parser.add_argument("--no-coalesce", action="store_true",
+                        help="Run every read call even if an identical one is in flight")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Worker processes sharing the port via SO_REUSEPORT, one per core to use (default: 1)")
+    return parser
+
+
+def parse_server_args(argv=None, default_port=8000):
+    return make_arg_parser(default_port).parse_args(argv)
+
+
+def server_options(args):
+    return {
+        "mode": args.mode,
+        "workers": args.workers,
+        "backlog": args.backlog,
+        "keepalive_timeout": args.keepalive_timeout,
+        "processes": args.processes,
+        "admission": {
+            "max_concurrent": args.max_concurrent,
+            "max_queued": args.max_queued,
+            "queue_timeout": args.queue_timeout,
+            "tool_limits": dict(args.tool_limit or ()),
+            "coalesce": not args.no_coalesce,
+        },
+    }
@@ -0,0 +1,230 @@
+import bisect
+import queue
+import sys
+import threading
+import time
+
+# Instrumentation shared by every MCP server, exposed on /metrics in the
+# Prometheus text format (version 0.0.4).
+#
+# ServerMetrics records, per tool: calls, errors (an {"error": ...} result or
+# an exception), a latency histogram and the number of calls in flight; and
+# per endpoint: requests by status, a latency histogram, request and response
+# body size histograms and the number of requests in flight; and the
+# admission control counters (queue depth and shed calls per limit, coalesced
+# calls per tool, see mcp_admission.py). Recording is a
+# few dict updates under one lock per metric family; rendering copies the
+# values under the same lock.
+#
+# Label values are bounded: tools are labelled by name only if registered and
+# unknown paths are folded into endpoint="other", so a client sending random
+# names cannot grow the metric set without limit.
+#
+# AccessLog writes access lines from a background thread. The request thread
+# only puts the line on a bounded queue; when the queue is full (stderr is
+# slower than the request rate) lines are dropped and counted instead of
+# blocking the request.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ACCESS_LOG_QUEUE = 10_000  # lines waiting to be written before new ones are dropped
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        samples = []
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((self.name + "_bucket",
+                                _format_labels(self.labels, key, f'le="{_format_value(bound)}"'), cumulative))
+            samples.append((self.name + "_sum", _format_labels(self.labels, key), counts[-1]))
+            samples.append((self.name + "_count", _format_labels(self.labels, key), cumulative))
+        return samples
+
+
+class CallbackGauge:
+    # Value read from a callable at scrape time (e.g. a store's key count)
+    def __init__(self, name, help, function, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.function = function
+
+    def samples(self):
+        return [(self.name, "", self.function())]
+
+
+class ServerMetrics:
+    def __init__(self, server_name):
+        self.server_name = server_name
+        self.started = time.time()
+        self.tool_calls = Counter("mcp_tool_calls_total", "Tool invocations", ("tool",))
+        self.tool_errors = Counter("mcp_tool_errors_total", "Tool invocations that returned an error", ("tool",))
+        self.tool_latency = Histogram("mcp_tool_duration_seconds", "Tool handler latency", ("tool",))
+        self.tools_in_flight = Gauge("mcp_tool_calls_in_flight", "Tool invocations currently running", ("tool",))
+        self.requests = Counter("mcp_http_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status"))
+        self.request_latency = Histogram("mcp_http_request_duration_seconds",
+                                         "Time to handle a request and produce its body", ("endpoint",))
+        self.request_bytes = Histogram("mcp_http_request_bytes", "Request body size", ("endpoint",), SIZE_BUCKETS)
+        self.response_bytes = Histogram("mcp_http_response_bytes", "Response body size", ("endpoint",), SIZE_BUCKETS)
+        self.requests_in_flight = Gauge("mcp_http_requests_in_flight", "Requests currently being handled")
+        self.admission_queued = Gauge("mcp_admission_queue_depth",
+                                      "Tool calls waiting for a concurrency slot", ("limit",))
+        self.admission_shed = Counter("mcp_admission_shed_total", "Tool calls rejected as busy",
+                                      ("limit", "reason"))
+        self.coalesced = Counter("mcp_coalesced_calls_total",
+                                 "Tool calls answered with the result of an identical call in flight", ("tool",))
+        self.families = [
+            self.tool_calls, self.tool_errors, self.tool_latency, self.tools_in_flight,
+            self.requests, self.request_latency, self.request_bytes, self.response_bytes, self.requests_in_flight,
+            self.admission_queued, self.admission_shed, self.coalesced,
+            CallbackGauge("mcp_uptime_seconds", "Seconds since the server started", lambda: time.time() - self.started),
+        ]
+        self.extra = []  # families added with add()
+
+    def add(self, family):
+        # Extra server-specific metric (Counter, Gauge, Histogram or CallbackGauge)
+        self.families.append(family)
+        self.extra.append(family)
+        return family
+
+    def tool_started(self, tool):
+        self.tools_in_flight.inc(tool)
+        return time.perf_counter()
+
+    def tool_finished(self, tool, started, failed):
+        self.tool_latency.observe(time.perf_counter() - started, tool)
+        self.tools_in_flight.dec(tool)
+        self.tool_calls.inc(tool)
+        if failed:
+            self.tool_errors.inc(tool)
+
+    def request_started(self, endpoint, body_bytes):
+        self.requests_in_flight.inc()
+        self.request_bytes.observe(body_bytes, endpoint)
+        return time.perf_counter()
+
+    def request_finished(self, endpoint, started, status, body_bytes):
+        self.request_latency.observe(time.perf_counter() - started, endpoint)
+        self.response_bytes.observe(body_bytes, endpoint)
+        self.requests.inc(endpoint, str(status))
+        self.requests_in_flight.dec()
+
+    def render(self):
+        lines = []
+        for family in self.families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for name, labels, value in family.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class AccessLog:
+    def __init__(self, stream=None, max_queued=ACCESS_LOG_QUEUE):
+        self.stream = stream or sys.stderr
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def metric(self):
+        return CallbackGauge("mcp_access_log_dropped_total", "Access log lines dropped because the writer fell behind",
+                             lambda: self.dropped, kind="counter")
+
+    def log(self, line):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="access-log", daemon=True)
+                self._thread.start()
+
+    def _write_loop(self):
+        while True:
+            lines = [self._queue.get()]
+            # Write whatever else is queued in the same call
+            try:
+                while len(lines) < 1000:
+                    lines.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self.stream.write("".join(line + "\n" for line in lines))
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
@@ -0,0 +1,140 @@
+import os
+import signal
+import socket
+import time
+import traceback
+
+# Pre-fork process mode for the MCP servers (serve(..., processes=N)).
+#
+# One Python process runs tool calls on one core at a time, so CPU-bound
+# tools (calc math, weather generation) stop scaling at one core whatever the
+# thread count. With --processes N the parent forks N workers; each binds its
+# own listening socket to the same port with SO_REUSEPORT and runs the usual
+# serving loop, and the kernel spreads incoming connections across them.
+#
+# The parent only supervises:
+#   - before forking it binds (without listening) a SO_REUSEPORT socket to the
+#     port, so a port that is already taken fails once, up front, instead of
+#     in every worker; only listening sockets receive connections
+#   - SIGINT/SIGTERM are passed on to the workers, which shut down gracefully
+#     as in single-process mode, and the parent waits for them
+#   - a worker that exits on its own is restarted, after RESTART_DELAY if it
+#     did not stay up for MIN_UPTIME (a crash loop does not spin); one that
+#     fails within MIN_UPTIME of launch means the server cannot start (bad
+#     options, an unusable data directory), so all workers are stopped
+#
+# Each worker is a full copy of the server: its own thread pool, admission
+# limits, coalescing and metrics (so /metrics shows the worker that answered).
+# State that must be the same in every worker has to live outside them - the
+# key-value server keeps its store in one owner process (kv_shared.py).
+# Needs os.fork() and SO_REUSEPORT, i.e. Linux or another Unix.
+
+MIN_UPTIME = 1.0  # seconds a worker must run for an immediate restart
+RESTART_DELAY = 1.0  # seconds before restarting a worker that died young
+POLL_INTERVAL = 0.1  # seconds between checks for exited workers
+
+
+def reserve_port(host, port):
+    # Fails like a normal bind if the port is taken by a non-SO_REUSEPORT socket
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise OSError("--processes needs SO_REUSEPORT, which this platform does not have")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        sock.bind((host, port))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _spawn(worker):
+    pid = os.fork()
+    if pid:
+        return pid
+    # Worker: serve() installs its own signal handlers
+    code = 1
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        worker()
+        code = 0
+    except KeyboardInterrupt:
+        code = 0
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(code)
+
+
+def run_workers(processes, worker, host="", port=None):
+    # Runs worker() in `processes` forked children until SIGINT/SIGTERM
+    reserved = reserve_port(host, port) if port is not None else None
+    workers = {}  # pid -> start time
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            print(f"Shutting down {len(workers)} workers...")
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+    launched = time.monotonic()
+    failed = False
+    try:
+        for _ in range(processes):
+            if stopping:
+                break
+            workers[_spawn(worker)] = time.monotonic()
+        while workers:
+            exited = _reap(workers)
+            if not exited:
+                time.sleep(POLL_INTERVAL)
+                continue
+            pid, status = exited
+            started = workers.pop(pid)
+            if stopping:
+                continue
+            if time.monotonic() - launched < MIN_UPTIME:
+                print(f"Worker {pid} failed to start ({_describe(status)})")
+                failed = True
+                request_stop(None, None)
+                continue
+            print(f"Worker {pid} exited ({_describe(status)}); restarting it")
+            if time.monotonic() - started < MIN_UPTIME:
+                time.sleep(RESTART_DELAY)
+            if not stopping:
+                workers[_spawn(worker)] = time.monotonic()
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        if reserved is not None:
+            reserved.close()
+    if failed:
+        raise SystemExit(1)
+
+
+def _reap(workers):
+    # (pid, status) of one exited worker, or None. Waits on the workers' pids
+    # only: other children (the key-value store owner) are not ours to reap.
+    for pid in list(workers):
+        try:
+            done, status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            return pid, 0
+        if done:
+            return pid, status
+    return None
+
+
+def _describe(status):
+    if os.WIFSIGNALED(status):
+        return f"signal {os.WTERMSIG(status)}"
+    return f"status {os.waitstatus_to_exitcode(status)}"
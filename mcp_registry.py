@@ -0,0 +1,102 @@
+import hashlib
+
+from mcp_codec import JSON
+from mcp_schema import compile_schema, format_errors
+
+# Table-driven tool registry shared by every MCP server.
+#
+# Tools are registered once with their handler and JSON schema. Dispatch is a
+# dict lookup by tool name, and the /mcp/tools catalog is serialized once and
+# served as cached bytes with an ETag, so neither cost grows with the number
+# of tools a server exposes.
+#
+# A tool may also declare how clients may cache its results; the declaration
+# is published as "cache" in its /mcp/tools entry:
+#   {"mode": "pure"}                                - result depends only on the parameters
+#   {"mode": "read", "resource": r, "ttl": seconds} - read-only view of resource r
+#   {"mode": "mutating", "resource": r}             - changes r; cached reads of r are stale
+# Tools without a declaration are never cached.
+#
+# Each tool's parameter schema is compiled at registration (mcp_schema.py)
+# and checked before the handler runs, so handlers get parameters already
+# converted to the declared types and invalid calls are rejected with
+#   {"error": "Invalid parameters for <tool>: <path>: <message>; ...",
+#    "errors": [{"path": ..., "message": ...}, ...]}
+
+PURE = {"mode": "pure"}
+
+
+def read_only(resource, ttl):
+    return {"mode": "read", "resource": resource, "ttl": ttl}
+
+
+def mutating(resource):
+    return {"mode": "mutating", "resource": resource}
+
+
+class Tool:
+    def __init__(self, name, description, parameters, handler, cache=None):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.handler = handler
+        self.cache = cache
+        self.validate = compile_schema(parameters)
+
+    def schema(self):
+        schema = {"name": self.name, "description": self.description, "parameters": self.parameters}
+        if self.cache:
+            schema["cache"] = self.cache
+        return schema
+
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools = {}
+        self._catalog = None
+
+    def register(self, name, description, parameters, handler, cache=None):
+        if name in self._tools:
+            raise ValueError(f"Tool already registered: {name}")
+        self._tools[name] = Tool(name, description, parameters, handler, cache)
+        self._catalog = None
+
+    def tool(self, name, description, parameters=None, cache=None):
+        # Decorator form of register(); the handler takes the parameters dict
+        # and returns a {"result": ...} or {"error": ...} response
+        def decorator(handler):
+            self.register(name, description, parameters or {"type": "object", "properties": {}}, handler, cache)
+            return handler
+        return decorator
+
+    def get(self, name):
+        return self._tools.get(name)
+
+    def names(self):
+        return list(self._tools)
+
+    def schemas(self):
+        return [tool.schema() for tool in self._tools.values()]
+
+    def invoke(self, name, parameters):
+        tool = self._tools.get(name)
+        if tool is None:
+            return {"error": f"Unknown tool: {name}"}
+        parameters, errors = tool.validate(parameters)
+        if errors:
+            return {"error": f"Invalid parameters for {name}: {format_errors(errors)}", "errors": errors}
+        return tool.handler(parameters)
+
+    def catalog(self):
+        # (body, etag) for the /mcp/tools response, rebuilt only after a registration
+        if self._catalog is None:
+            body = JSON.dumps({"tools": self.schemas()})
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            self._catalog = (body, etag)
+        return self._catalog
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def __len__(self):
+        return len(self._tools)
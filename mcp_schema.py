@@ -0,0 +1,372 @@
+import math
+import re
+
+# Compiles a tool's JSON schema into a validator that runs before dispatch.
+#
+# Each schema is turned into a tree of closures once, at registration, so a
+# call only pays for the checks its schema actually declares. The validator
+# returns (parameters, errors): the parameters converted to the declared
+# types, or a list of {"path", "message"} errors if they do not match. The
+# handler is only called with valid, typed parameters.
+#
+# Supported keywords: type (a name or a list of names), enum, properties,
+# required, additionalProperties, propertyNames, minProperties,
+# maxProperties, items, minItems, maxItems, minLength, maxLength, minimum,
+# maximum, exclusiveMinimum, exclusiveMaximum, oneOf and anyOf. Others
+# (description, default, ...) are ignored. oneOf is treated like anyOf - the
+# first matching alternative wins - which is all the tool schemas need.
+#
+# Conversions follow what LLMs tend to send:
+#   number  - ints, floats and numeric strings, always returned as a float
+#   integer - ints, integral floats (3.0) and integer strings
+#   string  - strings; numbers are accepted and converted with str()
+#   null    - an optional property that does not allow null is treated as
+#             absent when it is null, so handlers see their default
+# A string with "contentEncoding": "base64" also accepts bytes, which is how
+# binary data arrives in a MessagePack body (see mcp_codec.py).
+#
+# An array without an items schema is only checked to be a list, so large
+# numeric arrays for the calc tools are passed through without a per-element
+# walk. Containers are copied only if a value inside them was converted.
+
+MAX_ERRORS = 20  # stop collecting errors after this many
+
+INVALID = object()  # conversion result for a value of the wrong type
+INTEGER_STRING = re.compile(r"\s*[-+]?\d+\s*")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _to_number(value):
+    if _is_number(value):
+        try:
+            return float(value)
+        except OverflowError:
+            return INVALID
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return INVALID
+        return number if math.isfinite(number) else INVALID
+    return INVALID
+
+
+def _to_integer(value):
+    if isinstance(value, bool):
+        return INVALID
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else INVALID
+    if isinstance(value, str) and INTEGER_STRING.fullmatch(value):
+        return int(value)
+    return INVALID
+
+
+def _to_string(value):
+    if isinstance(value, str):
+        return value
+    if _is_number(value):
+        return str(value)
+    return INVALID
+
+
+def _to_bytes_or_string(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value
+    return _to_string(value)
+
+
+# (exact check, conversion) per JSON type; the exact check decides between
+# the types of a type list before any conversion is tried
+TYPES = {
+    "string": (lambda value: isinstance(value, str), _to_string),
+    "number": (_is_number, _to_number),
+    "integer": (lambda value: isinstance(value, int) and not isinstance(value, bool), _to_integer),
+    "boolean": (lambda value: isinstance(value, bool), lambda value: value if isinstance(value, bool) else INVALID),
+    "object": (lambda value: isinstance(value, dict), lambda value: value if isinstance(value, dict) else INVALID),
+    "array": (lambda value: isinstance(value, list), lambda value: value if isinstance(value, list) else INVALID),
+    "null": (lambda value: value is None, lambda value: value if value is None else INVALID),
+}
+
+TYPE_NAMES = {"string": "a string", "number": "a number", "integer": "an integer", "boolean": "a boolean",
+              "object": "an object", "array": "an array", "null": "null"}
+
+
+# Paths are (parent path, key) pairs, () at the top, and are only rendered
+# as text ("bindings[3].a") when an error is reported
+ROOT = ()
+
+
+def render_path(path):
+    parts = []
+    while path:
+        path, key = path
+        if isinstance(key, int):
+            parts.append(f"[{key}]")
+        elif key == "":
+            parts.append('[""]')
+        else:
+            parts.append("." + key if path else key)
+    return "".join(reversed(parts))
+
+
+def error(path, message):
+    return {"path": render_path(path), "message": message}
+
+
+def compile_schema(schema):
+    # Returns validate(value) -> (converted value, errors)
+    check = _compile(schema or {})
+
+    def validate(value):
+        errors = []
+        value = check(value, ROOT, errors)
+        return value, errors
+
+    return validate
+
+
+def _compile(schema):
+    checks = []  # each takes (value, path, errors) and returns the converted value or INVALID
+
+    if "type" in schema:
+        checks.append(_compile_type(schema))
+    if "oneOf" in schema or "anyOf" in schema:
+        checks.append(_compile_alternatives(schema.get("oneOf") or schema.get("anyOf")))
+    if "enum" in schema:
+        checks.append(_compile_enum(schema["enum"]))
+    checks.extend(_compile_bounds(schema))
+    if {"properties", "required", "additionalProperties", "propertyNames"} & set(schema):
+        checks.append(_compile_object(schema))
+    if "items" in schema:
+        checks.append(_compile_items(schema["items"]))
+
+    if not checks:
+        return lambda value, path, errors: value
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value, path, errors):
+        for check in checks:
+            value = check(value, path, errors)
+            if value is INVALID:
+                return INVALID
+        return value
+
+    return check_all
+
+
+def _compile_type(schema):
+    names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+    unknown = [name for name in names if name not in TYPES]
+    if unknown:
+        raise ValueError(f"Unsupported schema type: {', '.join(unknown)}")
+    expected = " or ".join(TYPE_NAMES[name] for name in names)
+
+    conversions = {name: TYPES[name][1] for name in names}
+    if schema.get("contentEncoding") == "base64" and "string" in conversions:
+        conversions["string"] = _to_bytes_or_string
+
+    if len(names) == 1:
+        convert = conversions[names[0]]
+
+        def check_type(value, path, errors):
+            converted = convert(value)
+            if converted is INVALID:
+                errors.append(error(path, f"must be {expected}"))
+            return converted
+
+        return check_type
+
+    exact = [(TYPES[name][0], conversions[name]) for name in names]
+
+    def check_types(value, path, errors):
+        for is_type, convert in exact:
+            if is_type(value):
+                return convert(value)
+        for _, convert in exact:
+            converted = convert(value)
+            if converted is not INVALID:
+                return converted
+        errors.append(error(path, f"must be {expected}"))
+        return INVALID
+
+    return check_types
+
+
+def _compile_alternatives(alternatives):
+    checks = [(_compile(alternative), _type_test(alternative)) for alternative in alternatives]
+    forms = ", ".join(str(alternative.get("type", "value")) for alternative in alternatives)
+
+    def check_alternatives(value, path, errors):
+        attempts = []
+        for check, is_type in checks:
+            attempt = []
+            converted = check(value, path, attempt)
+            if not attempt:
+                return converted
+            if is_type(value):
+                attempts.append(attempt)
+        if len(attempts) == 1:
+            errors.extend(attempts[0])  # the one form of the right type: say what is wrong with it
+        else:
+            errors.append(error(path, f"must match one of: {forms}"))
+        return INVALID
+
+    return check_alternatives
+
+
+def _type_test(schema):
+    # Exact (unconverted) type check for a schema; schemas without a type match anything
+    names = schema.get("type")
+    if names is None:
+        return lambda value: True
+    tests = [TYPES[name][0] for name in (names if isinstance(names, list) else [names])]
+    return lambda value: any(test(value) for test in tests)
+
+
+def _compile_enum(options):
+    allowed = list(options)
+    message = "must be one of " + ", ".join(repr(option) for option in allowed)
+
+    def check_enum(value, path, errors):
+        if value not in allowed:
+            errors.append(error(path, message))
+            return INVALID
+        return value
+
+    return check_enum
+
+
+def _compile_bounds(schema):
+    # (keyword, measure, test, message) for every declared bound
+    def size(value):
+        return len(value) if isinstance(value, (str, list, dict)) else None
+
+    def number(value):
+        return value if _is_number(value) else None
+
+    rules = [
+        ("minimum", number, lambda measured, limit: measured >= limit, "must be at least {}"),
+        ("maximum", number, lambda measured, limit: measured <= limit, "must be at most {}"),
+        ("exclusiveMinimum", number, lambda measured, limit: measured > limit, "must be greater than {}"),
+        ("exclusiveMaximum", number, lambda measured, limit: measured < limit, "must be less than {}"),
+        ("minLength", size, lambda measured, limit: measured >= limit, "must be at least {} characters long"),
+        ("maxLength", size, lambda measured, limit: measured <= limit, "must be at most {} characters long"),
+        ("minItems", size, lambda measured, limit: measured >= limit, "must have at least {} items"),
+        ("maxItems", size, lambda measured, limit: measured <= limit, "must have at most {} items"),
+        ("minProperties", size, lambda measured, limit: measured >= limit, "must have at least {} entries"),
+        ("maxProperties", size, lambda measured, limit: measured <= limit, "must have at most {} entries"),
+    ]
+    checks = []
+    for keyword, measure, test, message in rules:
+        if keyword not in schema:
+            continue
+        limit = schema[keyword]
+        if keyword in ("minLength", "minItems", "minProperties") and limit == 1:
+            message = "must not be empty"
+
+        def check_bound(value, path, errors, measure=measure, test=test, limit=limit,
+                        message=message.format(limit)):
+            measured = measure(value)
+            if measured is not None and not test(measured, limit):
+                errors.append(error(path, message))
+                return INVALID
+            return value
+
+        checks.append(check_bound)
+    return checks
+
+
+def _allows_null(schema):
+    types = schema.get("type")
+    if types is None:
+        return not ("oneOf" in schema or "anyOf" in schema or "enum" in schema)
+    return types == "null" or isinstance(types, list) and "null" in types
+
+
+def _compile_object(schema):
+    properties = {name: _compile(property) for name, property in (schema.get("properties") or {}).items()}
+    required = list(schema.get("required") or [])
+    # Optional properties for which null means "not given"
+    omit_null = {name for name, property in (schema.get("properties") or {}).items()
+                 if name not in required and not _allows_null(property)}
+    additional = schema.get("additionalProperties", True)
+    check_additional = _compile(additional) if isinstance(additional, dict) else None
+    check_name = _compile(dict(schema["propertyNames"], type="string")) if "propertyNames" in schema else None
+
+    def check_object(value, path, errors):
+        if not isinstance(value, dict):
+            return value  # left to the type check
+        failed = False
+        for name in required:
+            if name not in value:
+                errors.append(error((path, name), "is required"))
+                failed = True
+        converted = None
+        for name, item in value.items():
+            if len(errors) >= MAX_ERRORS:
+                return INVALID
+            item_path = (path, name)
+            if item is None and name in omit_null:
+                if converted is None:
+                    converted = dict(value)
+                del converted[name]
+                continue
+            check = properties.get(name)
+            if check is None:
+                if additional is False:
+                    errors.append(error(item_path, "is not an allowed parameter"))
+                    failed = True
+                    continue
+                check = check_additional
+            if check_name is not None and check_name(name, item_path, errors) is INVALID:
+                failed = True
+            if check is None:
+                continue
+            result = check(item, item_path, errors)
+            if result is INVALID:
+                failed = True
+            elif result is not item:
+                if converted is None:
+                    converted = dict(value)
+                converted[name] = result
+        if failed:
+            return INVALID
+        return value if converted is None else converted
+
+    return check_object
+
+
+def _compile_items(schema):
+    check = _compile(schema)
+
+    def check_items(value, path, errors):
+        if not isinstance(value, list):
+            return value  # left to the type check
+        failed = False
+        converted = None
+        for index, item in enumerate(value):
+            if len(errors) >= MAX_ERRORS:
+                return INVALID
+            result = check(item, (path, index), errors)
+            if result is INVALID:
+                failed = True
+            elif result is not item:
+                if converted is None:
+                    converted = list(value)
+                converted[index] = result
+        if failed:
+            return INVALID
+        return value if converted is None else converted
+
+    return check_items
+
+
+def format_errors(errors):
+    # "days: must be an integer; city: is required"
+    return "; ".join(f"{error['path'] or 'parameters'}: {error['message']}" for error in errors)
@@ -0,0 +1,285 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from mcp_codec import JSON, MSGPACK, is_msgpack
+from mcp_health import HEALTH_TIMEOUT, MAX_RETRY_WAIT, EndpointHealth, ServerUnavailable, backoff
+
+# Client-side transport for talking to MCP servers.
+#
+# Every server gets its own requests.Session so TCP connections are pooled and
+# reused across tool calls (the servers speak HTTP/1.1 keep-alive), and every
+# request carries a (connect, read) timeout so a hung server cannot block the
+# chat loop forever.
+#
+# Bodies go through mcp_codec's JSON codec. A server entry with
+# "codec": "msgpack" is spoken to in MessagePack instead (binary array data
+# then comes back as bytes rather than base64 strings).
+#
+# A server entry may list replicas as "urls" instead of a single "url". Each
+# URL has a circuit breaker (mcp_health.py), so a down replica is skipped
+# without a connection attempt. Failed calls are retried up to MAX_RETRIES
+# times with jittered exponential backoff, on another replica when there is
+# one:
+#   - a request that never reached the server (connection refused, connect
+#     timeout) or was shed as busy (503, see mcp_admission.py) is retried for
+#     any tool, after the server's retry_after for busy responses
+#   - read timeouts and other 5xx responses are retried only for idempotent
+#     calls (tools that declare a "pure" or "read" cache mode)
+# With "hedge_after": seconds (or "auto", the replica's recent p95 latency),
+# an idempotent call that has not answered by then is also sent to the next
+# replica, and the first answer wins, which bounds tail latency when one
+# replica is slow.
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 30
+POOL_SIZE = 10  # keep-alive connections per server
+MAX_PARALLEL_CALLS = 8
+MAX_RETRIES = 2
+HEDGE_WORKERS = 16  # threads sending hedged calls
+
+
+def server_urls(server):
+    return list(server.get("urls") or [server["url"]])
+
+
+def _never_sent(error):
+    # True when the request cannot have reached the server
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, "reason", reason)  # urllib3 MaxRetryError wraps the cause
+    return type(reason).__name__ == "NewConnectionError"
+
+
+class MCPTransport:
+    def __init__(self, servers, pool_size=POOL_SIZE, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_parallel=MAX_PARALLEL_CALLS, max_retries=MAX_RETRIES):
+        self.servers = servers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.health = {name: [EndpointHealth(url) for url in server_urls(server)] for name, server in servers.items()}
+        self._sessions = {name: self._make_session(pool_size, len(self.health[name])) for name in servers}
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="mcp-call")
+        self._hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="mcp-hedge")
+
+    @staticmethod
+    def _make_session(pool_size, hosts=1):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _timeout_for(self, server_name, timeout):
+        # Per-call timeout first, then a per-server "timeout" entry, then the default
+        if timeout is not None:
+            return timeout
+        return self.servers[server_name].get("timeout", self.timeout)
+
+    def _send(self, server_name, url, path, payload, timeout, headers=None, stream=False):
+        codec = MSGPACK if MSGPACK is not None and self.servers[server_name].get("codec") == "msgpack" else JSON
+        headers = dict(headers or {}, **{"Content-Type": codec.content_type, "Accept": codec.content_type})
+        return self._sessions[server_name].post(url + path, data=codec.dumps(payload), headers=headers,
+                                                stream=stream, timeout=self._timeout_for(server_name, timeout))
+
+    @staticmethod
+    def _decode(response):
+        codec = MSGPACK if is_msgpack(response.headers.get("Content-Type")) else JSON
+        return codec.loads(response.content)
+
+    def _busy_wait(self, response):
+        # Seconds a busy (shed) response asks the client to wait, or None
+        if response.status_code != 503 or "Retry-After" not in response.headers:
+            return None
+        try:
+            return float(self._decode(response).get("retry_after", response.headers["Retry-After"]))
+        except (ValueError, AttributeError):
+            return None
+
+    def _attempt(self, server_name, endpoint, path, payload, timeout, headers=None, stream=False):
+        # One request to one endpoint, reported to its circuit breaker
+        started = time.perf_counter()
+        try:
+            response = self._send(server_name, endpoint.url, path, payload, timeout, headers, stream)
+        except requests.RequestException:
+            endpoint.failed()
+            raise
+        if response.status_code >= 500 and self._busy_wait(response) is None:
+            endpoint.failed()
+        elif response.status_code < 500:
+            endpoint.succeeded(time.perf_counter() - started)
+        return response
+
+    def _probe(self, server_name, endpoint):
+        try:
+            healthy = self._sessions[server_name].get(endpoint.url + "/mcp/health", timeout=HEALTH_TIMEOUT).ok
+        except requests.RequestException:
+            healthy = False
+        endpoint.probed(healthy)
+        return healthy
+
+    def _available(self, server_name, tried=()):
+        # Endpoints whose breaker lets requests through, untried ones first
+        endpoints = sorted(self.health[server_name], key=lambda endpoint: endpoint in tried)
+        available = []
+        for endpoint in endpoints:
+            decision = endpoint.admit()
+            if decision == "probe" and not self._probe(server_name, endpoint):
+                continue
+            if decision is not None:
+                available.append(endpoint)
+        if not available:
+            wait = min(endpoint.retry_in() for endpoint in self.health[server_name])
+            raise ServerUnavailable(f"{server_name} server is unavailable (circuit open, next check in {wait:.1f}s)")
+        return available
+
+    def _hedged(self, server_name, endpoints, path, payload, timeout, headers):
+        # Sends to the first endpoint and, if it is slower than its hedge
+        # delay, to the second too; returns the first response to arrive
+        primary = self._hedge_executor.submit(self._attempt, server_name, endpoints[0], path, payload, timeout, headers)
+        try:
+            return primary.result(timeout=endpoints[0].hedge_after(self.servers[server_name]["hedge_after"]))
+        except FutureTimeout:
+            pass
+        hedge = self._hedge_executor.submit(self._attempt, server_name, endpoints[1], path, payload, timeout, headers)
+        error = None
+        for future in as_completed([primary, hedge]):
+            try:
+                return future.result()
+            except requests.RequestException as e:
+                error = e
+        raise error
+
+    def _request(self, server_name, path, payload, timeout=None, headers=None, idempotent=False):
+        # Returns the response of the first attempt that is not retried
+        hedging = idempotent and self.servers[server_name].get("hedge_after") is not None
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            endpoints = self._available(server_name, tried)
+            try:
+                if hedging and len(endpoints) > 1:
+                    tried.update(endpoints[:2])
+                    response = self._hedged(server_name, endpoints, path, payload, timeout, headers)
+                else:
+                    tried.add(endpoints[0])
+                    response = self._attempt(server_name, endpoints[0], path, payload, timeout, headers)
+            except requests.RequestException as e:
+                if last or not (idempotent or _never_sent(e)):
+                    raise
+                time.sleep(backoff(attempt))
+                continue
+            busy_wait = self._busy_wait(response)
+            if busy_wait is not None and not last and busy_wait <= MAX_RETRY_WAIT:
+                time.sleep(busy_wait + backoff(attempt))
+                continue
+            if busy_wait is None and response.status_code >= 500 and idempotent and not last:
+                time.sleep(backoff(attempt))
+                continue
+            return response
+
+    def post(self, server_name, path, payload, timeout=None, idempotent=False):
+        return self._decode(self._request(server_name, path, payload, timeout, idempotent=idempotent))
+
+    def list_tools(self, server_name, timeout=None):
+        return self.post(server_name, "/mcp/tools", {}, timeout=timeout, idempotent=True).get("tools", [])
+
+    def fetch_tools(self, server_name, etag=None, timeout=None):
+        # Conditional /mcp/tools request. Returns (tools, etag); tools is None
+        # when the server answered 304 Not Modified for the given etag.
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self._request(server_name, "/mcp/tools", {}, timeout, headers, idempotent=True)
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return self._decode(response).get("tools", []), response.headers.get("ETag")
+
+    def invoke(self, server_name, tool_name, parameters, timeout=None, idempotent=False):
+        return self.post(server_name, "/mcp/invoke", {"name": tool_name, "parameters": parameters},
+                         timeout=timeout, idempotent=idempotent)
+
+    def invoke_batch(self, server_name, invocations, parallel=False, timeout=None, idempotent=False):
+        # Returns one result dict per invocation, by position; idempotent if every invocation is
+        response = self.post(server_name, "/mcp/invoke_batch",
+                             {"invocations": invocations, "parallel": parallel}, timeout=timeout,
+                             idempotent=idempotent)
+        results = response.get("results")
+        if not isinstance(results, list) or len(results) != len(invocations):
+            raise ValueError(response.get("error", "Malformed batch response"))
+        return results
+
+    def stream_batch(self, server_name, invocations, parallel=False, timeout=None):
+        # Yields (index, result) pairs as the server finishes each invocation.
+        # Not retried: results may already have been consumed.
+        payload = {"invocations": invocations, "parallel": parallel, "stream": True}
+        endpoint = self._available(server_name)[0]
+        with self._attempt(server_name, endpoint, "/mcp/invoke_batch", payload, timeout, stream=True) as response:
+            if response.headers.get("Content-Type") != "application/x-ndjson":
+                raise ValueError(self._decode(response).get("error", "Malformed batch response"))
+            for line in response.iter_lines():
+                if line:
+                    item = JSON.loads(line)
+                    yield item.pop("index"), item
+
+    def health_status(self):
+        # {server name: [{"url", "state", "failures"}, ...]}
+        return {name: [endpoint.status() for endpoint in endpoints] for name, endpoints in self.health.items()}
+
+    def map(self, fn, items):
+        # Runs fn over items concurrently; results come back in input order
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self._executor.map(fn, items))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._hedge_executor.shutdown(wait=False)
+        for session in self._sessions.values():
+            session.close()
+
+
+class InProcessTransport(MCPTransport):
+    # Same interface as MCPTransport for servers running in this process
+    # (see mcp_host.py): requests go straight to each MCPApp's handler, with
+    # no socket, HTTP parsing or loopback hop. Bodies are still JSON-encoded so
+    # the client never shares objects with the server. Timeouts do not apply.
+    def __init__(self, apps, max_parallel=MAX_PARALLEL_CALLS):
+        self.apps = apps  # server name -> MCPApp
+        self.servers = {name: {"url": f"inprocess://{name}"} for name in apps}
+        self.timeout = None
+        self.health = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="mcp-call")
+
+    def _handle(self, server_name, path, payload, headers=None):
+        # No network in between, so no retries or circuit breaking either
+        return self.apps[server_name].safe_handle("POST", path, headers or {}, JSON.dumps(payload))
+
+    def post(self, server_name, path, payload, timeout=None, idempotent=False):
+        response = self._handle(server_name, path, payload)
+        return JSON.loads(b"".join(response.body) if response.streaming else response.body)
+
+    def fetch_tools(self, server_name, etag=None, timeout=None):
+        response = self._handle(server_name, "/mcp/tools", {}, {"If-None-Match": etag} if etag else None)
+        if response.status == 304:
+            return None, etag
+        if response.status >= 400:
+            raise ValueError(JSON.loads(response.body).get("error", f"HTTP {response.status}"))
+        return JSON.loads(response.body).get("tools", []), dict(response.headers).get("ETag")
+
+    def stream_batch(self, server_name, invocations, parallel=False, timeout=None):
+        payload = {"invocations": invocations, "parallel": parallel, "stream": True}
+        response = self._handle(server_name, "/mcp/invoke_batch", payload)
+        if not response.streaming:
+            raise ValueError(JSON.loads(response.body).get("error", "Malformed batch response"))
+        for chunk in response.body:
+            for line in chunk.splitlines():
+                if line:
+                    item = JSON.loads(line)
+                    yield item.pop("index"), item
+
+    def close(self):
+        self._executor.shutdown(wait=False)
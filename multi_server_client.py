@@ -1,78 +1,263 @@
 import json
-import requests
 import os
-from groq import Groq
 from dotenv import load_dotenv
 
+from agent_loop import DEFAULT_MAX_ROUNDS, StreamingAgent
+from conversation_memory import DEFAULT_BUDGET_TOKENS, RESULT_TOOL, ConversationMemory, ResultStore, estimate_tokens
+from llm_backends import make_backend
+from mcp_cache import ResultCache
+from mcp_transport import InProcessTransport, MCPTransport
+
 # Load environment variables from .env file
 load_dotenv()
 
-# MCP server configurations
+# MCP server configurations. An entry may list replicas as "urls": [...]
+# instead of "url", and set "hedge_after" (seconds, or "auto") to send slow
+# read calls to a second replica as well (see mcp_transport.py)
 MCP_SERVERS = {
     "keyvalue": {"url": "http://localhost:8000", "description": "Key-value storage operations"},
     "calc": {"url": "http://localhost:8002", "description": "Calculator operations"},
     "weather": {"url": "http://localhost:8003", "description": "Weather information"}
 }
 
+# All servers behind one server_HOST.py process: MCP_HOST_URL=http://localhost:8000
+HOST_URL = os.getenv("MCP_HOST_URL")
+if HOST_URL:
+    for server_name, server in MCP_SERVERS.items():
+        server["url"] = f"{HOST_URL.rstrip('/')}/{server_name}"
+        server.pop("urls", None)
+
+# MCP_IN_PROCESS=1 runs the servers inside the client instead of calling them over HTTP
+IN_PROCESS = os.getenv("MCP_IN_PROCESS", "") not in ("", "0")
+
+# Pooled connections and request timeouts for every configured server
+if IN_PROCESS:
+    from mcp_host import load_servers
+    transport = InProcessTransport({name: module.app for name, module in load_servers(MCP_SERVERS).items()})
+else:
+    transport = MCPTransport(MCP_SERVERS)
+
+# Owning server of every discovered tool
+TOOL_SERVERS = {}
+
+# Results of pure and read-only tools, as declared in their /mcp/tools entries
+result_cache = ResultCache()
+
+# Large tool results kept out of the conversation, readable through memory___get_result
+result_store = ResultStore()
+
+# Tools answered by the client itself rather than an MCP server
+LOCAL_TOOLS = {"memory___get_result": result_store.read}
+
+# Context window management: the model's window is 8192 tokens, of which
+# MAX_COMPLETION_TOKENS are kept free for the answer. Set MCP_SUMMARIZE=1 to
+# have turns that no longer fit summarized instead of just dropped.
+MODEL = "llama3-8b-8192"
+MAX_COMPLETION_TOKENS = 1000
+CONTEXT_BUDGET_TOKENS = int(os.getenv("MCP_CONTEXT_BUDGET", DEFAULT_BUDGET_TOKENS))
+SUMMARIZE_OLD_TURNS = os.getenv("MCP_SUMMARIZE", "") not in ("", "0")
+
+# LLM backend: "groq" (needs GROQ_API_KEY) or "mock", which replays scripted
+# tool calls offline - from MCP_MOCK_SCENARIOS if set (see llm_backends.py)
+LLM_BACKEND = os.getenv("MCP_LLM_BACKEND", "groq")
+MOCK_SCENARIOS_FILE = os.getenv("MCP_MOCK_SCENARIOS")
+
+# Rounds of tool calls the model may chain before it has to answer
+MAX_TOOL_ROUNDS = int(os.getenv("MCP_MAX_TOOL_ROUNDS", DEFAULT_MAX_ROUNDS))
+
+# Merged tool catalog from the last successful discovery, revalidated with ETags on startup
+TOOLS_CACHE_FILE = os.getenv("MCP_TOOLS_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mcp_tools_cache.json"))
+DISCOVERY_TIMEOUT = (1, 3)  # a down or slow server must not hold up startup
+
+def load_tools_cache():
+    try:
+        with open(TOOLS_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_tools_cache(cache):
+    # Write to a temporary file and rename so a crash never leaves a half-written cache
+    temp_file = TOOLS_CACHE_FILE + ".tmp"
+    try:
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(temp_file, TOOLS_CACHE_FILE)
+    except OSError as e:
+        print(f"Could not write tool cache {TOOLS_CACHE_FILE}: {e}")
+
+# Function to discover one server's tools, reusing the cached copy when the server says it is unchanged
+def discover_server_tools(server_name, cached):
+    url = MCP_SERVERS[server_name]["url"]
+    etag = cached["etag"] if cached and cached.get("url") == url else None
+    mcp_tools, etag = transport.fetch_tools(server_name, etag=etag, timeout=DISCOVERY_TIMEOUT)
+    if mcp_tools is None:
+        return cached, False
+    return {"url": url, "etag": etag, "tools": mcp_tools}, True
+
 # Function to get available tools from all MCP servers and format for Groq
 def get_all_mcp_tools():
     all_tools = []
+    cache = load_tools_cache()
+    server_names = list(MCP_SERVERS)
     
-    for server_name, server_info in MCP_SERVERS.items():
+    # Query every server concurrently
+    def discover(server_name):
         try:
-            response = requests.post(f"{server_info['url']}/mcp/tools", json={})
-            mcp_tools = response.json().get("tools", [])
-            
-            # Format tools for Groq API
-            for tool in mcp_tools:
-                groq_tool = {
-                    "type": "function",
-                    "function": {
-                        "name": tool["name"],
-                        "description": f"[{server_name.upper()}] {tool.get('description', '')}",
-                        "parameters": tool["parameters"]
-                    }
-                }
-                all_tools.append(groq_tool)
-                
-            print(f"Connected to {server_name} server: {len(mcp_tools)} tools found")
+            return discover_server_tools(server_name, cache.get(server_name))
         except Exception as e:
-            print(f"Error connecting to {server_name} server: {e}")
+            return e
+    
+    changed = False
+    for server_name, outcome in zip(server_names, transport.map(discover, server_names)):
+        if isinstance(outcome, Exception):
+            print(f"Error connecting to {server_name} server: {outcome}")
+            continue
+        entry, updated = outcome
+        cache[server_name] = entry
+        changed = changed or updated
+        mcp_tools = entry["tools"]
+        result_cache.set_policies(server_name, mcp_tools)
+        TOOL_SERVERS.update((tool["name"], server_name) for tool in mcp_tools)
+        
+        # Format tools for Groq API
+        for tool in mcp_tools:
+            groq_tool = {
+                "type": "function",
+                "function": {
+                    "name": tool["name"],
+                    "description": f"[{server_name.upper()}] {tool.get('description', '')}",
+                    "parameters": tool["parameters"]
+                }
+            }
+            all_tools.append(groq_tool)
+        
+        source = "fetched" if updated else "cached, unchanged"
+        print(f"Connected to {server_name} server: {len(mcp_tools)} tools found ({source})")
     
+    if changed:
+        save_tools_cache(cache)
     return all_tools
 
+# Function to find the server that owns a tool: the server that listed it,
+# or else the one named by the tool name prefix (calc___add -> calc)
+def get_server_for_tool(tool_name):
+    server_name = TOOL_SERVERS.get(tool_name)
+    if server_name is None:
+        prefix, separator, _ = tool_name.partition("___")
+        server_name = prefix if separator and prefix in MCP_SERVERS else None
+    return server_name
+
 # Function to invoke an MCP tool
-def invoke_mcp_tool(tool_name, parameters):
-    # Determine which server to use based on tool name prefix
-    server_name = None
-    for prefix in ["keyvalue___", "calc___", "weather___"]:
-        if tool_name.startswith(prefix):
-            server_name = prefix.replace("___", "")
-            break
+def invoke_mcp_tool(tool_name, parameters, timeout=None):
+    if tool_name in LOCAL_TOOLS:
+        return LOCAL_TOOLS[tool_name](parameters)
     
-    if not server_name or server_name not in MCP_SERVERS:
+    # Determine which server to use based on tool name prefix
+    server_name = get_server_for_tool(tool_name)
+    if not server_name:
         return {"error": f"Unknown tool prefix in {tool_name}"}
     
-    server_url = MCP_SERVERS[server_name]["url"]
-    
+    hit, result = result_cache.lookup(tool_name, parameters)
+    if hit:
+        return result
+    token = result_cache.token(tool_name)
     try:
-        response = requests.post(f"{server_url}/mcp/invoke", json={
-            "name": tool_name,
-            "parameters": parameters
-        })
-        return response.json()
+        result = transport.invoke(server_name, tool_name, parameters, timeout=timeout,
+                                  idempotent=result_cache.is_idempotent(tool_name))
     except Exception as e:
-        return {"error": f"Error invoking tool: {str(e)}"}
+        result = {"error": f"Error invoking tool: {str(e)}"}
+    if result_cache.is_mutating(tool_name):
+        result_cache.invalidate(tool_name)
+    else:
+        result_cache.store(tool_name, parameters, result, token)
+    return result
+
+# Function to invoke several MCP tools at once.
+# Takes (tool_name, parameters) pairs and returns the results in the same order.
+# Calls to the same server are grouped into a single /mcp/invoke_batch request
+# (run by the server in the given order); different servers are called concurrently.
+# Cached results are used for reads unless an earlier call in the same list
+# mutates the resource they read.
+def invoke_mcp_tools(calls):
+    results = [None] * len(calls)
+    groups = {}
+    dirty = set()
+    for index, (tool_name, parameters) in enumerate(calls):
+        if tool_name in LOCAL_TOOLS:
+            results[index] = LOCAL_TOOLS[tool_name](parameters)
+            continue
+        server_name = get_server_for_tool(tool_name)
+        if not server_name:
+            results[index] = {"error": f"Unknown tool prefix in {tool_name}"}
+            continue
+        if result_cache.is_mutating(tool_name):
+            dirty.add(result_cache.resource(tool_name))
+        elif result_cache.resource(tool_name) not in dirty:
+            hit, result = result_cache.lookup(tool_name, parameters)
+            if hit:
+                results[index] = result
+                continue
+        groups.setdefault(server_name, []).append(index)
+    
+    def invoke_group(group):
+        server_name, indexes = group
+        if len(indexes) == 1:
+            return [invoke_mcp_tool(*calls[indexes[0]])]
+        invocations = [{"name": calls[i][0], "parameters": calls[i][1]} for i in indexes]
+        tokens = {i: result_cache.token(calls[i][0]) for i in indexes}
+        try:
+            idempotent = all(result_cache.is_idempotent(calls[i][0]) for i in indexes)
+            group_results = transport.invoke_batch(server_name, invocations, idempotent=idempotent)
+        except Exception as e:
+            group_results = [{"error": f"Error invoking tool: {str(e)}"}] * len(indexes)
+        # Apply the batch to the cache in the order the server ran it
+        for position, (index, result) in enumerate(zip(indexes, group_results)):
+            tool_name, parameters = calls[index]
+            if result_cache.is_mutating(tool_name):
+                generation = result_cache.invalidate(tool_name)
+                for later in indexes[position + 1:]:
+                    if result_cache.resource(calls[later][0]) == result_cache.resource(tool_name):
+                        tokens[later] = generation
+            else:
+                result_cache.store(tool_name, parameters, result, tokens[index])
+        return group_results
+    
+    group_items = list(groups.items())
+    for (server_name, indexes), group_results in zip(group_items, transport.map(invoke_group, group_items)):
+        for index, result in zip(indexes, group_results):
+            results[index] = result
+    return results
+
+# Folds turns that no longer fit in the context window into a short summary
+def make_summarizer(backend):
+    def summarize(summary, messages):
+        transcript = "\n".join(f"{m['role']}: {m.get('content') or json.dumps(m.get('tool_calls'))}" for m in messages)
+        if summary:
+            transcript = f"Earlier summary: {summary}\n{transcript}"
+        response = backend.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": "Summarize this conversation in at most 100 words. Keep names, numbers, keys and decisions."},
+                {"role": "user", "content": transcript[-12000:]}
+            ],
+            max_tokens=200
+        )
+        return response.choices[0].message.content
+    return summarize
+
+def log_usage(memory, prompt_tokens):
+    print(memory.log_line(prompt_tokens))
 
 def main():
     # Get API key from .env file
     api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
+    if LLM_BACKEND == "groq" and not api_key:
         print("Error: GROQ_API_KEY not found in .env file")
         return
     
-    # Initialize Groq client
-    client = Groq(api_key=api_key)
+    # Initialize the LLM backend (the Groq client unless MCP_LLM_BACKEND=mock)
+    backend = make_backend(LLM_BACKEND, api_key=api_key, scenarios_file=MOCK_SCENARIOS_FILE)
     
     # Get available tools from all MCP servers
     tools = get_all_mcp_tools()
@@ -80,23 +265,26 @@ def main():
         print("Failed to get tools from any MCP server. Make sure at least one server is running.")
         return
     
-    # Extract tool names for display
-    tool_names = [tool["function"]["name"] for tool in tools]
+    tools.append(RESULT_TOOL)
+    tools_tokens = estimate_tokens(json.dumps(tools))
     
-    print("\nConnected to Groq API")
+    print("\nConnected to Groq API" if LLM_BACKEND == "groq" else f"Using the {LLM_BACKEND} LLM backend")
     print(f"Total available tools: {len(tools)}")
     print("Type 'exit' to quit")
     
     # Chat loop
-    messages = [
-        {
-            "role": "system", 
-            "content": f"""You are an AI assistant with access to multiple tool sets:
+    system_message = {
+        "role": "system",
+        "content": f"""You are an AI assistant with access to multiple tool sets:
 
 1. Key-Value Store (keyvalue___*):
-   - keyvalue___set: Store a value with a key
+   - keyvalue___set: Store a value with a key (optional ttl_seconds to expire it)
    - keyvalue___get: Retrieve a value by key
-   - keyvalue___list: List all stored keys
+   - keyvalue___list: List stored keys in sorted order (optional prefix, paginated with a cursor)
+   - keyvalue___mget / keyvalue___mset: Get or set several keys in one call
+   - keyvalue___delete: Delete keys
+   - keyvalue___incr: Atomically add to an integer counter
+   - keyvalue___cas: Compare-and-set a key
 
 2. Calculator (calc___*):
    - calc___add: Add two numbers
@@ -104,16 +292,49 @@ def main():
    - calc___multiply: Multiply two numbers
    - calc___divide: Divide first number by second
    - calc___sqrt: Calculate square root of a number
+   - calc___eval: Evaluate a whole formula like "sqrt(a*b + c)/d" with variable values in one call (prefer this over chaining calls)
+   - calc___array_add / _subtract / _multiply / _divide / _sqrt: Elementwise on whole arrays (numbers broadcast)
+   - calc___array_sum / _mean / _std / _min / _max / _cumsum / _dot / _percentile: Array statistics in one call
 
 3. Weather Information (weather___*):
    - weather___current: Get current weather for a city
    - weather___forecast: Get weather forecast for a city
-   - weather___cities: List available cities
+   - weather___cities: List available cities (optional prefix, paginated with a cursor)
+   - weather___nearest_city: Find the cities closest to a latitude/longitude
+   - weather___current_many / weather___forecast_many: Weather for many cities (a list or a bounding box) in one call
 
-Choose the appropriate tool based on the user's request.
+Large tool results are stored and shown as a preview with a handle; use memory___get_result to read more of them.
+
+Choose the appropriate tool based on the user's request. You can call tools again after seeing their results, so look things up first when a later call depends on them.
 """
-        }
-    ]
+    }
+    memory = ConversationMemory(system_message, store=result_store, budget_tokens=CONTEXT_BUDGET_TOKENS,
+                                summarizer=make_summarizer(backend) if SUMMARIZE_OLD_TURNS else None)
+    
+    # Streamed text is printed as it arrives, on an "AI:" line that tool calls and usage lines close
+    line_open = [False]
+    def show_text(text):
+        if not line_open[0]:
+            print("AI: ", end="")
+            line_open[0] = True
+        print(text, end="", flush=True)
+    def end_line():
+        if line_open[0]:
+            print()
+            line_open[0] = False
+    def show_tool_call(tool_name, tool_params):
+        end_line()
+        print(f"[Tool Call] {tool_name} with parameters: {tool_params}", flush=True)
+    def show_usage(memory, prompt_tokens):
+        end_line()
+        log_usage(memory, prompt_tokens)
+    
+    agent = StreamingAgent(
+        backend.create, invoke_mcp_tool, get_server_for_tool,
+        model=MODEL, max_tokens=MAX_COMPLETION_TOKENS, max_rounds=MAX_TOOL_ROUNDS,
+        on_text=show_text, on_tool_call=show_tool_call, on_request=show_usage,
+        invoke_many=invoke_mcp_tools
+    )
     
     while True:
         # Get user input
@@ -122,70 +343,15 @@ Choose the appropriate tool based on the user's request.
             break
         
         # Add user message to conversation
-        messages.append({"role": "user", "content": user_input})
+        memory.add_user(user_input)
         
         try:
-            # Call Groq API with function calling
-            response = client.chat.completions.create(
-                model="llama3-8b-8192",
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
-                max_tokens=1000
-            )
-            
-            # Process the response
-            message = response.choices[0].message
-            
-            # Check if the model wants to call a tool
-            if message.tool_calls:
-                for tool_call in message.tool_calls:
-                    # Extract tool name and parameters
-                    tool_name = tool_call.function.name
-                    tool_params = json.loads(tool_call.function.arguments)
-                    
-                    print(f"[Tool Call] {tool_name} with parameters: {tool_params}")
-                    
-                    # Call the MCP tool
-                    tool_result = invoke_mcp_tool(tool_name, tool_params)
-                    
-                    # Add the tool call and result to the conversation
-                    messages.append({
-                        "role": "assistant",
-                        "content": None,
-                        "tool_calls": [
-                            {
-                                "id": tool_call.id,
-                                "type": "function",
-                                "function": {
-                                    "name": tool_name,
-                                    "arguments": json.dumps(tool_params)
-                                }
-                            }
-                        ]
-                    })
-                    
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": json.dumps(tool_result)
-                    })
-                
-                # Get the final response after tool use
-                response = client.chat.completions.create(
-                    model="llama3-8b-8192",
-                    messages=messages,
-                    max_tokens=1000
-                )
-                message = response.choices[0].message
-            
-            # Display the assistant's response
-            print(f"AI: {message.content}")
-            
-            # Add the assistant's response to the conversation
-            messages.append({"role": "assistant", "content": message.content})
+            # Stream the answer; tool calls start as soon as their arguments are complete,
+            # and the model gets up to MAX_TOOL_ROUNDS rounds of tool calls
+            agent.run(memory, tools, tools_tokens)
             
         except Exception as e:
+            end_line()
             print(f"Error: {e}")
             print("Continuing conversation...")
 
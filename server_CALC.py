@@ -1,178 +1,251 @@
-import json
-import http.server
-import socketserver
 import math
-import sys
-from urllib.parse import urlparse
-
-class MCPHandler(http.server.BaseHTTPRequestHandler):
-    def do_POST(self):
-        # Get the request data
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length).decode('utf-8')
-        request = json.loads(post_data)
-        
-        # Parse the path to determine the endpoint
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        response = {"error": "Unknown endpoint"}
-        
-        # Handle MCP endpoints
-        if path == "/mcp/tools":
-            # Return available tools - this is how the LLM discovers what tools are available
-            response = {
-                "tools": [
-                    {
-                        "name": "calc___add",
-                        "description": "Add two numbers",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "a": {"type": "number", "description": "First number"},
-                                "b": {"type": "number", "description": "Second number"}
-                            },
-                            "required": ["a", "b"]
-                        }
-                    },
-                    {
-                        "name": "calc___subtract",
-                        "description": "Subtract second number from first",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "a": {"type": "number", "description": "First number"},
-                                "b": {"type": "number", "description": "Second number"}
-                            },
-                            "required": ["a", "b"]
-                        }
-                    },
-                    {
-                        "name": "calc___multiply",
-                        "description": "Multiply two numbers",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "a": {"type": "number", "description": "First number"},
-                                "b": {"type": "number", "description": "Second number"}
-                            },
-                            "required": ["a", "b"]
-                        }
-                    },
-                    {
-                        "name": "calc___divide",
-                        "description": "Divide first number by second",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "a": {"type": "number", "description": "First number (dividend)"},
-                                "b": {"type": "number", "description": "Second number (divisor)"}
-                            },
-                            "required": ["a", "b"]
-                        }
-                    },
-                    {
-                        "name": "calc___sqrt",
-                        "description": "Calculate square root of a number",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "n": {"type": "number", "description": "Number to find square root of"}
-                            },
-                            "required": ["n"]
-                        }
-                    }
-                ]
-            }
-        elif path == "/mcp/invoke":
-            # Handle tool invocation - this is how the LLM calls the tools
-            tool_name = request.get("name", "")
-            parameters = request.get("parameters", {})
-            
-            if tool_name == "calc___add":
-                a = parameters.get("a")
-                b = parameters.get("b")
-                if a is not None and b is not None:
-                    try:
-                        result = float(a) + float(b)
-                        response = {"result": result}
-                    except Exception as e:
-                        response = {"error": f"Error calculating: {str(e)}"}
-                else:
-                    response = {"error": "Missing a or b parameters"}
-            
-            elif tool_name == "calc___subtract":
-                a = parameters.get("a")
-                b = parameters.get("b")
-                if a is not None and b is not None:
-                    try:
-                        result = float(a) - float(b)
-                        response = {"result": result}
-                    except Exception as e:
-                        response = {"error": f"Error calculating: {str(e)}"}
-                else:
-                    response = {"error": "Missing a or b parameters"}
-            
-            elif tool_name == "calc___multiply":
-                a = parameters.get("a")
-                b = parameters.get("b")
-                if a is not None and b is not None:
-                    try:
-                        result = float(a) * float(b)
-                        response = {"result": result}
-                    except Exception as e:
-                        response = {"error": f"Error calculating: {str(e)}"}
-                else:
-                    response = {"error": "Missing a or b parameters"}
-            
-            elif tool_name == "calc___divide":
-                a = parameters.get("a")
-                b = parameters.get("b")
-                if a is not None and b is not None:
-                    try:
-                        if float(b) == 0:
-                            response = {"error": "Division by zero"}
-                        else:
-                            result = float(a) / float(b)
-                            response = {"result": result}
-                    except Exception as e:
-                        response = {"error": f"Error calculating: {str(e)}"}
-                else:
-                    response = {"error": "Missing a or b parameters"}
-            
-            elif tool_name == "calc___sqrt":
-                n = parameters.get("n")
-                if n is not None:
-                    try:
-                        if float(n) < 0:
-                            response = {"error": "Cannot calculate square root of negative number"}
-                        else:
-                            result = math.sqrt(float(n))
-                            response = {"result": result}
-                    except Exception as e:
-                        response = {"error": f"Error calculating: {str(e)}"}
-                else:
-                    response = {"error": "Missing n parameter"}
-        
-        # Send response
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
-
-def run_server(port=8000):
-    with socketserver.TCPServer(("", port), MCPHandler) as httpd:
-        print(f"Calculator MCP server running at http://localhost:{port}")
-        httpd.serve_forever()
 
-if __name__ == "__main__":
-    # Get port from command line argument if provided
-    port = 8000
-    if len(sys.argv) > 1:
+import numpy as np
+
+from calc_arrays import ENCODING_SCHEMA, ArrayError, array_schema, decode_array, encode_array
+from calc_expr import ExpressionError, compile_expression
+from mcp_http import MCPApp, parse_server_args, serve, server_options
+from mcp_registry import PURE, ToolRegistry
+
+# Tools are registered with their JSON schema - /mcp/tools is how the LLM
+# discovers what tools are available and /mcp/invoke is how it calls them
+registry = ToolRegistry()
+
+def two_numbers(first="First number", second="Second number"):
+    return {
+        "type": "object",
+        "properties": {
+            "a": {"type": "number", "description": first},
+            "b": {"type": "number", "description": second}
+        },
+        "required": ["a", "b"]
+    }
+
+def binary_operation(operation):
+    # Wraps a two-argument function into a tool handler taking {"a", "b"};
+    # the schema has already made both of them floats
+    def handler(parameters):
+        return operation(parameters["a"], parameters["b"])
+    return handler
+
+def divide(a, b):
+    if b == 0:
+        return {"error": "Division by zero"}
+    return {"result": a / b}
+
+registry.register("calc___add", "Add two numbers", two_numbers(),
+                  binary_operation(lambda a, b: {"result": a + b}), cache=PURE)
+registry.register("calc___subtract", "Subtract second number from first", two_numbers(),
+                  binary_operation(lambda a, b: {"result": a - b}), cache=PURE)
+registry.register("calc___multiply", "Multiply two numbers", two_numbers(),
+                  binary_operation(lambda a, b: {"result": a * b}), cache=PURE)
+registry.register("calc___divide", "Divide first number by second",
+                  two_numbers("First number (dividend)", "Second number (divisor)"),
+                  binary_operation(divide), cache=PURE)
+
+@registry.tool(
+    "calc___sqrt",
+    "Calculate square root of a number",
+    {
+        "type": "object",
+        "properties": {
+            "n": {"type": "number", "description": "Number to find square root of"}
+        },
+        "required": ["n"]
+    },
+    cache=PURE,
+)
+def calc_sqrt(parameters):
+    n = parameters["n"]
+    if n < 0:
+        return {"error": "Cannot calculate square root of negative number"}
+    return {"result": math.sqrt(n)}
+
+# Array tools: one call runs a NumPy kernel over a whole series instead of
+# one tool call per element. Inputs and results may use the base64 binary
+# array form described in calc_arrays.py.
+
+def array_operation(kernel, arguments=("x",)):
+    # Wraps kernel(*arrays, parameters) into a tool handler; the named
+    # arguments are decoded to arrays and the result is encoded as requested
+    def handler(parameters):
+        encoding = parameters.get("encoding", "json")
         try:
-            port = int(sys.argv[1])
-        except ValueError:
-            print(f"Invalid port number: {sys.argv[1]}")
-            sys.exit(1)
-    
-    run_server(port)
\ No newline at end of file
+            arrays = [decode_array(parameters[name], name) for name in arguments]
+            with np.errstate(all="ignore"):
+                result = kernel(*arrays, parameters)
+        except ArrayError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"Error calculating: {str(e)}"}
+        if isinstance(result, dict):
+            return result
+        if not np.all(np.isfinite(result)):
+            return {"error": "Result contains NaN or infinity"}
+        return {"result": encode_array(result, encoding)}
+    return handler
+
+def array_parameters(properties, required):
+    return {
+        "type": "object",
+        "properties": dict(properties, encoding=ENCODING_SCHEMA),
+        "required": required
+    }
+
+def two_arrays(first="First array or number", second="Second array or number"):
+    return array_parameters({"a": array_schema(first), "b": array_schema(second)}, ["a", "b"])
+
+def one_array(description="Input array", **extra):
+    return array_parameters(dict({"x": array_schema(description)}, **extra), ["x"])
+
+def array_divide(a, b, parameters):
+    if np.any(b == 0):
+        return {"error": "Division by zero"}
+    return np.divide(a, b)
+
+def array_sqrt(x, parameters):
+    if np.any(x < 0):
+        return {"error": "Cannot calculate square root of negative number"}
+    return np.sqrt(x)
+
+def reduction(function):
+    def kernel(x, parameters):
+        if x.size == 0:
+            raise ArrayError("x is empty")
+        return function(x, axis=parameters.get("axis"))
+    return kernel
+
+AXIS_SCHEMA = {"type": "integer", "description": "Axis to reduce along (default: the whole array)"}
+
+registry.register("calc___array_add", "Add two arrays elementwise (NumPy broadcasting: either may be a number)",
+                  two_arrays(), array_operation(lambda a, b, p: np.add(a, b), ("a", "b")), cache=PURE)
+registry.register("calc___array_subtract", "Subtract array b from array a elementwise, with broadcasting",
+                  two_arrays(), array_operation(lambda a, b, p: np.subtract(a, b), ("a", "b")), cache=PURE)
+registry.register("calc___array_multiply", "Multiply two arrays elementwise, with broadcasting (scale a series by a number)",
+                  two_arrays(), array_operation(lambda a, b, p: np.multiply(a, b), ("a", "b")), cache=PURE)
+registry.register("calc___array_divide", "Divide array a by array b elementwise, with broadcasting",
+                  two_arrays("Dividend array or number", "Divisor array or number"),
+                  array_operation(array_divide, ("a", "b")), cache=PURE)
+registry.register("calc___array_sqrt", "Square root of every element of an array",
+                  one_array(), array_operation(array_sqrt), cache=PURE)
+
+for name, function, description in [
+    ("sum", np.sum, "Sum of the elements of an array"),
+    ("mean", np.mean, "Mean of the elements of an array"),
+    ("std", np.std, "Population standard deviation of the elements of an array"),
+    ("min", np.min, "Smallest element of an array"),
+    ("max", np.max, "Largest element of an array"),
+    ("cumsum", np.cumsum, "Cumulative sum of an array (flattened unless axis is given)"),
+]:
+    registry.register(f"calc___array_{name}", description, one_array(axis=AXIS_SCHEMA),
+                      array_operation(reduction(function)), cache=PURE)
+
+registry.register("calc___array_dot", "Dot product of two vectors (or matrix product of 2-D arrays)",
+                  two_arrays(), array_operation(lambda a, b, p: np.dot(a, b), ("a", "b")), cache=PURE)
+
+def array_percentile(x, q, parameters):
+    if x.size == 0:
+        raise ArrayError("x is empty")
+    if np.any((q < 0) | (q > 100)):
+        return {"error": "Percentiles must be between 0 and 100"}
+    return np.percentile(x, q, axis=parameters.get("axis"))
+
+registry.register("calc___array_percentile", "Percentile(s) of the elements of an array",
+                  array_parameters({"x": array_schema("Input array"),
+                                    "q": array_schema("Percentile or list of percentiles, 0-100"),
+                                    "axis": AXIS_SCHEMA}, ["x", "q"]),
+                  array_operation(array_percentile, ("x", "q")), cache=PURE)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+NON_FINITE_ERROR = "Result contains NaN or infinity (division by zero or a value outside a function's domain)"
+
+def binding_columns(compiled, variables, bindings):
+    # Turns a list of {variable: number} rows into one array per variable;
+    # names also given in `variables` are shared by every row
+    columns = {}
+    for name in compiled.variables - set(variables):
+        column = []
+        for index, row in enumerate(bindings):
+            if name not in row:
+                raise ArrayError(f"bindings[{index}] has no value for {name}")
+            column.append(row[name])
+        columns[name] = decode_array(column, f"bindings.{name}")
+    return columns
+
+@registry.tool(
+    "calc___eval",
+    "Evaluate an arithmetic expression such as 'sqrt(a*b + c) / d' in one call. Supports + - * / // % **, "
+    "pi, e and the functions sqrt, abs, exp, log, log10, log2, sin, cos, tan, asin, acos, atan, atan2, "
+    "hypot, floor, ceil, round, pow, min, max. Variables may be arrays to evaluate over many values at once",
+    {
+        "type": "object",
+        "properties": {
+            "expression": {"type": "string", "minLength": 1, "description": "The expression to evaluate"},
+            "variables": {
+                "type": "object",
+                "additionalProperties": array_schema("A number, or an array to evaluate elementwise"),
+                "description": "Values of the variables used in the expression"
+            },
+            "bindings": {
+                "type": "array",
+                "items": {"type": "object", "additionalProperties": {"type": "number"}},
+                "description": "Evaluate once per object of variable values; returns one result per object"
+            },
+            "encoding": ENCODING_SCHEMA
+        },
+        "required": ["expression"]
+    },
+    cache=PURE,
+)
+def calc_eval(parameters):
+    variables = parameters.get("variables", {})
+    bindings = parameters.get("bindings")
+    encoding = parameters.get("encoding", "json")
+    try:
+        compiled = compile_expression(parameters["expression"])
+        missing = compiled.variables - set(variables) - (set(bindings[0]) if bindings else set())
+        if missing:
+            return {"error": f"Missing values for variables: {', '.join(sorted(missing))}"}
+
+        # Plain numbers: evaluate once on floats
+        if bindings is None and all(is_number(variables[name]) for name in compiled.variables):
+            result = compiled.evaluate({name: variables[name] for name in compiled.variables})
+            if not math.isfinite(result):
+                return {"error": NON_FINITE_ERROR}
+            return {"result": result}
+
+        # Arrays or bindings: one vectorized evaluation over all of them
+        arrays = {name: decode_array(variables[name], name) for name in compiled.variables & set(variables)}
+        if bindings is not None:
+            # Array variables must line up with the rows, so there is still one result per row
+            for name, array in arrays.items():
+                if np.ndim(array) != 0 and np.shape(array) != (len(bindings),):
+                    return {"error": f"Variable {name} must be a number or an array of {len(bindings)} values, "
+                                     "one per bindings row"}
+            arrays.update(binding_columns(compiled, variables, bindings))
+        result = compiled.evaluate_arrays(arrays)
+        if bindings is not None and np.ndim(result) == 0:
+            result = np.full(len(bindings), result)  # one result per row even if no row variable is used
+    except (ExpressionError, ArrayError) as e:
+        return {"error": str(e)}
+    except ZeroDivisionError:
+        return {"error": "Division by zero"}
+    except RecursionError:
+        return {"error": "Expression is nested too deeply"}
+    except Exception as e:
+        return {"error": f"Error calculating: {str(e)}"}
+    if not np.all(np.isfinite(result)):
+        return {"error": NON_FINITE_ERROR}
+    return {"result": encode_array(result, encoding)}
+
+app = MCPApp("Calculator", registry)
+
+def run_server(port=8000, **options):
+    serve(app, port, **options)
+
+if __name__ == "__main__":
+    # Port comes from the first command line argument; see --help for serving options
+    args = parse_server_args()
+    run_server(args.port, **server_options(args))
@@ -0,0 +1,38 @@
+import server_SGL
+import server_WEATHER
+from mcp_host import SERVER_MODULES, host_app, import_servers, start_servers, stop_servers
+from mcp_http import make_arg_parser, serve, server_options
+
+# Serves the keyvalue, calc and weather servers from one process and one port
+# (see mcp_host.py). Point the client at it with MCP_HOST_URL:
+#
+#   python server_HOST.py 8000
+#   MCP_HOST_URL=http://localhost:8000 python multi_server_client.py
+
+def run_server(port=8000, servers=tuple(SERVER_MODULES), config=None, processes=1, **options):
+    # config: start() options of the mounted servers (kv_backend=..., cities_file=...)
+    modules = import_servers(servers)
+    config = dict(config or {})
+    owner = None
+    if processes > 1 and "keyvalue" in modules:
+        # Worker processes share one key-value store, held by an owner process
+        owner = server_SGL.start_owner(**{option: value for option, value in config.items()
+                                          if option.startswith("kv_")})
+        config["kv_shared"] = owner.address
+    try:
+        serve(host_app(modules), port, processes=processes, on_start=lambda: start_servers(modules, **config),
+              on_stop=lambda: stop_servers(modules), **options)
+    finally:
+        if owner is not None:
+            owner.shutdown()
+
+if __name__ == "__main__":
+    # Port comes from the first command line argument; see --help for serving options
+    parser = make_arg_parser()
+    parser.add_argument("--servers", nargs="+", choices=list(SERVER_MODULES), default=list(SERVER_MODULES),
+                        help="Servers to mount (default: all)")
+    server_SGL.add_arguments(parser)
+    server_WEATHER.add_arguments(parser)
+    args = parser.parse_args()
+    config = dict(server_SGL.start_options(args), **server_WEATHER.start_options(args))
+    run_server(args.port, servers=args.servers, config=config, **server_options(args))
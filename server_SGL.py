@@ -1,109 +1,306 @@
-import json
-import http.server
-import socketserver
-import sys
-from urllib.parse import urlparse
-
-# Simple in-memory key-value store
-kv_store = {}
-
-class MCPHandler(http.server.BaseHTTPRequestHandler):
-    def do_POST(self):
-        # Get the request data
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length).decode('utf-8')
-        request = json.loads(post_data)
-        
-        # Parse the path to determine the endpoint
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        response = {"error": "Unknown endpoint"}
-        
-        # Handle MCP endpoints
-        if path == "/mcp/tools":
-            # Return available tools - this is how the LLM discovers what tools are available
-            response = {
-                "tools": [
-                    {
-                        "name": "keyvalue___set",
-                        "description": "Set a value for a key in the key-value store",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "key": {"type": "string", "description": "The key to set"},
-                                "value": {"type": "string", "description": "The value to store"}
-                            },
-                            "required": ["key", "value"]
-                        }
-                    },
-                    {
-                        "name": "keyvalue___get",
-                        "description": "Get a value for a key from the key-value store",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "key": {"type": "string", "description": "The key to retrieve"}
-                            },
-                            "required": ["key"]
-                        }
-                    },
-                    {
-                        "name": "keyvalue___list",
-                        "description": "List all keys in the key-value store",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {}
-                        }
-                    }
-                ]
-            }
-        elif path == "/mcp/invoke":
-            # Handle tool invocation - this is how the LLM calls the tools
-            tool_name = request.get("name", "")
-            parameters = request.get("parameters", {})
-            
-            if tool_name == "keyvalue___set":
-                key = parameters.get("key")
-                value = parameters.get("value")
-                if key and value:
-                    kv_store[key] = value
-                    response = {"result": f"Key '{key}' set successfully"}
-                else:
-                    response = {"error": "Missing key or value parameters"}
-            
-            elif tool_name == "keyvalue___get":
-                key = parameters.get("key")
-                if key:
-                    if key in kv_store:
-                        response = {"result": kv_store[key]}
-                    else:
-                        response = {"error": f"Key '{key}' not found"}
-                else:
-                    response = {"error": "Missing key parameter"}
-            
-            elif tool_name == "keyvalue___list":
-                response = {"result": list(kv_store.keys())}
-        
-        # Send response
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
-
-def run_server(port=8000):
-    with socketserver.TCPServer(("", port), MCPHandler) as httpd:
-        print(f"KeyValue MCP server running at http://localhost:{port}")
-        httpd.serve_forever()
+import base64
+import binascii
 
-if __name__ == "__main__":
-    # Get port from command line argument if provided
-    port = 8000
-    if len(sys.argv) > 1:
+from kv_policies import EVICTION_POLICIES
+from kv_shared import StoreOwner, connect_store
+from kv_storage import BACKENDS, SYNC_MODES, KeyValueStore, MemoryBackend, open_backend
+from mcp_codec import JSON
+from mcp_http import MCPApp, Response, json_response, make_arg_parser, serve, server_options
+from mcp_metrics import CallbackGauge
+from mcp_registry import ToolRegistry, mutating, read_only
+
+# Key-value store; in-memory unless run_server() opens a durable backend
+kv_store = KeyValueStore(MemoryBackend())
+
+MAX_MULTI_KEYS = 1000  # keys accepted by one mget/mset/delete call
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 1000
+EXPORT_LINES_PER_CHUNK = 500
+
+# Clients may cache reads briefly; their own writes invalidate them at once,
+# other clients' writes (and TTL expiry) show up within KV_CACHE_TTL seconds
+KV_CACHE_TTL = 5
+KV_READ = read_only("keyvalue", KV_CACHE_TTL)
+
+# Tools are registered with their JSON schema - /mcp/tools is how the LLM
+# discovers what tools are available and /mcp/invoke is how it calls them
+registry = ToolRegistry()
+
+# Parameter schemas shared by several tools; the registry checks them before
+# a handler runs, so handlers only see non-empty string keys and positive TTLs
+def key_schema(description):
+    return {"type": "string", "minLength": 1, "description": description}
+
+def keys_schema(description):
+    return {"type": "array", "items": {"type": "string", "minLength": 1},
+            "minItems": 1, "maxItems": MAX_MULTI_KEYS, "description": description}
+
+def ttl_schema(description):
+    return {"type": "number", "exclusiveMinimum": 0, "description": description}
+
+@registry.tool(
+    "keyvalue___set",
+    "Set a value for a key in the key-value store",
+    {
+        "type": "object",
+        "properties": {
+            "key": key_schema("The key to set"),
+            "value": {"type": "string", "description": "The value to store"},
+            "ttl_seconds": ttl_schema("Expire the key after this many seconds (default: never)")
+        },
+        "required": ["key", "value"]
+    },
+    cache=mutating("keyvalue"),
+)
+def keyvalue_set(parameters):
+    key = parameters["key"]
+    kv_store.set(key, parameters["value"], parameters.get("ttl_seconds"))
+    return {"result": f"Key '{key}' set successfully"}
+
+@registry.tool(
+    "keyvalue___get",
+    "Get a value for a key from the key-value store",
+    {
+        "type": "object",
+        "properties": {
+            "key": key_schema("The key to retrieve")
+        },
+        "required": ["key"]
+    },
+    cache=KV_READ,
+)
+def keyvalue_get(parameters):
+    key = parameters["key"]
+    value = kv_store.get(key)
+    if value is not None:
+        return {"result": value}
+    return {"error": f"Key '{key}' not found"}
+
+@registry.tool(
+    "keyvalue___mget",
+    "Get the values of several keys at once (missing keys map to null)",
+    {
+        "type": "object",
+        "properties": {
+            "keys": keys_schema("The keys to retrieve")
+        },
+        "required": ["keys"]
+    },
+    cache=KV_READ,
+)
+def keyvalue_mget(parameters):
+    keys = parameters["keys"]
+    return {"result": dict(zip(keys, kv_store.mget(keys)))}
+
+@registry.tool(
+    "keyvalue___mset",
+    "Set several keys at once; either all of them are stored or none are",
+    {
+        "type": "object",
+        "properties": {
+            "items": {
+                "type": "object",
+                "additionalProperties": {"type": "string"},
+                "propertyNames": {"minLength": 1},
+                "minProperties": 1,
+                "maxProperties": MAX_MULTI_KEYS,
+                "description": "Mapping of key to value"
+            },
+            "ttl_seconds": ttl_schema("Expire the keys after this many seconds (default: never)")
+        },
+        "required": ["items"]
+    },
+    cache=mutating("keyvalue"),
+)
+def keyvalue_mset(parameters):
+    items = parameters["items"]
+    kv_store.mset(items.items(), parameters.get("ttl_seconds"))
+    return {"result": f"{len(items)} keys set successfully"}
+
+@registry.tool(
+    "keyvalue___delete",
+    "Delete one or more keys from the key-value store",
+    {
+        "type": "object",
+        "properties": {
+            "keys": keys_schema("The keys to delete")
+        },
+        "required": ["keys"]
+    },
+    cache=mutating("keyvalue"),
+)
+def keyvalue_delete(parameters):
+    return {"result": {"deleted": kv_store.delete_many(parameters["keys"])}}
+
+@registry.tool(
+    "keyvalue___incr",
+    "Atomically add to the integer stored at a key (a missing key counts as 0) and return the new value",
+    {
+        "type": "object",
+        "properties": {
+            "key": key_schema("The counter key"),
+            "amount": {"type": "integer", "description": "Amount to add (default 1, may be negative)"}
+        },
+        "required": ["key"]
+    },
+    cache=mutating("keyvalue"),
+)
+def keyvalue_incr(parameters):
+    key = parameters["key"]
+    try:
+        return {"result": kv_store.incr(key, parameters.get("amount", 1))}
+    except ValueError:
+        return {"error": f"Value of key '{key}' is not an integer"}
+
+@registry.tool(
+    "keyvalue___cas",
+    "Compare-and-set: store value only if the key currently holds expected "
+    "(null expected means the key must not exist yet)",
+    {
+        "type": "object",
+        "properties": {
+            "key": key_schema("The key to update"),
+            "expected": {"type": ["string", "null"], "description": "Value the key must currently hold"},
+            "value": {"type": "string", "description": "The new value"}
+        },
+        "required": ["key", "expected", "value"]
+    },
+    cache=mutating("keyvalue"),
+)
+def keyvalue_cas(parameters):
+    swapped, current = kv_store.compare_and_set(parameters["key"], parameters["expected"], parameters["value"])
+    return {"result": {"swapped": swapped, "previous": current}}
+
+# Cursors are the last key of the previous page, base64url-encoded so callers treat them as opaque
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return base64.b64decode(padded.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+
+@registry.tool(
+    "keyvalue___list",
+    "List keys in the key-value store in sorted order. Results are paginated: "
+    "pass the returned next_cursor back as cursor to get the next page",
+    {
+        "type": "object",
+        "properties": {
+            "prefix": {"type": "string", "description": "Only list keys starting with this prefix"},
+            "limit": {"type": "integer", "description": f"Maximum keys to return (1-{LIST_MAX_LIMIT}, default {LIST_DEFAULT_LIMIT})"},
+            "cursor": {"type": "string", "description": "next_cursor from the previous page"}
+        }
+    },
+    cache=KV_READ,
+)
+def keyvalue_list(parameters):
+    prefix = parameters.get("prefix", "")
+    limit = max(1, min(parameters.get("limit", LIST_DEFAULT_LIMIT), LIST_MAX_LIMIT))
+    after = None
+    if parameters.get("cursor"):
         try:
-            port = int(sys.argv[1])
-        except ValueError:
-            print(f"Invalid port number: {sys.argv[1]}")
-            sys.exit(1)
-    
-    run_server(port)
\ No newline at end of file
+            after = decode_cursor(parameters["cursor"])
+        except (binascii.Error, UnicodeError, ValueError):
+            return {"error": "Invalid cursor"}
+
+    # Fetch one extra key to know whether there is another page
+    keys = kv_store.scan(prefix, after, limit + 1)
+    next_cursor = encode_cursor(keys[limit - 1]) if len(keys) > limit else None
+    return {"result": {"keys": keys[:limit], "next_cursor": next_cursor}}
+
+# Bulk export: every key/value pair (optionally under a prefix) streamed as NDJSON
+def export_lines(prefix):
+    lines = []
+    for key, value in kv_store.items(prefix):
+        lines.append(JSON.dumps({"key": key, "value": value}))
+        if len(lines) >= EXPORT_LINES_PER_CHUNK:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def export_route(request):
+    prefix = request.get("prefix") or ""
+    if not isinstance(prefix, str):
+        return json_response({"error": "prefix must be a string"}, status=400)
+    return Response(export_lines(prefix), content_type="application/x-ndjson")
+
+def stats_route(request):
+    # Hit/miss/eviction/expiry counters and approximate memory use
+    return json_response(kv_store.stats())
+
+app = MCPApp("KeyValue", registry)
+app.add_route("/kv/export", export_route)
+app.add_route("/mcp/stats", stats_route)
+
+# Store counters on /metrics next to the request metrics (sizes stay on
+# /mcp/stats, which switches on size accounting)
+for name, kind, help in [("hits", "counter", "Reads that found their key"),
+                         ("misses", "counter", "Reads of missing or expired keys"),
+                         ("evictions", "counter", "Keys evicted to stay under --kv-max-bytes"),
+                         ("expirations", "counter", "Keys removed because their TTL ran out"),
+                         ("keys", "gauge", "Keys stored"),
+                         ("keys_with_ttl", "gauge", "Keys with an expiry time")]:
+    app.metrics.add(CallbackGauge(f"kv_{name}_total" if kind == "counter" else f"kv_{name}", help,
+                                  lambda name=name: kv_store.counters()[name], kind=kind))
+
+def start(kv_backend="memory", kv_dir="kv_data", kv_sync="group", kv_max_bytes=None, kv_eviction="lru",
+          kv_shared=None):
+    # Replaces the default in-memory store with the configured one, or with
+    # the store of a StoreOwner process when kv_shared is its address
+    global kv_store
+    kv_store.close()
+    if kv_shared is not None:
+        kv_store = connect_store(kv_shared)
+    else:
+        kv_store = KeyValueStore(open_backend(kv_backend, kv_dir, kv_sync),
+                                 max_bytes=kv_max_bytes, eviction=kv_eviction)
+
+def start_owner(kv_backend="memory", kv_dir="kv_data", kv_sync="group", kv_max_bytes=None, kv_eviction="lru"):
+    # The configured store in an owner process of its own, for worker
+    # processes to share: pass its address to their start(kv_shared=...)
+    return StoreOwner(kv_backend, kv_dir, kv_sync, kv_max_bytes, kv_eviction)
+
+def stop():
+    kv_store.close()
+
+def add_arguments(parser):
+    parser.add_argument("--kv-backend", choices=BACKENDS, default="memory",
+                        help="Storage engine: memory (not persisted), wal or mmap")
+    parser.add_argument("--kv-dir", default="kv_data", help="Data directory for the wal and mmap backends")
+    parser.add_argument("--kv-sync", choices=SYNC_MODES, default="group",
+                        help="When writes are fsynced: group commit, every write, or once a second")
+    parser.add_argument("--kv-max-bytes", type=int, default=None,
+                        help="Approximate memory cap; keys are evicted once it is exceeded (default: no cap)")
+    parser.add_argument("--kv-eviction", choices=EVICTION_POLICIES, default="lru",
+                        help="Which keys to evict when over --kv-max-bytes")
+
+def start_options(args):
+    return {
+        "kv_backend": args.kv_backend,
+        "kv_dir": args.kv_dir,
+        "kv_sync": args.kv_sync,
+        "kv_max_bytes": args.kv_max_bytes,
+        "kv_eviction": args.kv_eviction,
+    }
+
+def run_server(port=8000, kv_backend="memory", kv_dir="kv_data", kv_sync="group",
+               kv_max_bytes=None, kv_eviction="lru", processes=1, **options):
+    if processes <= 1:
+        serve(app, port, on_start=lambda: start(kv_backend, kv_dir, kv_sync, kv_max_bytes, kv_eviction),
+              on_stop=stop, **options)
+        return
+    # Worker processes share one store, held by an owner process (kv_shared.py)
+    owner = start_owner(kv_backend, kv_dir, kv_sync, kv_max_bytes, kv_eviction)
+    try:
+        serve(app, port, processes=processes, on_start=lambda: start(kv_shared=owner.address),
+              on_stop=stop, **options)
+    finally:
+        owner.shutdown()
+
+if __name__ == "__main__":
+    # Port comes from the first command line argument; see --help for serving options
+    parser = make_arg_parser()
+    add_arguments(parser)
+    args = parser.parse_args()
+    run_server(args.port, **start_options(args), **server_options(args))
@@ -1,168 +1,329 @@
-import json
-import http.server
-import socketserver
-import random
-import sys
-from urllib.parse import urlparse
-from datetime import datetime, timedelta
-
-# Simulated weather data (no real API calls)
-CITIES = {
-    "new york": {"country": "USA", "latitude": 40.7128, "longitude": -74.0060},
-    "london": {"country": "UK", "latitude": 51.5074, "longitude": -0.1278},
-    "tokyo": {"country": "Japan", "latitude": 35.6762, "longitude": 139.6503},
-    "paris": {"country": "France", "latitude": 48.8566, "longitude": 2.3522},
-    "sydney": {"country": "Australia", "latitude": -33.8688, "longitude": 151.2093},
+from heapq import nlargest
+
+from city_index import CityIndex, load_geonames
+from mcp_http import MCPApp, make_arg_parser, serve, server_options
+from mcp_registry import ToolRegistry, read_only
+from weather_model import FORECAST_DAYS, ForecastStore
+
+# Simulated weather data (no real API calls). --cities-file replaces the
+# built-in cities with a GeoNames dump.
+DEFAULT_CITIES = [
+    {"name": "New York", "country": "USA", "latitude": 40.7128, "longitude": -74.0060, "population": 8336817},
+    {"name": "London", "country": "UK", "latitude": 51.5074, "longitude": -0.1278, "population": 8961989},
+    {"name": "Tokyo", "country": "Japan", "latitude": 35.6762, "longitude": 139.6503, "population": 13960000},
+    {"name": "Paris", "country": "France", "latitude": 48.8566, "longitude": 2.3522, "population": 2138551},
+    {"name": "Sydney", "country": "Australia", "latitude": -33.8688, "longitude": 151.2093, "population": 5312163},
+]
+
+PRECOMPUTED_CITIES = 1000  # most populous cities whose tables are rebuilt every hour
+CITIES_DEFAULT_LIMIT = 100
+CITIES_MAX_LIMIT = 1000
+NEAREST_MAX_COUNT = 50
+MANY_DEFAULT_LIMIT = 100  # cities returned for a bounding box unless limit is given
+MANY_MAX_CITIES = 1000
+
+# Client cache lifetimes: weather changes at most hourly, the city list only on restart
+WEATHER_READ = read_only("weather", 300)
+CITIES_READ = read_only("cities", 3600)
+
+cities = None
+forecasts = None
+
+def use_cities(index):
+    # Switches the server to a city index; the biggest cities get precomputed tables
+    global cities, forecasts
+    if forecasts is not None:
+        forecasts.stop()
+    precomputed = nlargest(PRECOMPUTED_CITIES, range(len(index)), key=index.populations.__getitem__)
+    cities = index
+    forecasts = ForecastStore(index.key(row) for row in precomputed)
+
+use_cities(CityIndex.from_records(DEFAULT_CITIES))
+
+# Tools are registered with their JSON schema - /mcp/tools is how the LLM
+# discovers what tools are available and /mcp/invoke is how it calls them
+registry = ToolRegistry()
+
+def city_not_found(city):
+    suggestions = cities.suggestions(city)
+    hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+    return {"error": f"City '{city}' not found.{hint} Use weather___cities to see available cities."}
+
+def latitude_schema(description):
+    return {"type": "number", "minimum": -90, "maximum": 90, "description": description}
+
+def longitude_schema(description):
+    return {"type": "number", "minimum": -180, "maximum": 180, "description": description}
+
+def find_city(parameters):
+    # Resolves the city parameter (exact, prefix or fuzzy name match) or the
+    # nearest city to latitude/longitude. Returns (row, details, error).
+    if "latitude" in parameters or "longitude" in parameters:
+        if "latitude" not in parameters or "longitude" not in parameters:
+            return None, None, {"error": "latitude and longitude must be given together"}
+        nearest = cities.nearest(parameters["latitude"], parameters["longitude"])
+        if not nearest:
+            return None, None, {"error": "No cities loaded"}
+        row, distance = nearest[0]
+        return row, {"distance_km": round(distance, 1)}, None
+    city = parameters.get("city")
+    if city is None or not city.strip():
+        return None, None, {"error": "Missing city parameter"}
+    row, how = cities.resolve(city)
+    if row is None:
+        return None, None, city_not_found(city)
+    return row, ({"match": how, "query": city} if how != "exact" else {}), None
+
+CITY_PROPERTIES = {
+    "city": {"type": "string", "description": "City name, optionally followed by ', <country>' (name or ISO code); "
+                                              "misspelled or partial names are matched to the closest city"},
+    "latitude": latitude_schema("Instead of city: use the city nearest to this latitude"),
+    "longitude": longitude_schema("Instead of city: use the city nearest to this longitude"),
 }
 
-WEATHER_CONDITIONS = ["sunny", "partly cloudy", "cloudy", "rainy", "thunderstorm", "snowy", "windy", "foggy"]
-
-class MCPHandler(http.server.BaseHTTPRequestHandler):
-    def do_POST(self):
-        # Get the request data
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length).decode('utf-8')
-        request = json.loads(post_data)
-        
-        # Parse the path to determine the endpoint
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        response = {"error": "Unknown endpoint"}
-        
-        # Handle MCP endpoints
-        if path == "/mcp/tools":
-            # Return available tools - this is how the LLM discovers what tools are available
-            response = {
-                "tools": [
-                    {
-                        "name": "weather___current",
-                        "description": "Get current weather for a city (simulated data)",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "city": {"type": "string", "description": "City name"}
-                            },
-                            "required": ["city"]
-                        }
-                    },
-                    {
-                        "name": "weather___forecast",
-                        "description": "Get weather forecast for a city (simulated data)",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "city": {"type": "string", "description": "City name"},
-                                "days": {"type": "integer", "description": "Number of days (1-7)"}
-                            },
-                            "required": ["city"]
-                        }
-                    },
-                    {
-                        "name": "weather___cities",
-                        "description": "List available cities",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {}
-                        }
-                    }
-                ]
-            }
-        elif path == "/mcp/invoke":
-            # Handle tool invocation - this is how the LLM calls the tools
-            tool_name = request.get("name", "")
-            parameters = request.get("parameters", {})
-            
-            if tool_name == "weather___current":
-                city = parameters.get("city", "").lower()
-                if city:
-                    if city in CITIES:
-                        # Generate simulated weather data
-                        temp_c = round(random.uniform(5, 35), 1)
-                        temp_f = round(temp_c * 9/5 + 32, 1)
-                        condition = random.choice(WEATHER_CONDITIONS)
-                        humidity = random.randint(30, 95)
-                        wind_speed = round(random.uniform(0, 30), 1)
-                        
-                        response = {
-                            "result": {
-                                "city": city.title(),
-                                "country": CITIES[city]["country"],
-                                "temperature_c": temp_c,
-                                "temperature_f": temp_f,
-                                "condition": condition,
-                                "humidity": humidity,
-                                "wind_speed_kph": wind_speed,
-                                "timestamp": datetime.now().isoformat()
-                            }
-                        }
-                    else:
-                        response = {"error": f"City '{city}' not found. Use weather___cities to see available cities."}
-                else:
-                    response = {"error": "Missing city parameter"}
-            
-            elif tool_name == "weather___forecast":
-                city = parameters.get("city", "").lower()
-                days = min(int(parameters.get("days", 3)), 7)  # Default 3 days, max 7
-                
-                if city:
-                    if city in CITIES:
-                        # Generate simulated forecast
-                        forecast = []
-                        for i in range(days):
-                            date = (datetime.now() + timedelta(days=i)).strftime("%Y-%m-%d")
-                            temp_high = round(random.uniform(10, 35), 1)
-                            temp_low = round(random.uniform(0, temp_high-2), 1)
-                            condition = random.choice(WEATHER_CONDITIONS)
-                            
-                            forecast.append({
-                                "date": date,
-                                "high_c": temp_high,
-                                "low_c": temp_low,
-                                "high_f": round(temp_high * 9/5 + 32, 1),
-                                "low_f": round(temp_low * 9/5 + 32, 1),
-                                "condition": condition,
-                                "precipitation_chance": random.randint(0, 100)
-                            })
-                        
-                        response = {
-                            "result": {
-                                "city": city.title(),
-                                "country": CITIES[city]["country"],
-                                "forecast": forecast
-                            }
-                        }
-                    else:
-                        response = {"error": f"City '{city}' not found. Use weather___cities to see available cities."}
-                else:
-                    response = {"error": "Missing city parameter"}
-            
-            elif tool_name == "weather___cities":
-                cities_info = {}
-                for city, info in CITIES.items():
-                    cities_info[city.title()] = info
-                
-                response = {"result": cities_info}
-        
-        # Send response
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
-
-def run_server(port=8000):
-    with socketserver.TCPServer(("", port), MCPHandler) as httpd:
-        print(f"Weather MCP server running at http://localhost:{port}")
-        httpd.serve_forever()
+@registry.tool(
+    "weather___current",
+    "Get current weather for a city (simulated data)",
+    {
+        "type": "object",
+        "properties": CITY_PROPERTIES
+    },
+    cache=WEATHER_READ,
+)
+def weather_current(parameters):
+    row, details, error = find_city(parameters)
+    if error:
+        return error
+
+    table = forecasts.get(cities.key(row))
+    return {
+        "result": {
+            "city": cities.names[row],
+            "country": cities.countries[row],
+            **details,
+            **table["current"],
+            "generated_at": table["generated_at"],
+            "valid_until": table["valid_until"]
+        }
+    }
+
+@registry.tool(
+    "weather___forecast",
+    "Get weather forecast for a city (simulated data)",
+    {
+        "type": "object",
+        "properties": dict(CITY_PROPERTIES, days={"type": "integer", "description": "Number of days (1-7)"})
+    },
+    cache=WEATHER_READ,
+)
+def weather_forecast(parameters):
+    days = max(1, min(parameters.get("days", 3), FORECAST_DAYS))  # Default 3 days, max 7
+    row, details, error = find_city(parameters)
+    if error:
+        return error
+
+    table = forecasts.get(cities.key(row))
+    return {
+        "result": {
+            "city": cities.names[row],
+            "country": cities.countries[row],
+            **details,
+            "forecast": table["forecast"][:days],
+            "generated_at": table["generated_at"],
+            "valid_until": table["valid_until"]
+        }
+    }
+
+@registry.tool(
+    "weather___cities",
+    "List available cities in name order. Results are paginated: pass the returned "
+    "next_cursor back as cursor to get the next page",
+    {
+        "type": "object",
+        "properties": {
+            "prefix": {"type": "string", "description": "Only list cities whose name starts with this"},
+            "limit": {"type": "integer", "description": f"Maximum cities to return (1-{CITIES_MAX_LIMIT}, default {CITIES_DEFAULT_LIMIT})"},
+            "cursor": {"type": "string", "description": "next_cursor from the previous page"}
+        }
+    },
+    cache=CITIES_READ,
+)
+def weather_cities(parameters):
+    prefix = parameters.get("prefix", "")
+    limit = max(1, min(parameters.get("limit", CITIES_DEFAULT_LIMIT), CITIES_MAX_LIMIT))
+    try:
+        offset = int(parameters.get("cursor") or 0)
+    except ValueError:
+        return {"error": "Invalid cursor"}
+    if offset < 0:
+        return {"error": "Invalid cursor"}
+
+    rows, next_offset = cities.page(prefix, offset, limit)
+    return {
+        "result": {
+            "cities": [cities.info(row) for row in rows],
+            "next_cursor": str(next_offset) if next_offset is not None else None
+        }
+    }
+
+@registry.tool(
+    "weather___nearest_city",
+    "Find the cities closest to a latitude/longitude",
+    {
+        "type": "object",
+        "properties": {
+            "latitude": latitude_schema("Latitude in degrees (-90 to 90)"),
+            "longitude": longitude_schema("Longitude in degrees (-180 to 180)"),
+            "count": {"type": "integer", "description": f"How many cities to return (1-{NEAREST_MAX_COUNT}, default 1)"}
+        },
+        "required": ["latitude", "longitude"]
+    },
+    cache=CITIES_READ,
+)
+def weather_nearest_city(parameters):
+    count = max(1, min(parameters.get("count", 1), NEAREST_MAX_COUNT))
+    nearest = cities.nearest(parameters["latitude"], parameters["longitude"], count)
+    if not nearest:
+        return {"error": "No cities loaded"}
+    return {"result": [dict(cities.info(row), distance_km=round(distance, 1)) for row, distance in nearest]}
+
+# Multi-city tools: one call for a list of cities or every city in a
+# bounding box. Results are columnar - one array per field, aligned by
+# position - so field names are not repeated for every city.
+
+MANY_PROPERTIES = {
+    "cities": {"type": "array", "items": {"type": "string"}, "minItems": 1, "maxItems": MANY_MAX_CITIES,
+               "description": "City names (matched like weather___current)"},
+    "bbox": {
+        "type": "object",
+        "properties": {
+            "south": latitude_schema("Southern edge"), "west": longitude_schema("Western edge"),
+            "north": latitude_schema("Northern edge"), "east": longitude_schema("Eastern edge")
+        },
+        "required": ["south", "west", "north", "east"],
+        "description": "Instead of cities: every city inside this latitude/longitude box, most populous first"
+    },
+    "limit": {"type": "integer", "description": f"Maximum cities for bbox (1-{MANY_MAX_CITIES}, default {MANY_DEFAULT_LIMIT})"},
+    "units": {"type": "string", "enum": ["c", "f"], "description": "Temperature unit (default c)"}
+}
+
+def find_many(parameters):
+    # Returns (rows, not_found queries, error)
+    names = parameters.get("cities")
+    if names is not None:
+        rows, not_found = [], []
+        for name in names:
+            row, _ = cities.resolve(name)
+            if row is None:
+                not_found.append(name)
+            else:
+                rows.append(row)
+        return rows, not_found, None
+    bbox = parameters.get("bbox")
+    if bbox is None:
+        return None, None, {"error": "Missing cities or bbox parameter"}
+    south, west, north, east = bbox["south"], bbox["west"], bbox["north"], bbox["east"]
+    limit = max(1, min(parameters.get("limit", MANY_DEFAULT_LIMIT), MANY_MAX_CITIES))
+    if south > north:
+        return None, None, {"error": "bbox south must not be greater than north"}
+    return cities.within(south, west, north, east, limit), [], None
+
+def temperature_converter(parameters):
+    units = parameters.get("units", "c")
+    if units == "f":
+        return units, lambda celsius: round(celsius * 9/5 + 32, 1)
+    return units, lambda celsius: celsius
+
+def many_result(rows, not_found, tables, columns):
+    result = {
+        "city": [cities.names[row] for row in rows],
+        "country": [cities.countries[row] for row in rows],
+        **columns,
+        "generated_at": min((table["generated_at"] for table in tables), default=None),
+        "valid_until": min((table["valid_until"] for table in tables), default=None)
+    }
+    if not_found:
+        result["not_found"] = not_found
+    return {"result": result}
+
+@registry.tool(
+    "weather___current_many",
+    "Get current weather for many cities in one call (simulated data). Pass a list of cities or a "
+    "bounding box; the result has one array per field, aligned with the city array",
+    {"type": "object", "properties": MANY_PROPERTIES},
+    cache=WEATHER_READ,
+)
+def weather_current_many(parameters):
+    units, convert = temperature_converter(parameters)
+    rows, not_found, error = find_many(parameters)
+    if error:
+        return error
+
+    tables = [forecasts.get(cities.key(row)) for row in rows]
+    current = [table["current"] for table in tables]
+    return many_result(rows, not_found, tables, {
+        "units": units,
+        "temperature": [convert(c["temperature_c"]) for c in current],
+        "condition": [c["condition"] for c in current],
+        "humidity": [c["humidity"] for c in current],
+        "wind_speed_kph": [c["wind_speed_kph"] for c in current],
+        "timestamp": current[0]["timestamp"] if current else None
+    })
+
+@registry.tool(
+    "weather___forecast_many",
+    "Get the weather forecast for many cities in one call (simulated data). Pass a list of cities or a "
+    "bounding box; per-day fields are arrays of per-city arrays aligned with the date array",
+    {
+        "type": "object",
+        "properties": dict(MANY_PROPERTIES, days={"type": "integer", "description": "Number of days (1-7)"})
+    },
+    cache=WEATHER_READ,
+)
+def weather_forecast_many(parameters):
+    days = max(1, min(parameters.get("days", 3), FORECAST_DAYS))
+    units, convert = temperature_converter(parameters)
+    rows, not_found, error = find_many(parameters)
+    if error:
+        return error
+
+    tables = [forecasts.get(cities.key(row)) for row in rows]
+    forecast = [table["forecast"][:days] for table in tables]
+    return many_result(rows, not_found, tables, {
+        "units": units,
+        "date": [day["date"] for day in forecast[0]] if forecast else [],
+        "high": [[convert(day["high_c"]) for day in city] for city in forecast],
+        "low": [[convert(day["low_c"]) for day in city] for city in forecast],
+        "condition": [[day["condition"] for day in city] for city in forecast],
+        "precipitation_chance": [[day["precipitation_chance"] for day in city] for city in forecast]
+    })
+
+app = MCPApp("Weather", registry)
+
+def start(cities_file=None, min_population=0):
+    if cities_file:
+        use_cities(load_geonames(cities_file, min_population))
+        print(f"Loaded {len(cities)} cities from {cities_file}")
+    forecasts.start()
+
+def stop():
+    forecasts.stop()
+
+def add_arguments(parser):
+    parser.add_argument("--cities-file", help="GeoNames dump (e.g. cities15000.txt) to use instead of the built-in cities")
+    parser.add_argument("--min-population", type=int, default=0,
+                        help="Skip smaller cities when loading --cities-file")
+
+def start_options(args):
+    return {"cities_file": args.cities_file, "min_population": args.min_population}
+
+def run_server(port=8000, cities_file=None, min_population=0, **options):
+    # With --processes N every worker loads the cities and runs its own refresher
+    serve(app, port, on_start=lambda: start(cities_file, min_population), on_stop=stop, **options)
 
 if __name__ == "__main__":
-    # Get port from command line argument if provided
-    port = 8000
-    if len(sys.argv) > 1:
-        try:
-            port = int(sys.argv[1])
-        except ValueError:
-            print(f"Invalid port number: {sys.argv[1]}")
-            sys.exit(1)
-    
-    run_server(port)
\ No newline at end of file
+    # Port comes from the first command line argument; see --help for serving options
+    parser = make_arg_parser()
+    add_arguments(parser)
+    args = parser.parse_args()
+    run_server(args.port, **start_options(args), **server_options(args))
@@ -0,0 +1,91 @@
+from bisect import bisect_left, bisect_right
+
+# Sorted set of string keys for prefix and range scans.
+#
+# Keys are kept in a list of sorted blocks of at most 2 * BLOCK_SIZE keys, plus
+# the largest key of every block. Locating a key is two binary searches
+# (block, then position in the block), so a scan costs O(log n + k), and an
+# insert or delete only shifts one block instead of the whole key list.
+
+BLOCK_SIZE = 1000
+
+
+class SortedKeyList:
+    def __init__(self, keys=()):
+        self._blocks = []
+        self._maxes = []
+        self._len = 0
+        self.update(keys)
+
+    def update(self, keys):
+        # Bulk load: one sort instead of n inserts
+        keys = sorted(set(keys).union(*self._blocks))
+        self._blocks = [keys[i:i + BLOCK_SIZE] for i in range(0, len(keys), BLOCK_SIZE)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(keys)
+
+    def add(self, key):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            return
+        index = bisect_left(self._maxes, key)
+        if index == len(self._maxes):
+            index -= 1
+            self._blocks[index].append(key)
+            self._maxes[index] = key
+        else:
+            block = self._blocks[index]
+            position = bisect_left(block, key)
+            if block[position] == key:
+                return
+            block.insert(position, key)
+        self._len += 1
+        if len(self._blocks[index]) > 2 * BLOCK_SIZE:
+            block = self._blocks[index]
+            self._blocks[index:index + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self._maxes[index:index + 1] = [block[BLOCK_SIZE - 1], block[-1]]
+
+    def discard(self, key):
+        index = bisect_left(self._maxes, key)
+        if index == len(self._maxes):
+            return
+        block = self._blocks[index]
+        position = bisect_left(block, key)
+        if block[position] != key:
+            return
+        del block[position]
+        self._len -= 1
+        if block:
+            self._maxes[index] = block[-1]
+        else:
+            del self._blocks[index]
+            del self._maxes[index]
+
+    def irange(self, start="", inclusive=True):
+        # Keys >= start (> start when inclusive is False) in ascending order.
+        # The list must not be modified while the iterator is in use.
+        find = bisect_left if inclusive else bisect_right
+        index = find(self._maxes, start)
+        if index == len(self._maxes):
+            return
+        position = find(self._blocks[index], start)
+        for block in self._blocks[index:]:
+            yield from block[position:] if position else block
+            position = 0
+
+    def __contains__(self, key):
+        index = bisect_left(self._maxes, key)
+        if index == len(self._maxes):
+            return False
+        block = self._blocks[index]
+        position = bisect_left(block, key)
+        return block[position] == key
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for block in self._blocks:
+            yield from block
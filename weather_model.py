@@ -0,0 +1,118 @@
+import hashlib
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Deterministic simulated weather for the weather server.
+#
+# Every value is drawn from a random generator seeded with (city, date, hour),
+# so the same question asked twice within the same hour gets the same answer
+# and results can be cached by clients. ForecastStore precomputes a table per
+# city - current conditions plus the daily forecast - once per hour, so a
+# request is a dictionary lookup. Times are UTC.
+
+WEATHER_CONDITIONS = ["sunny", "partly cloudy", "cloudy", "rainy", "thunderstorm", "snowy", "windy", "foggy"]
+FORECAST_DAYS = 7
+REFRESH_INTERVAL = 3600  # tables are valid until the end of the hour they were built in
+MAX_CACHED_TABLES = 50_000  # tables kept per hour, precomputed ones included
+
+
+def _generator(city, date, hour):
+    seed = hashlib.blake2b(f"{city}|{date}|{hour}".encode("utf-8"), digest_size=8).digest()
+    return random.Random(int.from_bytes(seed, "big"))
+
+
+def current_weather(city, hour):
+    # Conditions for city during the UTC hour starting at `hour`
+    rng = _generator(city, hour.date().isoformat(), hour.hour)
+    temp_c = round(rng.uniform(5, 35), 1)
+    return {
+        "temperature_c": temp_c,
+        "temperature_f": round(temp_c * 9/5 + 32, 1),
+        "condition": rng.choice(WEATHER_CONDITIONS),
+        "humidity": rng.randint(30, 95),
+        "wind_speed_kph": round(rng.uniform(0, 30), 1),
+        "timestamp": hour.isoformat(),
+    }
+
+
+def daily_forecast(city, day):
+    rng = _generator(city, day.isoformat(), "daily")
+    temp_high = round(rng.uniform(10, 35), 1)
+    temp_low = round(rng.uniform(0, temp_high - 2), 1)
+    return {
+        "date": day.isoformat(),
+        "high_c": temp_high,
+        "low_c": temp_low,
+        "high_f": round(temp_high * 9/5 + 32, 1),
+        "low_f": round(temp_low * 9/5 + 32, 1),
+        "condition": rng.choice(WEATHER_CONDITIONS),
+        "precipitation_chance": rng.randint(0, 100),
+    }
+
+
+def current_hour(now=None):
+    now = now or datetime.now(timezone.utc)
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+class ForecastStore:
+    # Per-city tables for the current hour. refresh() rebuilds the tables of
+    # the given cities and swaps them in at once; start() does that on a
+    # schedule at the top of each hour. Other cities (and lookups that find
+    # their table out of date because the refresher has not caught up yet)
+    # are built on demand and cached until the hour ends, up to max_tables.
+    def __init__(self, cities, days=FORECAST_DAYS, max_tables=MAX_CACHED_TABLES):
+        self.cities = list(cities)
+        self.days = days
+        self.max_tables = max_tables
+        self._tables = {}
+        self._hour = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.refresh()
+
+    def _build(self, city, hour, generated_at):
+        today = hour.date()
+        return {
+            "current": current_weather(city, hour),
+            "forecast": [daily_forecast(city, today + timedelta(days=i)) for i in range(self.days)],
+            "generated_at": generated_at,
+            "valid_until": (hour + timedelta(seconds=REFRESH_INTERVAL)).isoformat(),
+        }
+
+    def refresh(self, now=None):
+        hour = current_hour(now)
+        generated_at = (now or datetime.now(timezone.utc)).isoformat()
+        self._tables = {city: self._build(city, hour, generated_at) for city in self.cities}
+        self._hour = hour
+
+    def get(self, city, now=None):
+        hour = current_hour(now)
+        tables = self._tables
+        table = tables.get(city)
+        if table is None or self._hour != hour:
+            table = self._build(city, hour, (now or datetime.now(timezone.utc)).isoformat())
+            if self._hour == hour and len(tables) < self.max_tables:
+                tables[city] = table
+        return table
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._refresh_loop, name="forecast-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _refresh_loop(self):
+        while True:
+            next_hour = current_hour() + timedelta(seconds=REFRESH_INTERVAL)
+            delay = (next_hour - datetime.now(timezone.utc)).total_seconds()
+            if self._stop.wait(max(delay, 0)):
+                return
+            self.refresh()